@@ -0,0 +1,391 @@
+"""
+Benchmark de carga de la API: mezcla realista de requests con varios clientes concurrentes.
+
+Usa la app real de src/app.py sobre una base sembrada con `flask seed-bench` (api/seed.py),
+con el almacenamiento en disco local (STORAGE_BACKEND=local en una carpeta temporal) y un
+servidor SMTP local de aiosmtpd si está instalado, así no sale nada a la red.
+
+Por defecto los requests van por el test client de Flask, dentro del mismo proceso. Con
+--target se mandan por HTTP a un servidor ya levantado (ej: gunicorn local) que use la misma
+base (--database-url) y SQL_PROFILING=1 para informar las consultas por request.
+
+Mezclas (--mix):
+    read   -> listados del dashboard (imágenes, reportes, diagnósticos)
+    admin  -> overview y listados del panel admin
+    mixed  -> login, listados, admin y subidas de imágenes (por defecto)
+
+Para cada escenario informa requests, errores, requests/s, p50 / p95 / p99 y consultas SQL
+por request (header X-DB-Statements de api/profiling.py). Con --output guarda el JSON; con
+--baseline lo compara con una corrida anterior y termina con código 1 si algún escenario
+empeoró más de --tolerance (latencia p95, requests/s o consultas por request).
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/api_load.py --users 200 --seconds 20 --output bench_api.json
+    python benchmarks/api_load.py --skip-seed --mix read --concurrency 16 --baseline bench_api.json
+    python benchmarks/api_load.py --skip-seed --target http://127.0.0.1:3001 --database-url postgresql://...
+"""
+import argparse
+import io
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+ADMIN_EMAIL = "bench-admin@agrivision.test"
+
+MIXES = {
+    "read": {"dashboard": 10, "user_images": 40, "farm_reports": 25, "diagnostics": 25},
+    "admin": {"admin_overview": 30, "admin_all_farms": 30, "admin_all_users": 30, "admin_farm_details": 10},
+    "mixed": {"login": 5, "dashboard": 10, "user_images": 30, "farm_reports": 10, "diagnostics": 10,
+              "admin_overview": 10, "admin_all_farms": 10, "admin_all_users": 5, "upload_image": 10},
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de carga de la API con mezclas de requests")
+    parser.add_argument("--database-url", default="sqlite:////tmp/agrivision_bench_api.db")
+    parser.add_argument("--users", type=int, default=200, help="usuarios a sembrar")
+    parser.add_argument("--farms", type=int, default=5, help="campos por usuario")
+    parser.add_argument("--images", type=int, default=50, help="imágenes por campo")
+    parser.add_argument("--reports", type=int, default=10, help="reportes / diagnósticos por campo")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-seed", action="store_true", help="reutilizar los datos ya sembrados")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=8, help="clientes concurrentes")
+    parser.add_argument("--seconds", type=float, default=15, help="duración de la medición")
+    parser.add_argument("--warmup", type=float, default=2, help="segundos de calentamiento (no se miden)")
+    parser.add_argument("--target", help="URL base de un servidor ya levantado (si no, test client)")
+    parser.add_argument("--output", help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="empeoramiento aceptado (0.2 = 20%%)")
+    return parser.parse_args()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else None
+
+
+# ----------- Transporte: test client o HTTP -----------------------------
+
+class TestClientTransport:
+    def __init__(self, app):
+        self.app = app
+
+    def request(self, method, path, headers=None, body=None):
+        response = self.app.test_client().open(path, method=method, headers=headers or {}, data=body)
+        return response.status_code, response.headers, response.get_data()
+
+
+class HttpTransport:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, headers=None, body=None):
+        request = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers or {})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers, error.read()
+
+
+def json_body(payload):
+    return {"Content-Type": "application/json"}, json.dumps(payload).encode("utf-8")
+
+
+def multipart_body(fields, file_field, file_name, content, content_type):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8"))
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{file_name}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'.encode("utf-8") + content + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return {"Content-Type": f"multipart/form-data; boundary={boundary}"}, b"".join(parts)
+
+
+def random_jpeg(rng):
+    """JPEG chico y distinto en cada llamada (si se repitiera, la deduplicación lo reutilizaría)"""
+    from PIL import Image
+
+    image = Image.frombytes("RGB", (64, 64), rng.randbytes(64 * 64 * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=80)
+    return buffer.getvalue()
+
+
+# ----------- Escenarios -----------------------------
+
+class VirtualUser:
+    """Un cliente: su usuario sembrado, sus campos y su token"""
+
+    def __init__(self, email, password, farm_ids, token, admin_token, admin_farm_ids, rng):
+        self.email = email
+        self.password = password
+        self.farm_ids = farm_ids
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        self.admin_farm_ids = admin_farm_ids
+        self.rng = rng
+
+    def build(self, scenario):
+        """(método, ruta, headers, body) del escenario"""
+        farm_id = self.rng.choice(self.farm_ids)
+        if scenario == "login":
+            headers, body = json_body({"email": self.email, "password": self.password})
+            return "POST", "/api/login", headers, body
+        if scenario == "dashboard":
+            return "GET", "/api/dashboard", self.headers, None
+        if scenario == "user_images":
+            return "GET", "/api/user-images", self.headers, None
+        if scenario == "farm_reports":
+            return "GET", f"/api/reports?farm_id={farm_id}", self.headers, None
+        if scenario == "diagnostics":
+            return "GET", f"/api/get-diagnostics/{farm_id}", self.headers, None
+        if scenario == "admin_overview":
+            return "GET", "/api/admin/reports-overview", self.admin_headers, None
+        if scenario == "admin_all_farms":
+            return "GET", "/api/admin/all-farms", self.admin_headers, None
+        if scenario == "admin_all_users":
+            return "GET", "/api/admin/all-users", self.admin_headers, None
+        if scenario == "admin_farm_details":
+            return "GET", f"/api/admin/farm-details/{self.rng.choice(self.admin_farm_ids)}", self.admin_headers, None
+        if scenario == "upload_image":
+            headers, body = multipart_body(
+                {"farm_id": farm_id, "image_type": self.rng.choice(("NDVI", "AERIAL"))},
+                "image_url", "vuelo.jpg", random_jpeg(self.rng), "image/jpeg"
+            )
+            return "POST", "/api/upload-image", {**self.headers, **headers}, body
+        raise ValueError(f"Escenario desconocido: {scenario}")
+
+
+def run_load(transport, virtual_users, mix, seconds, warmup):
+    """Cada cliente elige escenarios según los pesos de la mezcla hasta que se acaba el tiempo"""
+    scenarios = list(mix)
+    weights = [mix[name] for name in scenarios]
+    samples = {name: [] for name in scenarios}
+    lock = threading.Lock()
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + seconds
+
+    def client_loop(user):
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            scenario = user.rng.choices(scenarios, weights)[0]
+            method, path, headers, body = user.build(scenario)
+            started = time.perf_counter()
+            status, response_headers, _ = transport.request(method, path, headers, body)
+            elapsed = (time.perf_counter() - started) * 1000
+            if started < measure_from:
+                continue
+            statements = response_headers.get("X-DB-Statements")
+            with lock:
+                samples[scenario].append((elapsed, status, int(statements) if statements else None))
+
+    threads = [threading.Thread(target=client_loop, args=(user,)) for user in virtual_users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return summarize(samples, seconds)
+
+
+def summarize(samples, seconds):
+    results = {}
+    all_latencies = []
+    for scenario, rows in samples.items():
+        if not rows:
+            continue
+        latencies = [latency for latency, _, _ in rows]
+        statements = [count for _, _, count in rows if count is not None]
+        all_latencies.extend(latencies)
+        results[scenario] = {
+            "requests": len(rows),
+            "errors": sum(1 for _, status, _ in rows if status >= 400),
+            "requests_per_s": round(len(rows) / seconds, 2),
+            "p50_ms": round(percentile(latencies, 0.50), 3),
+            "p95_ms": round(percentile(latencies, 0.95), 3),
+            "p99_ms": round(percentile(latencies, 0.99), 3),
+            "avg_statements": round(sum(statements) / len(statements), 2) if statements else None,
+        }
+    results["total"] = {
+        "requests": len(all_latencies),
+        "errors": sum(result["errors"] for result in results.values()),
+        "requests_per_s": round(len(all_latencies) / seconds, 2),
+        "p50_ms": round(percentile(all_latencies, 0.50), 3) if all_latencies else None,
+        "p95_ms": round(percentile(all_latencies, 0.95), 3) if all_latencies else None,
+        "p99_ms": round(percentile(all_latencies, 0.99), 3) if all_latencies else None,
+        "avg_statements": None,
+    }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Escenarios que empeoraron respecto de la corrida base
+
+    Returns:
+        list: mensajes de cada regresión
+    """
+    regressions = []
+    for scenario, current in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        if base.get("p95_ms") and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{scenario}: p95 {base['p95_ms']} -> {current['p95_ms']} ms")
+        if base.get("requests_per_s") and current["requests_per_s"] < base["requests_per_s"] * (1 - tolerance):
+            regressions.append(f"{scenario}: {base['requests_per_s']} -> {current['requests_per_s']} requests/s")
+        if base.get("avg_statements") is not None and current["avg_statements"] is not None \
+                and current["avg_statements"] > base["avg_statements"] + 0.5:
+            regressions.append(f"{scenario}: {base['avg_statements']} -> {current['avg_statements']} consultas por request")
+    return regressions
+
+
+# ----------- Preparación -----------------------------
+
+def start_smtp_stub():
+    """Servidor SMTP local que acepta y descarta los correos (None si aiosmtpd no está instalado)"""
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        return None
+
+    class DiscardHandler:
+        async def handle_DATA(self, server, session, envelope):
+            return "250 OK"
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    controller = Controller(DiscardHandler(), hostname="127.0.0.1", port=port)
+    controller.start()
+    os.environ.update(SMTP_ADDRESS="127.0.0.1", SMTP_PORT=str(port), SMTP_SECURITY="none")
+    return controller
+
+
+def prepare_users(app, transport, args):
+    """Siembra (si hace falta), crea el admin y hace login de un usuario por cliente"""
+    from api.models import db, User, Farm
+    from api.passwords import hash_password
+    from api.seed import seed_bench, BENCH_PASSWORD
+
+    with app.app_context():
+        if not args.skip_seed:
+            db.drop_all()
+            db.create_all()
+            print(f"Sembrando {args.users} usuarios x {args.farms} campos en {args.database_url} ...")
+            seed_bench(args.users, args.farms, args.images, args.reports, seed=args.seed)
+
+        if User.query.filter_by(email=ADMIN_EMAIL).first() is None:
+            db.session.add(User(full_name="Bench Admin", email=ADMIN_EMAIL, phone_number="0", salt="bench-salt",
+                                is_admin="admin", password=hash_password(BENCH_PASSWORD, "bench-salt")))
+            db.session.commit()
+
+        users = User.query.filter(User.email.like("bench%@agrivision.test"), User.is_admin == "user") \
+            .order_by(User.id).limit(args.concurrency).all()
+        farms = {}
+        for user_id, farm_id in db.session.query(Farm.user_id, Farm.id).filter(Farm.user_id.in_([user.id for user in users])):
+            farms.setdefault(user_id, []).append(farm_id)
+        admin_farm_ids = [farm_id for (farm_id,) in db.session.query(Farm.id).order_by(Farm.id).limit(1000)]
+        accounts = [(user.email, farms[user.id]) for user in users if user.id in farms]
+
+    if len(accounts) < args.concurrency:
+        raise SystemExit(f"Hay {len(accounts)} usuarios sembrados con campos, se necesitan {args.concurrency}")
+
+    def login(email):
+        headers, body = json_body({"email": email, "password": BENCH_PASSWORD})
+        status, _, payload = transport.request("POST", "/api/login", headers, body)
+        if status != 200:
+            raise SystemExit(f"Login de {email} respondió {status}: {payload[:200]}")
+        return json.loads(payload)["token"]
+
+    admin_token = login(ADMIN_EMAIL)
+    virtual_users = []
+    for index, (email, farm_ids) in enumerate(accounts):
+        virtual_users.append(VirtualUser(email, BENCH_PASSWORD, farm_ids, login(email), admin_token,
+                                         admin_farm_ids, random.Random(args.seed + index)))
+    return virtual_users
+
+
+def main():
+    args = parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["SQL_PROFILING"] = "1"
+    smtp = start_smtp_stub()
+    sys.path.insert(0, SRC_DIR)
+
+    from app import app
+    from api.storage import setup_storage
+
+    storage_folder = tempfile.mkdtemp(prefix="agrivision_bench_uploads_")
+    app.config.update(UPLOAD_FOLDER=storage_folder, UPLOAD_JOBS_MODE="inline",
+                      UPLOAD_SPOOL_FOLDER=os.path.join(storage_folder, "spool"),
+                      DERIVATIVES_FOLDER=os.path.join(storage_folder, "derivatives"))
+    setup_storage(app)
+
+    transport = HttpTransport(args.target) if args.target else TestClientTransport(app)
+    virtual_users = prepare_users(app, transport, args)
+
+    print(f"Midiendo mezcla '{args.mix}' con {args.concurrency} clientes durante {args.seconds}s "
+          f"({'HTTP ' + args.target if args.target else 'test client'}) ...")
+    results = run_load(transport, virtual_users, MIXES[args.mix], args.seconds, args.warmup)
+
+    print(f"\n{'escenario':<20} {'requests':>9} {'errores':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'SQL/req':>8}")
+    print("-" * 90)
+    for scenario, result in results.items():
+        print(f"{scenario:<20} {result['requests']:>9} {result['errors']:>8} {result['requests_per_s']:>9} "
+              f"{str(result['p50_ms']):>9} {str(result['p95_ms']):>9} {str(result['p99_ms']):>9} "
+              f"{str(result['avg_statements']):>8}")
+
+    report = {
+        "mix": args.mix,
+        "concurrency": args.concurrency,
+        "seconds": args.seconds,
+        "database": args.database_url.split("://")[0],
+        "transport": "http" if args.target else "test_client",
+        "dataset": {"users": args.users, "farms": args.farms, "images": args.images, "reports": args.reports},
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"\nResultados guardados en {args.output}")
+
+    if smtp is not None:
+        smtp.stop()
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline.get("results", {}), args.tolerance)
+        if regressions:
+            print(f"\nRegresiones respecto de {args.baseline} (tolerancia {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print(f"\nSin regresiones respecto de {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
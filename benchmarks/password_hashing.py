@@ -0,0 +1,147 @@
+"""
+Benchmark de logins por segundo según el método de hash de contraseñas.
+
+Para cada método (PASSWORD_HASH_METHOD) mide:
+    1) verificaciones por segundo en un solo core (costo puro del KDF)
+    2) logins por segundo de punta a punta contra /api/login con varios clientes concurrentes,
+       usando el pool de procesos de api/passwords.py, y cuántos requests recibieron 429
+
+Sirve para elegir el costo del hash: cuanto más caro, más lento un ataque offline,
+pero menos logins por segundo aguanta cada core.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/password_hashing.py
+    python benchmarks/password_hashing.py --methods scrypt:32768:8:1,pbkdf2:sha256:600000 --seconds 10
+    python benchmarks/password_hashing.py --concurrency 32 --workers 4 --output bench_passwords.json
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+DEFAULT_METHODS = "scrypt:32768:8:1,scrypt:16384:8:1,pbkdf2:sha256:1000000,pbkdf2:sha256:600000"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de logins/s por método de hash")
+    parser.add_argument("--database-url", default="sqlite:////tmp/agrivision_bench_passwords.db")
+    parser.add_argument("--methods", default=DEFAULT_METHODS, help="métodos de werkzeug separados por coma")
+    parser.add_argument("--seconds", type=float, default=5, help="duración de cada medición")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="procesos del pool de hashing")
+    parser.add_argument("--concurrency", type=int, default=2 * (os.cpu_count() or 1), help="clientes concurrentes")
+    parser.add_argument("--output", help="archivo JSON donde guardar los resultados")
+    return parser.parse_args()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else None
+
+
+def measure_single_core(method, seconds):
+    """Verificaciones por segundo en el thread actual"""
+    from werkzeug.security import generate_password_hash, check_password_hash
+
+    password_hash = generate_password_hash("benchmark-password", method=method)
+    done = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        check_password_hash(password_hash, "benchmark-password")
+        done += 1
+    return round(done / (time.perf_counter() - started), 2)
+
+
+def measure_logins(app, email, password, seconds, concurrency):
+    """Logins concurrentes contra /api/login durante `seconds` segundos"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client_loop():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = client.post("/api/login", json={"email": email, "password": password})
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client_loop) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "logins_per_s": round(statuses.get(200, 0) / elapsed, 2),
+        "rejected_429": statuses.get(429, 0),
+        "statuses": statuses,
+        "p50_ms": round(percentile(latencies, 0.50), 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99), 3) if latencies else None,
+    }
+
+
+def main():
+    args = parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+    sys.path.insert(0, SRC_DIR)
+
+    from app import app
+    from api.models import db, User
+    from api.passwords import hash_password
+
+    app.config.update(PASSWORD_HASH_POOL="process", PASSWORD_HASH_WORKERS=args.workers,
+                      PASSWORD_HASH_MAX_PENDING=4 * args.workers)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    results = {}
+    for method in [method.strip() for method in args.methods.split(",") if method.strip()]:
+        print(f"Midiendo {method} ...")
+        app.config["PASSWORD_HASH_METHOD"] = method
+        email = f"bench-{len(results)}@agrivision.test"
+
+        with app.app_context():
+            user = User(full_name="Bench", email=email, phone_number="0", salt="salt", is_admin="user",
+                        password=hash_password("benchmark-password", "salt"))
+            db.session.add(user)
+            db.session.commit()
+
+        per_core = measure_single_core(method, args.seconds)
+        end_to_end = measure_logins(app, email, "benchmark-password", args.seconds, args.concurrency)
+        results[method] = {
+            "single_core_verifications_per_s": per_core,
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            **end_to_end,
+            "logins_per_s_per_core": round(end_to_end["logins_per_s"] / args.workers, 2),
+        }
+
+    print(f"\n{'método':<26} {'verif/s 1 core':>15} {'logins/s':>10} {'por core':>9} {'429':>6} {'p50 ms':>9} {'p99 ms':>9}")
+    print("-" * 90)
+    for method, result in results.items():
+        print(f"{method:<26} {result['single_core_verifications_per_s']:>15} {result['logins_per_s']:>10} "
+              f"{result['logins_per_s_per_core']:>9} {result['rejected_429']:>6} "
+              f"{str(result['p50_ms']):>9} {str(result['p99_ms']):>9}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+        print(f"\nResultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
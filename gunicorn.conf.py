@@ -0,0 +1,26 @@
+"""
+Configuración de gunicorn (se carga sola desde la raíz del proyecto, ver Procfile).
+
+Prepara las métricas de Prometheus en modo multiproceso (ver src/api/metrics.py): cada worker
+escribe sus valores en PROMETHEUS_MULTIPROC_DIR y /metrics los suma.
+"""
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "agrivision_metrics"))
+
+
+def on_starting(server):
+    # Archivos de una ejecución anterior falsearían los contadores
+    folder = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder, exist_ok=True)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
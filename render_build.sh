@@ -7,4 +7,7 @@ npm run build
 
 pipenv install
 
+# variantes .br / .gz de los assets de dist/ (ver src/api/static_assets.py)
+pipenv run flask compress-assets
+
 pipenv run upgrade
@@ -0,0 +1,107 @@
+"""
+Autorización basada en los claims del JWT.
+
+El token de login lleva, además del id del usuario (identity):
+    role -> "admin" o "user" (User.is_admin al momento del login)
+    ver  -> User.token_version al momento del login
+
+Los decoradores (@admin_required, @farm_owner_or_admin) confían en esos claims sin consultar
+la base. Para que un cambio de rol no quede vigente hasta que el token expire, cada cambio de
+User.is_admin incrementa token_version; la versión actual de cada usuario sale de la caché
+de identidad (api/identity.py) y, si no coincide con la del token, se usa el rol leído de la
+base en vez del claim.
+"""
+from functools import wraps
+from flask import jsonify, request, g
+from flask_jwt_extended import create_access_token, verify_jwt_in_request, get_jwt, get_jwt_identity
+from sqlalchemy import event
+from api.models import User
+from api.identity import get_user_version, get_farm
+
+
+def create_user_token(user, expires_delta=None):
+    """Access token con el rol y la versión del usuario como claims"""
+    return create_access_token(
+        identity=str(user.id),
+        expires_delta=expires_delta,
+        additional_claims={"role": user.is_admin, "ver": user.token_version}
+    )
+
+
+@event.listens_for(User.is_admin, "set", active_history=True)
+def _bump_token_version(user, value, old_value, initiator):
+    # Solo usuarios ya guardados: al crear uno no hay tokens que invalidar
+    if user.id is not None and old_value != value and old_value in ("admin", "user"):
+        user.token_version = (user.token_version or 0) + 1
+
+
+def get_current_role():
+    """
+    Rol del usuario del token actual ("admin", "user" o None si el usuario no existe).
+    Usa el claim si la versión del token sigue vigente; si no, el rol de la base.
+    """
+    if "current_role" in g:
+        return g.current_role
+
+    identity = get_jwt_identity()
+    role = None
+    if identity is not None and str(identity).isdigit():
+        claims = get_jwt()
+        version, db_role = get_user_version(identity)
+        role = claims.get("role") if "ver" in claims and claims["ver"] == version else db_role
+
+    g.current_role = role
+    return role
+
+
+def is_admin(user_id):
+    """True si el usuario es admin; para el usuario del token no consulta la base"""
+    if str(user_id) == str(get_jwt_identity()):
+        return get_current_role() == "admin"
+    return get_user_version(user_id)[1] == "admin"
+
+
+def admin_required(fn=None, message="Solo administradores pueden acceder"):
+    """
+    Exige un token válido de un admin. Se usa como @admin_required o
+    @admin_required(message="...") para personalizar el error 403.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            if get_current_role() != "admin":
+                return jsonify({"error": message}), 403
+            return view(*args, **kwargs)
+        return wrapper
+
+    return decorator(fn) if fn else decorator
+
+
+def farm_owner_or_admin(fn=None, message="No autorizado para acceder a este campo"):
+    """
+    Exige un token del dueño del campo o de un admin. El farm_id se toma de la URL,
+    de la query string o del formulario; el campo queda en g.farm para el endpoint.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+
+            farm_id = kwargs.get("farm_id") or request.args.get("farm_id", type=int) \
+                or request.form.get("farm_id", type=int)
+            if not farm_id:
+                return jsonify({"error": "farm_id es requerido"}), 400
+
+            farm = get_farm(farm_id)
+            if not farm:
+                return jsonify({"error": "Campo no encontrado"}), 404
+
+            if str(farm.user_id) != str(get_jwt_identity()) and get_current_role() != "admin":
+                return jsonify({"error": message}), 403
+
+            g.farm = farm
+            return view(*args, **kwargs)
+        return wrapper
+
+    return decorator(fn) if fn else decorator
@@ -3,7 +3,7 @@ import click
 from api.models import db, User
 import sys
 import os
-from werkzeug.security import generate_password_hash
+from api.passwords import hash_password
 from base64 import b64encode
 from flask_sqlalchemy import SQLAlchemy
 from api.utils import make_user_admin
@@ -39,6 +39,94 @@ def setup_commands(app):
     def insert_test_data():
         pass
 
+    # ============ ESTADÍSTICAS ============
+
+    @app.cli.command("rebuild-stats")
+    def rebuild_stats_command():
+        """Recalcular farm_stats y global_stats desde cero (después de migrar o de cargas masivas)."""
+        from api.stats import rebuild_stats
+
+        totals = rebuild_stats()
+        for name, value in totals.items():
+            print(f"{name}: {value}")
+
+    # ============ DATOS PARA BENCHMARKS ============
+
+    @app.cli.command("seed-bench")
+    @click.option("--users", default=1000, help="Usuarios a crear")
+    @click.option("--farms", default=5, help="Campos por usuario")
+    @click.option("--images", default=20, help="Imágenes por campo")
+    @click.option("--reports", default=4, help="Reportes / diagnósticos por campo (mitad y mitad)")
+    @click.option("--seed", default=42, help="Semilla: los mismos parámetros generan los mismos datos")
+    @click.option("--batch-size", default=10000, help="Filas por INSERT masivo")
+    def seed_bench_command(users, farms, images, reports, seed, batch_size):
+        """Generar un dataset sintético grande para pruebas de carga (ver api/seed.py)."""
+        from api.seed import seed_bench, BENCH_PASSWORD
+
+        counts = seed_bench(users, farms, images, reports, seed=seed, batch_size=batch_size, echo=click.echo)
+        click.echo(f"Listo en {counts['seconds']} s. Contraseña de los usuarios: {BENCH_PASSWORD}")
+
+    # ============ ARCHIVOS ESTÁTICOS ============
+
+    @app.cli.command("compress-assets")
+    def compress_assets_command():
+        """Generar las variantes .gz / .br de dist/ (correr después de npm run build)."""
+        from flask import current_app
+        from api.static_assets import compress_assets, brotli
+
+        root = current_app.extensions["static_manifest"].root
+        if brotli is None:
+            print("brotli no está instalado: solo se generan archivos .gz")
+        for path, size, gzip_size, brotli_size in compress_assets(root):
+            print(f"{path}: {size} -> gz {gzip_size}" + (f", br {brotli_size}" if brotli_size else ""))
+
+    # ============ WORKER DE SUBIDAS ============
+
+    @app.cli.command("upload-worker")
+    @click.option("--workers", default=4, help="Cantidad de subidas en paralelo")
+    @click.option("--poll-interval", default=2.0, help="Segundos de espera cuando no hay jobs pendientes")
+    @click.option("--once", is_flag=True, help="Procesar los jobs pendientes y terminar")
+    def upload_worker_command(workers, poll_interval, once):
+        """Procesar los upload jobs pendientes (para UPLOAD_JOBS_MODE=external) y recuperar los huérfanos."""
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from flask import current_app
+        from api.uploads import pending_job_ids, process_upload_job, recover_stale_jobs
+
+        flask_app = current_app._get_current_object()
+
+        def run_job(job_id):
+            with flask_app.app_context():
+                job = process_upload_job(job_id)
+                if job is not None:
+                    click.echo(f"Job {job.id} ({job.kind}): {job.status}")
+
+        click.echo(f"Upload worker iniciado con {workers} workers")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                # jobs que otro worker dejó a medias al caerse vuelven a "pending"
+                recovered = recover_stale_jobs()
+                if recovered:
+                    click.echo(f"Jobs recuperados: {len(recovered)}")
+                job_ids = pending_job_ids(limit=workers * 4)
+                db.session.remove()
+
+                if job_ids:
+                    list(executor.map(run_job, job_ids))
+                elif once:
+                    break
+                else:
+                    time.sleep(poll_interval)
+
+    @app.cli.command("cleanup-resumable-uploads")
+    @click.option("--ttl-hours", default=None, type=int, help="Horas sin actividad (por defecto RESUMABLE_UPLOAD_TTL_HOURS)")
+    def cleanup_resumable_uploads_command(ttl_hours):
+        """Borrar las subidas reanudables abandonadas y sus bloques en disco."""
+        from api.resumable import expire_upload_sessions
+
+        click.echo(f"Subidas reanudables borradas: {expire_upload_sessions(ttl_hours)}")
+
 
  # ============ COMANDOS DE ADMINISTRACIÓN ============
 
@@ -66,10 +154,7 @@ def setup_commands(app):
         salt = b64encode(os.urandom(32)).decode("utf-8")
         
         # Usar la misma función de hash que en routes.py
-        def create_password(password, salt):
-            return generate_password_hash(f"{password}{salt}")
-        
-        password_hash = create_password(password, salt)
+        password_hash = hash_password(password, salt)
         
         # Crear nuevo usuario admin
         new_user = User(
@@ -199,10 +284,7 @@ def setup_commands(app):
         # Crear primer administrador
         salt = b64encode(os.urandom(32)).decode("utf-8")
         
-        def create_password(password, salt):
-            return generate_password_hash(f"{password}{salt}")
-        
-        password_hash = create_password(admin_password, salt)
+        password_hash = hash_password(admin_password, salt)
         
         admin_user = User(
             full_name=admin_name,
@@ -0,0 +1,146 @@
+"""
+Compresión de las respuestas de la API (gzip, y brotli si está instalado).
+
+Los JSON de los listados del admin (all-users, all-farms, farm-details) pueden pesar varios MB
+y los clientes rurales tienen enlaces lentos. Un hook after_request comprime según el
+Accept-Encoding del cliente (br si lo acepta con la misma calidad que gzip):
+
+    - solo tipos de texto (COMPRESSIBLE_TYPES de static_assets.py): JPEG, PNG, PDF, zip, etc.
+      ya vienen comprimidos y no se tocan
+    - cuerpos de menos de COMPRESSION_MIN_SIZE bytes se mandan tal cual
+    - respuestas que ya tienen Content-Encoding (variantes .br / .gz de dist/) o que son
+      archivos servidos con send_file (direct_passthrough) se dejan igual
+    - respuestas en streaming (generadores) se comprimen de a un chunk, con un flush por chunk
+      para que el cliente siga recibiendo los datos a medida que se generan
+
+El ETag de una respuesta comprimida pasa a ser débil (W/"..."): el mismo contenido comprimido
+con otro nivel no es idéntico byte a byte. If-None-Match usa comparación débil (etags.py).
+
+Los bytes antes y después de comprimir se cuentan por endpoint y encoding en /metrics
+(http_compression_input_bytes / http_compression_output_bytes, ver metrics.py).
+"""
+import gzip
+import zlib
+from flask import request, current_app
+from api.metrics import count_compressed
+from api.static_assets import COMPRESSIBLE_TYPES, brotli
+
+ENCODINGS = ("br", "gzip")
+DEFAULT_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 4
+DEFAULT_MIN_SIZE = 1024
+
+
+def choose_encoding():
+    """Encoding a usar según Accept-Encoding, o None si el cliente no acepta ninguno"""
+    accepted = request.accept_encodings
+    best = None
+    for encoding in ENCODINGS:
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted[encoding] > 0 and (best is None or accepted[encoding] > accepted[best]):
+            best = encoding
+    return best
+
+
+def _level(encoding):
+    config = current_app.config
+    if encoding == "br":
+        return config.get("COMPRESSION_BROTLI_QUALITY", DEFAULT_BROTLI_QUALITY)
+    return config.get("COMPRESSION_LEVEL", DEFAULT_LEVEL)
+
+
+def compress(data, encoding, level):
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class StreamCompressor:
+    """Compresor incremental: cada chunk sale comprimido y con flush, listo para enviar"""
+
+    def __init__(self, encoding, level):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)    # formato gzip
+
+    def chunk(self, data):
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def _compress_stream(response, encoding, level, endpoint):
+    source = response.response
+    chunks = response.iter_encoded()
+
+    def generate():
+        compressor = StreamCompressor(encoding, level)
+        original = sent = 0
+        try:
+            for chunk in chunks:
+                original += len(chunk)
+                compressed = compressor.chunk(chunk)
+                sent += len(compressed)
+                yield compressed
+            tail = compressor.finish()
+            sent += len(tail)
+            yield tail
+        finally:
+            # el generador original (ej: stream_with_context) tiene que cerrarse igual
+            if hasattr(source, "close"):
+                source.close()
+            count_compressed(endpoint, encoding, original, sent)
+
+    response.response = generate()
+    response.headers.pop("Content-Length", None)
+
+
+def _compressible(response):
+    return (
+        200 <= response.status_code < 300 and response.status_code != 204
+        and not response.direct_passthrough
+        and "Content-Encoding" not in response.headers
+        and (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)
+    )
+
+
+def _after_request(response):
+    if not current_app.config.get("COMPRESSION_ENABLED", True) or not _compressible(response):
+        return response
+
+    # La respuesta depende del Accept-Encoding aunque esta vez no se comprima
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    level = _level(encoding)
+    endpoint = request.endpoint or "unmatched"
+
+    if response.is_streamed:
+        _compress_stream(response, encoding, level, endpoint)
+    else:
+        body = response.get_data()
+        if len(body) < current_app.config.get("COMPRESSION_MIN_SIZE", DEFAULT_MIN_SIZE):
+            return response
+        compressed = compress(body, encoding, level)
+        response.set_data(compressed)
+        count_compressed(endpoint, encoding, len(body), len(compressed))
+
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def setup_compression(app):
+    app.after_request(_after_request)
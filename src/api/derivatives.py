@@ -0,0 +1,373 @@
+"""
+Derivados de las imágenes de los campos: miniatura y pirámide de tiles para hacer zoom.
+
+Los listados devuelven thumb_url / tiles_url en vez de obligar al dashboard a descargar
+cada ortofoto NDVI / aérea en resolución completa. Las URLs van firmadas con vencimiento
+(exp, DERIVATIVE_URL_TTL) para poder usarlas en <img> sin el token.
+
+Toda la generación pasa por un único thread por proceso (una imagen decodificada a la vez):
+se encola al terminar la subida (DERIVATIVES_ON_UPLOAD) y, si faltan, desde la ruta, que
+responde 202 hasta que estén. Ni el request ni los workers de subida decodifican la imagen. Las imágenes de más de DERIVATIVES_MAX_PIXELS píxeles no se decodifican
+(ImageTooLarge), así una ortofoto enorme no puede llevarse la memoria del worker.
+
+Caché en disco (DERIVATIVES_FOLDER), una carpeta por contenido (content_hash):
+    <hash>/meta.json             -> ancho, alto, tile_size, max_zoom, formato y bytes ocupados
+    <hash>/thumb.<ext>
+    <hash>/tiles/<z>/<x>/<y>.<ext>
+Cada acceso actualiza la fecha de meta.json; si la caché supera DERIVATIVES_CACHE_MB se
+borran primero las imágenes usadas hace más tiempo (LRU).
+
+En la pirámide el nivel 0 entra en un solo tile y cada nivel duplica la resolución del
+anterior hasta max_zoom, que es la imagen original.
+"""
+import hashlib
+import hmac
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from flask import current_app, url_for
+from PIL import Image
+from api.storage import get_storage
+
+DEFAULT_THUMBNAIL_SIZE = 256
+DEFAULT_TILE_SIZE = 256
+DEFAULT_URL_TTL = 24 * 60 * 60
+DEFAULT_MAX_PIXELS = 100_000_000
+
+_locks = {}
+_locks_lock = Lock()
+_executor = None
+_pending = set()        # claves de caché con la generación encolada en este proceso
+_failed = {}            # clave de caché -> motivo, para no volver a descargar una imagen que no se puede procesar
+
+
+class ImageTooLarge(ValueError):
+    """La imagen supera DERIVATIVES_MAX_PIXELS: no se generan sus derivados"""
+
+
+# ----------- URLs firmadas -----------------------------
+
+def url_expiry():
+    """
+    Vencimiento de las URLs firmadas. Se redondea a bloques de DERIVATIVE_URL_TTL segundos, así
+    las URLs (y los listados que las incluyen) no cambian en cada request y siguen valiendo al
+    menos DERIVATIVE_URL_TTL segundos.
+    """
+    ttl = current_app.config.get("DERIVATIVE_URL_TTL", DEFAULT_URL_TTL)
+    return (int(time.time()) // ttl + 2) * ttl
+
+
+def sign_image(image_id, expires):
+    """Firma del id de la imagen y su vencimiento: permite usar las URLs de derivados en <img> sin el header Authorization"""
+    secret = current_app.config["JWT_SECRET_KEY"].encode("utf-8")
+    message = f"farm-image:{image_id}:{expires}".encode("utf-8")
+    return hmac.new(secret, message, hashlib.sha256).hexdigest()[:32]
+
+
+def valid_signature(image_id, signature, expires):
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    return bool(signature) and time.time() <= expires \
+        and hmac.compare_digest(sign_image(image_id, expires), signature)
+
+
+def derivative_urls(image_id):
+    """
+    URLs firmadas de la miniatura y de los tiles de una imagen
+
+    Returns:
+        dict: {"thumb_url": str, "tiles_url": plantilla con {z}/{x}/{y}}
+    """
+    expires = url_expiry()
+    signature = sign_image(image_id, expires)
+    tiles_base = url_for("api.get_image_tiles_info", image_id=image_id, _external=True)
+    return {
+        "thumb_url": url_for("api.get_image_thumbnail", image_id=image_id, exp=expires, sig=signature, _external=True),
+        "tiles_url": f"{tiles_base}/{{z}}/{{x}}/{{y}}?exp={expires}&sig={signature}"
+    }
+
+
+def derivative_urls_builder():
+    """
+    Igual que derivative_urls pero con un solo url_for por listado: devuelve una función
+    image_id -> dict que solo calcula la firma y arma los strings
+    """
+    images_base = url_for("api.get_image_tiles_info", image_id=0, _external=True)[:-len("/0/tiles")]
+    expires = url_expiry()
+
+    def build(image_id):
+        query = f"exp={expires}&sig={sign_image(image_id, expires)}"
+        return {
+            "thumb_url": f"{images_base}/{image_id}/thumb?{query}",
+            "tiles_url": f"{images_base}/{image_id}/tiles/{{z}}/{{x}}/{{y}}?{query}"
+        }
+
+    return build
+
+
+# ----------- Caché en disco -----------------------------
+
+def _cache_root():
+    return current_app.config["DERIVATIVES_FOLDER"]
+
+
+def cache_key(image):
+    """Las imágenes con el mismo contenido comparten derivados"""
+    return image.content_hash or hashlib.sha256(image.image_url.encode("utf-8")).hexdigest()
+
+
+def _read_meta(folder):
+    try:
+        with open(os.path.join(folder, "meta.json")) as meta_file:
+            return json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _lock_for(key):
+    with _locks_lock:
+        return _locks.setdefault(key, Lock())
+
+
+def evict_cache(keep=None):
+    """Borra las entradas menos usadas hasta que la caché quede por debajo de DERIVATIVES_CACHE_MB"""
+    root = _cache_root()
+    limit = current_app.config.get("DERIVATIVES_CACHE_MB", 1024) * 1024 * 1024
+
+    entries = []
+    for name in os.listdir(root):
+        meta_path = os.path.join(root, name, "meta.json")
+        try:
+            last_used = os.stat(meta_path).st_mtime
+        except OSError:
+            continue
+        meta = _read_meta(os.path.join(root, name)) or {}
+        entries.append((last_used, meta.get("bytes", 0), name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= limit:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        total -= size
+
+
+# ----------- Generación -----------------------------
+
+def _open_source(image_url):
+    """Descarga la imagen original a un temporal (en memoria si es chica) listo para Pillow"""
+    source = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    for chunk in get_storage().stream_url(image_url):
+        source.write(chunk)
+    source.seek(0)
+    return source
+
+
+def _build_pyramid(original, folder, tile_size, thumbnail_size):
+    """Escribe la miniatura y todos los niveles de tiles; devuelve meta.json"""
+    if original.mode in ("RGBA", "LA") or (original.mode == "P" and "transparency" in original.info):
+        level, file_format, extension = original.convert("RGBA"), "PNG", "png"
+    else:
+        # sin convert() si ya es RGB: evita una segunda copia de la imagen completa en memoria
+        level = original if original.mode == "RGB" else original.convert("RGB")
+        file_format, extension = "JPEG", "jpg"
+    save_options = {"quality": 85} if file_format == "JPEG" else {"optimize": True}
+
+    width, height = level.size
+    max_zoom = max(0, math.ceil(math.log2(max(width, height) / tile_size)))
+    thumbnail_source = level
+    total_bytes = 0
+
+    for zoom in range(max_zoom, -1, -1):
+        for x in range(math.ceil(level.width / tile_size)):
+            column_folder = os.path.join(folder, "tiles", str(zoom), str(x))
+            os.makedirs(column_folder, exist_ok=True)
+            for y in range(math.ceil(level.height / tile_size)):
+                box = (x * tile_size, y * tile_size,
+                       min((x + 1) * tile_size, level.width), min((y + 1) * tile_size, level.height))
+                tile_path = os.path.join(column_folder, f"{y}.{extension}")
+                level.crop(box).save(tile_path, file_format, **save_options)
+                total_bytes += os.path.getsize(tile_path)
+
+        if max(level.size) >= thumbnail_size:
+            thumbnail_source = level
+        if zoom:
+            level = level.resize((max(1, math.ceil(level.width / 2)), max(1, math.ceil(level.height / 2))),
+                                 Image.LANCZOS)
+
+    thumbnail = thumbnail_source.copy()
+    thumbnail.thumbnail((thumbnail_size, thumbnail_size), Image.LANCZOS)
+    thumbnail_path = os.path.join(folder, f"thumb.{extension}")
+    thumbnail.save(thumbnail_path, file_format, **save_options)
+    total_bytes += os.path.getsize(thumbnail_path)
+
+    return {
+        "width": width,
+        "height": height,
+        "tile_size": tile_size,
+        "max_zoom": max_zoom,
+        "format": extension,
+        "bytes": total_bytes
+    }
+
+
+def get_derivatives(image):
+    """
+    Devuelve los derivados de una imagen, generándolos si no están en caché.
+    Decodifica la imagen original en el thread que la llama: para scripts y tests; la app
+    usa schedule_derivatives.
+
+    Args:
+        image (Farm_images): la imagen original
+
+    Raises:
+        ImageTooLarge: si la imagen supera DERIVATIVES_MAX_PIXELS
+
+    Returns:
+        tuple: (carpeta de la entrada en caché, meta)
+    """
+    return _ensure(cache_key(image), image.image_url)
+
+
+def cached_derivatives(image):
+    """
+    Derivados de una imagen solo si ya están en caché (no decodifica nada; para los requests)
+
+    Returns:
+        tuple: (carpeta de la entrada en caché, meta o None si todavía no se generaron)
+    """
+    folder = os.path.join(_cache_root(), cache_key(image))
+    meta = _read_meta(folder)
+    if meta is not None:
+        # marca de uso para la política LRU
+        os.utime(os.path.join(folder, "meta.json"))
+    return folder, meta
+
+
+def schedule_derivatives(image):
+    """
+    Encola la generación de los derivados en el thread de este proceso (si no estaba encolada)
+
+    Returns:
+        str: motivo si la imagen ya falló antes por ser demasiado grande, o None si se está generando
+    """
+    key = cache_key(image)
+    with _locks_lock:
+        if key in _failed:
+            return _failed[key]
+        if key in _pending:
+            return None
+        _pending.add(key)
+
+    _get_executor().submit(_generate_in_background, current_app._get_current_object(), key, image.image_url)
+    return None
+
+
+def _get_executor():
+    global _executor
+    with _locks_lock:
+        if _executor is None:
+            # un solo thread: como máximo una imagen decodificada a la vez por proceso
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="derivatives")
+    return _executor
+
+
+def _generate_in_background(app, key, image_url):
+    with app.app_context():
+        try:
+            _ensure(key, image_url)
+        except ImageTooLarge as error:
+            _failed[key] = str(error)
+        except Exception as error:
+            # errores transitorios (descarga, disco): el próximo request lo vuelve a intentar
+            print(f"Error generando derivados de {image_url}: {error}")
+        finally:
+            with _locks_lock:
+                _pending.discard(key)
+
+
+def _ensure(key, image_url):
+    root = _cache_root()
+    folder = os.path.join(root, key)
+
+    meta = _read_meta(folder)
+    if meta is None:
+        with _lock_for(key):
+            meta = _read_meta(folder)
+            if meta is None:
+                meta = _generate(image_url, root, folder)
+                evict_cache(keep=key)
+
+    # marca de uso para la política LRU
+    os.utime(os.path.join(folder, "meta.json"))
+    return folder, meta
+
+
+def _open_image(source):
+    """Abre la imagen (solo lee el encabezado) y aplica el límite de DERIVATIVES_MAX_PIXELS"""
+    max_pixels = current_app.config.get("DERIVATIVES_MAX_PIXELS", DEFAULT_MAX_PIXELS)
+    try:
+        original = Image.open(source)
+    except Image.DecompressionBombError:
+        raise ImageTooLarge(f"La imagen supera el máximo de {max_pixels} píxeles")
+
+    width, height = original.size
+    if width * height > max_pixels:
+        original.close()
+        raise ImageTooLarge(f"La imagen tiene {width}x{height} píxeles, el máximo es {max_pixels}")
+    return original
+
+
+def _generate(image_url, root, folder):
+    os.makedirs(root, exist_ok=True)
+    # se genera en una carpeta temporal y se renombra al final: nunca se sirve una pirámide a medias
+    work_folder = tempfile.mkdtemp(dir=root, prefix="tmp-")
+    try:
+        with _open_source(image_url) as source:
+            with _open_image(source) as original:
+                meta = _build_pyramid(
+                    original, work_folder,
+                    current_app.config.get("TILE_SIZE", DEFAULT_TILE_SIZE),
+                    current_app.config.get("THUMBNAIL_SIZE", DEFAULT_THUMBNAIL_SIZE)
+                )
+
+        with open(os.path.join(work_folder, "meta.json"), "w") as meta_file:
+            json.dump(meta, meta_file)
+
+        try:
+            os.rename(work_folder, folder)
+        except OSError:
+            # otro proceso la generó primero
+            shutil.rmtree(work_folder, ignore_errors=True)
+        return meta
+    except Exception:
+        shutil.rmtree(work_folder, ignore_errors=True)
+        raise
+
+
+def generate_after_upload(image):
+    """
+    Encola los derivados de una imagen recién subida en el thread de derivados: los workers de
+    subida no decodifican, así sigue habiendo una sola imagen decodificada a la vez por proceso.
+    Un error no hace fallar la subida.
+    """
+    if not current_app.config.get("DERIVATIVES_ON_UPLOAD", True):
+        return
+    try:
+        schedule_derivatives(image)
+    except Exception as error:
+        print(f"Error encolando derivados de la imagen {image.id}: {error}")
+
+
+def setup_derivatives(app):
+    # Pillow avisa por encima de MAX_IMAGE_PIXELS y corta (DecompressionBombError) por encima del doble
+    Image.MAX_IMAGE_PIXELS = app.config.get("DERIVATIVES_MAX_PIXELS", DEFAULT_MAX_PIXELS)
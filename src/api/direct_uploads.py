@@ -0,0 +1,139 @@
+"""
+Subidas directas de imágenes al almacenamiento, sin que los bytes pasen por los workers.
+
+En /upload-image cada byte de la ortofoto pasa por un worker de gunicorn antes de llegar a
+Cloudinary. Con este flujo la API solo firma y registra:
+
+    1. POST /api/upload-image/presign  {farm_id, image_type, file_name}
+       -> {"upload": cómo subir el archivo (URL, método, campos firmados), "ticket", "expires_at"}
+    2. El cliente sube el archivo directo al almacenamiento con "upload" (Cloudinary: POST
+       multipart con los campos firmados; LocalStorage: PUT a /api/direct-uploads/<token>).
+    3. POST /api/upload-image/confirm  {ticket, result: respuesta del almacenamiento}
+       -> verifica la firma del ticket y la de la respuesta y crea la fila Farm_images
+
+El ticket lleva firmados el usuario, el campo, el tipo de imagen, el nombre del archivo y el
+slot (public_id / ruta reservada), así el confirm no puede cambiar de campo ni registrar un
+archivo que no se subió con esa autorización. Vence a los DIRECT_UPLOAD_TTL segundos.
+
+Confirmar dos veces la misma subida devuelve la imagen ya creada. Los derivados (miniatura y
+tiles) no se generan al confirmar, porque habría que descargar la imagen al worker: se generan
+en el primer pedido de /images/<id>/thumb o /tiles.
+"""
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy.exc import IntegrityError
+from api.auth import is_admin
+from api.identity import get_farm
+from api.models import db, Farm_images
+from api.storage import get_storage
+from api.uploads import build_farm_image
+from api.utils import APIException
+
+DEFAULT_TTL = 60 * 60
+DEFAULT_MAX_MB = 1024
+
+
+def _ticket_serializer():
+    return URLSafeSerializer(current_app.config["JWT_SECRET_KEY"], salt="direct-upload-ticket")
+
+
+def presign_image_upload(user_id, farm_id, image_type, file_name):
+    """
+    Reserva un slot en el almacenamiento y firma los parámetros para subir una imagen
+
+    Args:
+        user_id (int): usuario que va a subir la imagen
+        farm_id (int): campo al que pertenece (ya validado)
+        image_type (str): NDVI o AERIAL
+        file_name (str): nombre seguro del archivo
+
+    Returns:
+        dict: {"upload": parámetros del almacenamiento, "ticket": str, "expires_at": ISO 8601}
+    """
+    expires_at = int(time.time()) + current_app.config.get("DIRECT_UPLOAD_TTL", DEFAULT_TTL)
+    max_size = current_app.config.get("DIRECT_UPLOAD_MAX_MB", DEFAULT_MAX_MB) * 1024 * 1024
+    slot = f"dron_images/direct_{uuid.uuid4().hex}"
+
+    ticket = _ticket_serializer().dumps({
+        "user_id": int(user_id),
+        "farm_id": int(farm_id),
+        "image_type": image_type,
+        "file_name": file_name,
+        "slot": slot,
+        "exp": expires_at,
+    })
+    return {
+        "upload": get_storage().presign_upload(slot, expires_at, max_size, file_name),
+        "ticket": ticket,
+        "expires_at": datetime.fromtimestamp(expires_at, timezone.utc).isoformat(),
+        "max_size": max_size,
+    }
+
+
+def load_ticket(ticket, user_id):
+    """
+    Verifica firma, vencimiento y usuario de un ticket de subida directa
+
+    Raises:
+        APIException: 400 si es inválido, 403 si es de otro usuario, 410 si venció
+
+    Returns:
+        dict: datos firmados del ticket
+    """
+    try:
+        data = _ticket_serializer().loads(ticket or "")
+    except BadSignature:
+        raise APIException("Ticket de subida inválido", status_code=400)
+    if data["user_id"] != int(user_id):
+        raise APIException("El ticket de subida es de otro usuario", status_code=403)
+    if time.time() > data["exp"]:
+        raise APIException("El ticket de subida venció", status_code=410)
+    return data
+
+
+def confirm_image_upload(user, ticket, result):
+    """
+    Registra la imagen subida directamente al almacenamiento
+
+    Args:
+        user (User): usuario actual
+        ticket (str): ticket devuelto por presign_image_upload
+        result (dict): respuesta del almacenamiento a la subida
+
+    Raises:
+        APIException: si el ticket o la firma de la respuesta no son válidos, si el campo
+            ya no existe (404) o si el usuario dejó de ser su dueño (403)
+
+    Returns:
+        tuple: (Farm_images, True si se creó ahora / False si ya estaba confirmada)
+    """
+    data = load_ticket(ticket, user.id)
+    try:
+        stored = get_storage().verify_direct_upload(data["slot"], result or {})
+    except ValueError as error:
+        raise APIException(str(error), status_code=400)
+
+    # El campo pudo borrarse o cambiar de dueño desde el presign: se valida de nuevo
+    farm = get_farm(data["farm_id"])
+    if farm is None:
+        raise APIException("Campo no encontrado", status_code=404)
+    if farm.user_id != user.id and not is_admin(user.id):
+        raise APIException("No autorizado para subir imágenes a este campo", status_code=403)
+
+    existing = Farm_images.query.filter_by(
+        farm_id=data["farm_id"], image_type=data["image_type"], image_url=stored["url"]).first()
+    if existing is not None:
+        return existing, False
+
+    try:
+        image = build_farm_image(data["farm_id"], data["image_type"], stored["url"], data["file_name"],
+                                 str(user.email), stored.get("sha256"))
+        db.session.commit()
+    except IntegrityError:
+        # El campo se borró entre la validación y el commit
+        db.session.rollback()
+        raise APIException("Campo no encontrado", status_code=404)
+    return image, True
@@ -0,0 +1,83 @@
+"""
+ETag y GET condicional para los listados de imágenes e informes.
+
+Cada campo tiene un contador Farm.data_version que se incrementa, en la misma transacción,
+cada vez que se crea, modifica o borra una imagen o un informe del campo (eventos de
+SQLAlchemy, así lo hacen todas las rutas de subida / borrado y los jobs de api/uploads.py sin
+llamadas explícitas). Los INSERT masivos que no pasan por el ORM llaman a bump_farm_versions().
+
+El ETag de un listado es un hash de la URL pedida (con query string: página, fields) y de la
+versión de los campos que muestra. Si el cliente manda If-None-Match con ese ETag se responde
+304 sin ejecutar la consulta del listado: el costo es leer data_version (una búsqueda por
+índice) en vez de consultar y serializar todas las filas.
+"""
+import hashlib
+from flask import request, jsonify, Response
+from sqlalchemy import event, update
+from api.models import db, Farm, Farm_images, DiagnosticReport
+
+
+def bump_farm_versions(farm_ids, connection=None):
+    """Incrementa data_version de los campos (invalida el ETag de sus listados)"""
+    farm_ids = {int(farm_id) for farm_id in farm_ids if farm_id is not None}
+    if not farm_ids:
+        return
+    statement = update(Farm.__table__).where(Farm.__table__.c.id.in_(farm_ids)) \
+        .values(data_version=Farm.__table__.c.data_version + 1)
+    if connection is not None:
+        connection.execute(statement)
+    else:
+        db.session.execute(statement)
+
+
+@event.listens_for(Farm_images, "after_insert")
+@event.listens_for(Farm_images, "after_update")
+@event.listens_for(Farm_images, "after_delete")
+@event.listens_for(DiagnosticReport, "after_insert")
+@event.listens_for(DiagnosticReport, "after_update")
+@event.listens_for(DiagnosticReport, "after_delete")
+def _bump_on_change(mapper, connection, target):
+    # Si la fila cambió de campo, cambian los listados de los dos
+    history = db.inspect(target).attrs.farm_id.history
+    bump_farm_versions({target.farm_id, *history.deleted}, connection)
+
+
+def listing_etag(*versions):
+    """ETag fuerte de la URL actual (host, ruta y query string) con las versiones dadas"""
+    key = f"{request.host}{request.full_path}|{versions}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def farm_version(farm_id):
+    """data_version actual del campo (None si no existe)"""
+    return db.session.query(Farm.data_version).filter(Farm.id == farm_id).scalar()
+
+
+def user_farms_version(user_id):
+    """(farm_id, data_version) de todos los campos del usuario: cambia al subir, borrar o crear campos"""
+    return tuple(db.session.query(Farm.id, Farm.data_version)
+                 .filter(Farm.user_id == user_id).order_by(Farm.id).all())
+
+
+def not_modified(etag):
+    """
+    True si el cliente ya tiene la versión actual del listado (If-None-Match).
+    Comparación débil: la versión comprimida se envía con W/"..." (ver compression.py)
+    """
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified_response(etag):
+    """304 sin cuerpo con el mismo ETag"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def etag_response(payload, etag):
+    """Respuesta JSON del listado con su ETag; no-cache obliga al navegador a revalidar"""
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
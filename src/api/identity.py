@@ -0,0 +1,175 @@
+"""
+Caché de identidad y de propiedad de campos para los endpoints autenticados.
+
+Dos niveles:
+    - memo por request (flask.g): el usuario del token y cada campo consultado se cargan
+      una sola vez por request, aunque el decorador y el endpoint los pidan de nuevo.
+    - caché del proceso, LRU con TTL (IDENTITY_CACHE_TTL segundos, IDENTITY_CACHE_SIZE entradas):
+        user_roles  -> user_id: (token_version, rol)   (lo usa api/auth.py)
+        farm_owners -> farm_id: user_id del dueño
+      Se invalida con eventos de SQLAlchemy al modificar o borrar un User o un Farm, así
+      update-password, delete_farm, make_user_admin, remove_admin_privileges o el panel admin
+      la limpian sin llamadas explícitas. En los demás procesos (varios workers de gunicorn)
+      un dato viejo dura como máximo el TTL. Con IDENTITY_CACHE_TTL=0 se desactiva.
+
+Los contadores de aciertos / fallos se exponen en GET /api/admin/cache-stats.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+from flask import g
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event
+from api.models import db, User, Farm
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU acotado en tamaño donde cada entrada vence a los `ttl` segundos"""
+
+    def __init__(self, maxsize=10000, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl
+        }
+
+
+user_roles = TTLCache()
+farm_owners = TTLCache()
+_memo_stats = {"hits": 0, "misses": 0}
+
+
+# ----------- Memo por request -----------------------------
+
+def _memo(namespace, key, load):
+    memo = g.setdefault("identity_memo", {}).setdefault(namespace, {})
+    if key in memo:
+        _memo_stats["hits"] += 1
+        return memo[key]
+    _memo_stats["misses"] += 1
+    memo[key] = value = load()
+    return value
+
+
+def get_current_user():
+    """Usuario del token actual (None si no existe), cargado una vez por request"""
+    identity = get_jwt_identity()
+    if identity is None or not str(identity).isdigit():
+        return None
+    return _memo("users", int(identity), lambda: db.session.get(User, int(identity)))
+
+
+def get_farm(farm_id):
+    """Campo por id (None si no existe), cargado una vez por request"""
+    try:
+        farm_id = int(farm_id)
+    except (TypeError, ValueError):
+        return None
+    return _memo("farms", farm_id, lambda: db.session.get(Farm, farm_id))
+
+
+# ----------- Caché del proceso -----------------------------
+
+def get_user_version(user_id):
+    """
+    token_version y rol actuales de un usuario
+
+    Returns:
+        tuple: (token_version, rol), o (None, None) si el usuario no existe
+    """
+    user_id = int(user_id)
+    cached = user_roles.get(user_id)
+    if cached is not None:
+        return cached
+
+    row = db.session.query(User.token_version, User.is_admin).filter(User.id == user_id).one_or_none()
+    if row is None:
+        return None, None
+
+    value = (row.token_version, row.is_admin)
+    user_roles.set(user_id, value)
+    return value
+
+
+def get_farm_owner(farm_id):
+    """Id del dueño del campo, o None si el campo no existe"""
+    farm_id = int(farm_id)
+    owner_id = farm_owners.get(farm_id)
+    if owner_id is not None:
+        return owner_id
+
+    owner_id = db.session.query(Farm.user_id).filter(Farm.id == farm_id).scalar()
+    if owner_id is not None:
+        farm_owners.set(farm_id, owner_id)
+    return owner_id
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, user):
+    user_roles.invalidate(user.id)
+
+
+@event.listens_for(Farm, "after_update")
+@event.listens_for(Farm, "after_delete")
+def _invalidate_farm(mapper, connection, farm):
+    farm_owners.invalidate(farm.id)
+
+
+def cache_stats():
+    """Contadores de aciertos / fallos de cada caché"""
+    return {
+        "user_roles": user_roles.stats(),
+        "farm_owners": farm_owners.stats(),
+        "request_memo": dict(_memo_stats)
+    }
+
+
+def setup_identity_cache(app):
+    for cache in (user_roles, farm_owners):
+        cache.ttl = app.config.get("IDENTITY_CACHE_TTL", 30)
+        cache.maxsize = app.config.get("IDENTITY_CACHE_SIZE", 10000)
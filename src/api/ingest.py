@@ -0,0 +1,192 @@
+"""
+Ingesta de archivos por streaming.
+
+El body del request se lee por bloques y se escribe a un archivo temporal mientras se calcula
+el SHA-256 y el tamaño. Los archivos chicos quedan en memoria; al superar
+INGEST_MEMORY_THRESHOLD se pasan a un archivo en UPLOAD_SPOOL_FOLDER, así una ortofoto de
+cientos de MB nunca queda entera en la memoria del worker.
+
+Se usa de dos formas:
+    - IngestRequest: request_class de la app; el parser multipart de werkzeug escribe cada
+      archivo de request.files en un HashingSpooledFile.
+    - ingest_request_body(): para subidas con el archivo directo como body
+      (Content-Type application/octet-stream, nombre en el header X-File-Name).
+
+Las rutas de subida llaman a allow_large_body() para aceptar hasta MAX_UPLOAD_CONTENT_LENGTH
+(los avatares hasta MAX_AVATAR_CONTENT_LENGTH); el resto de la app queda con el
+MAX_CONTENT_LENGTH global, que es chico.
+"""
+import hashlib
+import io
+import os
+import tempfile
+from flask import Request, current_app, request, g
+from werkzeug.datastructures import FileStorage
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MEMORY_THRESHOLD = 1024 * 1024
+
+
+class HashingSpooledFile:
+    """
+    Archivo temporal que calcula SHA-256 y tamaño a medida que se escribe.
+    Empieza en memoria y pasa a disco (en la carpeta de spool) al superar max_memory.
+    """
+
+    def __init__(self, spool_folder, max_memory=DEFAULT_MEMORY_THRESHOLD):
+        self._spool_folder = spool_folder
+        self._max_memory = max_memory
+        self._file = io.BytesIO()
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.path = None          # ruta en disco una vez que se pasó de memoria a disco
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    @property
+    def in_memory(self):
+        return self.path is None
+
+    def _rollover(self):
+        os.makedirs(self._spool_folder, exist_ok=True)
+        disk_file = tempfile.NamedTemporaryFile(dir=self._spool_folder, prefix="ingest-", delete=False)
+        disk_file.write(self._file.getvalue())
+        self._file = disk_file
+        self.path = disk_file.name
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        if self.in_memory and self.size > self._max_memory:
+            self._rollover()
+        return self._file.write(data)
+
+    def persist(self, path):
+        """
+        Deja el contenido en `path`. Si ya está en disco es un rename (sin copiar bytes);
+        el objeto queda apuntando a la nueva ruta.
+        """
+        if self.in_memory:
+            with open(path, "wb") as target:
+                target.write(self._file.getvalue())
+            return path
+
+        self._file.flush()
+        self._file.close()
+        os.replace(self.path, path)
+        self._file = open(path, "rb")
+        self.path = path
+        return path
+
+    def close(self):
+        # Si nadie hizo persist(), el temporal en disco se borra al cerrar el request
+        if not self.in_memory and os.path.basename(self.path).startswith("ingest-"):
+            self._file.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        else:
+            self._file.close()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __getattr__(self, name):
+        # read, seek, tell, flush, ... se delegan al archivo actual
+        return getattr(self._file, name)
+
+
+def new_ingest_file():
+    """HashingSpooledFile configurado con la carpeta de spool y el umbral de memoria de la app"""
+    return HashingSpooledFile(
+        current_app.config["UPLOAD_SPOOL_FOLDER"],
+        current_app.config.get("INGEST_MEMORY_THRESHOLD", DEFAULT_MEMORY_THRESHOLD)
+    )
+
+
+class IngestRequest(Request):
+    """Request cuyos archivos multipart se escriben en HashingSpooledFile en vez de BytesIO/TemporaryFile"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return new_ingest_file()
+
+
+def allow_large_body(limit=None):
+    """
+    Sube el límite de tamaño del request actual (por defecto MAX_UPLOAD_CONTENT_LENGTH).
+
+    MAX_CONTENT_LENGTH queda chico para toda la app, así /login o /register no cargan bodies
+    enormes con request.json; solo las rutas de subida, que leen por streaming, lo suben.
+    Hay que llamarla antes de tocar request.stream, request.form o request.files.
+    """
+    request.max_content_length = limit or current_app.config.get("MAX_UPLOAD_CONTENT_LENGTH")
+
+
+def ingest_request_body(field_name="file"):
+    """
+    Lee el body crudo del request por bloques a un HashingSpooledFile
+
+    Returns:
+        FileStorage: el archivo recibido, con el nombre del header X-File-Name
+    """
+    ingest_file = new_ingest_file()
+
+    while True:
+        chunk = request.stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        ingest_file.write(chunk)
+
+    ingest_file.seek(0)
+    # se cierra (y se borra si nadie lo persistió) al terminar el request, igual que request.files
+    g.setdefault("ingested_files", []).append(ingest_file)
+    return FileStorage(
+        stream=ingest_file,
+        filename=request.headers.get("X-File-Name", field_name),
+        name=field_name,
+        content_type=request.mimetype
+    )
+
+
+def ingest_info(file_storage):
+    """
+    Checksum y tamaño calculados durante la ingesta (vacío si el archivo no pasó por IngestRequest)
+
+    Returns:
+        dict: {"sha256": str, "size": int} o {}
+    """
+    stream = file_storage.stream
+    if isinstance(stream, HashingSpooledFile):
+        return {"sha256": stream.sha256, "size": stream.size}
+    return {}
+
+
+def file_sha256(path):
+    """SHA-256 de un archivo en disco, leído por bloques"""
+    content_hash = hashlib.sha256()
+    with open(path, "rb") as source:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def setup_ingest(app):
+    app.request_class = IngestRequest
+
+    @app.teardown_request
+    def close_ingested_files(error=None):
+        for ingest_file in g.pop("ingested_files", []):
+            ingest_file.close()
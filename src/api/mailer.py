@@ -0,0 +1,281 @@
+"""
+Cola de correos salientes.
+
+send_email() (api/utils.py) solo arma el mensaje y lo encola; el request responde enseguida.
+Un thread por proceso consume la cola:
+    - reutiliza una única conexión SMTP (handshake TLS + login una vez, no por correo) y la
+      cierra tras MAIL_IDLE_TIMEOUT segundos sin envíos
+    - toma hasta MAIL_BATCH_SIZE mensajes por vuelta y los manda por la misma conexión
+    - si un envío falla reconecta y reintenta con backoff exponencial
+      (MAIL_RETRY_BACKOFF * 2^intento, hasta MAIL_MAX_RETRIES intentos)
+
+La cola está en memoria: si el proceso se reinicia se pierden los correos pendientes (son
+correos de recuperación de contraseña, el usuario puede pedir otro). Al salir se espera hasta
+MAIL_SHUTDOWN_TIMEOUT segundos a que se vacíe.
+
+Con MAIL_QUEUE_MODE="inline" se envía en el mismo request, como antes.
+
+Servidor SMTP: variables de entorno SMTP_ADDRESS, SMTP_PORT, EMAIL_ADDRESS, EMAIL_PASSWORD y
+SMTP_SECURITY ("ssl" por defecto, "starttls" o "none"). Para probar sin mandar correos reales
+se puede levantar un servidor local con aiosmtpd:
+    python -m aiosmtpd -n -l localhost:8025
+    SMTP_ADDRESS=localhost SMTP_PORT=8025 SMTP_SECURITY=none
+
+Métricas (mail_stats(), GET /api/admin/mail-stats): profundidad de la cola, enviados,
+fallidos, reintentos, conexiones abiertas y latencia de envío / de punta a punta.
+"""
+import atexit
+import heapq
+import itertools
+import os
+import queue
+import smtplib
+import ssl
+import time
+from collections import deque
+from threading import Lock, Thread
+from flask import current_app
+from api.metrics import set_mail_queue_depth, count_mail
+
+_queue = None
+_worker = None
+_worker_lock = Lock()
+_settings = {}
+
+_stats_lock = Lock()
+_stats = {"enqueued": 0, "sent": 0, "failed": 0, "retried": 0, "dropped": 0, "connections": 0,
+          "retry_pending": 0}
+_send_latencies = deque(maxlen=1000)       # ms por envío SMTP
+_total_latencies = deque(maxlen=1000)      # ms desde que se encoló hasta que se envió
+
+
+class OutgoingMail:
+    def __init__(self, sender, recipients, message):
+        self.sender = sender
+        self.recipients = recipients
+        self.message = message
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+def _count(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+# ----------- Encolado -----------------------------
+
+def _load_settings():
+    config = current_app.config
+    return {
+        "host": os.getenv("SMTP_ADDRESS"),
+        "port": int(os.getenv("SMTP_PORT") or 465),
+        "username": os.getenv("EMAIL_ADDRESS"),
+        "password": os.getenv("EMAIL_PASSWORD"),
+        "security": os.getenv("SMTP_SECURITY", "ssl"),
+        "batch_size": config.get("MAIL_BATCH_SIZE", 20),
+        "max_retries": config.get("MAIL_MAX_RETRIES", 5),
+        "retry_backoff": config.get("MAIL_RETRY_BACKOFF", 1.0),
+        "idle_timeout": config.get("MAIL_IDLE_TIMEOUT", 60),
+        "timeout": config.get("MAIL_SMTP_TIMEOUT", 30),
+        "shutdown_timeout": config.get("MAIL_SHUTDOWN_TIMEOUT", 10),
+    }
+
+
+def _ensure_worker():
+    global _queue, _worker, _settings
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _settings = _load_settings()
+            if _queue is None:
+                _queue = queue.Queue(maxsize=current_app.config.get("MAIL_QUEUE_MAX", 1000))
+            _worker = Thread(target=_run_worker, name="mail-worker", daemon=True)
+            _worker.start()
+    return _queue
+
+
+def enqueue_mail(sender, recipients, message):
+    """
+    Encola un correo para enviarlo en segundo plano
+
+    Args:
+        sender (str): dirección del remitente (sobre SMTP)
+        recipients (list): destinatarios
+        message (str): mensaje MIME completo (message.as_string())
+
+    Returns:
+        bool: False si la cola está llena y el correo se descartó
+    """
+    if current_app.config.get("MAIL_QUEUE_MODE", "thread") == "inline":
+        return _send_inline(OutgoingMail(sender, recipients, message))
+
+    mail_queue = _ensure_worker()
+    try:
+        mail_queue.put_nowait(OutgoingMail(sender, recipients, message))
+    except queue.Full:
+        _count("dropped")
+        return False
+    _count("enqueued")
+    set_mail_queue_depth(mail_queue.qsize())
+    return True
+
+
+# ----------- Worker -----------------------------
+
+class _Connection:
+    """Conexión SMTP reutilizable entre envíos"""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.server = None
+        self.last_used = 0
+
+    def get(self):
+        if self.server is not None and time.monotonic() - self.last_used > self.settings["idle_timeout"]:
+            self.close()
+        if self.server is None:
+            self.server = self._open()
+            _count("connections")
+        return self.server
+
+    def _open(self):
+        settings = self.settings
+        if settings["security"] == "ssl":
+            server = smtplib.SMTP_SSL(settings["host"], settings["port"], timeout=settings["timeout"],
+                                      context=ssl.create_default_context())
+        else:
+            server = smtplib.SMTP(settings["host"], settings["port"], timeout=settings["timeout"])
+            if settings["security"] == "starttls":
+                server.starttls(context=ssl.create_default_context())
+        if settings["username"] and settings["password"]:
+            server.login(settings["username"], settings["password"])
+        return server
+
+    def send(self, mail):
+        started = time.monotonic()
+        reused = self.server is not None
+        try:
+            self.get().sendmail(mail.sender, mail.recipients, mail.message)
+        except smtplib.SMTPServerDisconnected:
+            # el servidor cerró la conexión reutilizada: se reabre una vez sin contar como reintento
+            self.server = None
+            if not reused:
+                raise
+            self.get().sendmail(mail.sender, mail.recipients, mail.message)
+        self.last_used = time.monotonic()
+        return (self.last_used - started) * 1000
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                pass
+            self.server = None
+
+
+def _send_inline(mail):
+    """Envío sincrónico en el thread del request (MAIL_QUEUE_MODE="inline")"""
+    connection = _Connection(_load_settings())
+    try:
+        latency = connection.send(mail)
+    except Exception as error:
+        print(str(error))
+        _count("failed")
+        count_mail(failed=1)
+        return False
+    finally:
+        connection.close()
+    _count("sent")
+    count_mail(sent=1)
+    with _stats_lock:
+        _send_latencies.append(latency)
+    return True
+
+
+def _run_worker():
+    settings = _settings
+    connection = _Connection(settings)
+    retries = []                     # heap de (momento del próximo intento, n, mail)
+    sequence = itertools.count()
+
+    while True:
+        # Reintentos que ya cumplieron su espera
+        batch = []
+        now = time.monotonic()
+        while retries and retries[0][0] <= now and len(batch) < settings["batch_size"]:
+            batch.append(heapq.heappop(retries)[2])
+
+        # Esperar correos nuevos (o hasta el próximo reintento / el cierre por inactividad)
+        if not batch:
+            wait = retries[0][0] - now if retries else settings["idle_timeout"]
+            try:
+                batch.append(_queue.get(timeout=max(wait, 0.01)))
+            except queue.Empty:
+                if not retries:
+                    connection.close()
+                continue
+
+        while len(batch) < settings["batch_size"]:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        for mail in batch:
+            try:
+                latency = connection.send(mail)
+                _count("sent")
+                count_mail(sent=1)
+                with _stats_lock:
+                    _send_latencies.append(latency)
+                    _total_latencies.append((time.monotonic() - mail.enqueued_at) * 1000)
+            except Exception as error:
+                # la conexión puede haber quedado inválida: se abre otra en el próximo envío
+                connection.close()
+                mail.attempts += 1
+                if mail.attempts >= settings["max_retries"]:
+                    _count("failed")
+                    count_mail(failed=1)
+                    print(f"No se pudo enviar el correo a {mail.recipients}: {error}")
+                else:
+                    _count("retried")
+                    delay = settings["retry_backoff"] * 2 ** (mail.attempts - 1)
+                    heapq.heappush(retries, (time.monotonic() + delay, next(sequence), mail))
+
+        with _stats_lock:
+            _stats["retry_pending"] = len(retries)
+        set_mail_queue_depth(_queue.qsize() + len(retries))
+
+
+# ----------- Métricas -----------------------------
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))], 3)
+
+
+def mail_stats():
+    """Profundidad de la cola, contadores y latencias (p50 / p99 en ms) de los últimos envíos"""
+    with _stats_lock:
+        stats = dict(_stats)
+        send_latencies = list(_send_latencies)
+        total_latencies = list(_total_latencies)
+
+    stats["queue_depth"] = _queue.qsize() if _queue is not None else 0
+    stats["send_latency_ms"] = {"p50": _percentile(send_latencies, 0.5), "p99": _percentile(send_latencies, 0.99)}
+    stats["delivery_latency_ms"] = {"p50": _percentile(total_latencies, 0.5), "p99": _percentile(total_latencies, 0.99)}
+    return stats
+
+
+def _drain_at_exit():
+    if _queue is None or _worker is None:
+        return
+    deadline = time.monotonic() + _settings.get("shutdown_timeout", 10)
+    while time.monotonic() < deadline and (_queue.qsize() or mail_stats()["retry_pending"]):
+        time.sleep(0.1)
+
+
+atexit.register(_drain_at_exit)
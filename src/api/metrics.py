@@ -0,0 +1,181 @@
+"""
+Métricas de la API en formato de exposición de Prometheus (GET /metrics).
+
+Se registran con hooks, sin tocar cada endpoint:
+    - before_request / after_request / teardown_request -> latencia por endpoint (histograma),
+      requests en curso y cantidad / duración de consultas SQL de cada request
+    - eventos before/after_cursor_execute del Engine     -> duración de cada consulta; es el único
+      par de listeners de la app, otros módulos reciben cada consulta con add_statement_listener()
+      (ej: el perfilado de api/profiling.py)
+    - StorageBackend.put (api/storage.py)                 -> duración y bytes de cada subida
+    - cola de correos (api/mailer.py)                     -> profundidad, enviados y fallidos
+    - compresión de respuestas (api/compression.py)       -> bytes antes / después de comprimir
+
+Usa prometheus_client (dependencia opcional: sin ella las métricas no se registran y /metrics
+responde 503). Con varios workers de gunicorn cada proceso escribe sus valores en
+PROMETHEUS_MULTIPROC_DIR y /metrics los suma; gunicorn.conf.py prepara esa carpeta y
+descarta los archivos de los workers que terminan. Con METRICS_TOKEN configurado, /metrics
+exige el header Authorization: Bearer <token>.
+"""
+import hmac
+import os
+import time
+from flask import request, g, has_request_context, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, multiprocess
+except ImportError:
+    prometheus_client = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+STATEMENT_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+UPLOAD_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+if prometheus_client is not None:
+    REQUEST_LATENCY = Histogram(
+        "http_request_duration_seconds", "Latencia de los requests por endpoint",
+        ["method", "endpoint", "status"], buckets=LATENCY_BUCKETS)
+    REQUESTS_IN_FLIGHT = Gauge(
+        "http_requests_in_flight", "Requests en curso", multiprocess_mode="livesum")
+    DB_STATEMENT_DURATION = Histogram(
+        "db_statement_duration_seconds", "Duración de cada consulta SQL", buckets=DB_BUCKETS)
+    DB_STATEMENTS_PER_REQUEST = Histogram(
+        "db_statements_per_request", "Consultas SQL por request", ["endpoint"], buckets=STATEMENT_COUNT_BUCKETS)
+    DB_TIME_PER_REQUEST = Histogram(
+        "db_time_per_request_seconds", "Tiempo total en consultas SQL por request", ["endpoint"], buckets=LATENCY_BUCKETS)
+    STORAGE_UPLOAD_DURATION = Histogram(
+        "storage_upload_duration_seconds", "Duración de las subidas al almacenamiento", ["backend"], buckets=UPLOAD_BUCKETS)
+    STORAGE_UPLOAD_BYTES = Counter(
+        "storage_upload_bytes", "Bytes subidos al almacenamiento", ["backend"])
+    MAIL_QUEUE_DEPTH = Gauge(
+        "mail_queue_depth", "Correos esperando en la cola (incluye reintentos)", multiprocess_mode="livesum")
+    MAIL_SENT = Counter("mail_sent", "Correos enviados")
+    MAIL_FAILED = Counter("mail_failed", "Correos descartados tras agotar los reintentos")
+    COMPRESSION_INPUT_BYTES = Counter(
+        "http_compression_input_bytes", "Bytes de las respuestas comprimidas, antes de comprimir", ["endpoint", "encoding"])
+    COMPRESSION_OUTPUT_BYTES = Counter(
+        "http_compression_output_bytes", "Bytes enviados de las respuestas comprimidas", ["endpoint", "encoding"])
+
+
+_statement_listeners = []     # funciones (sql, segundos) llamadas después de cada consulta
+
+
+def _endpoint():
+    # request.endpoint es el nombre de la vista (ej: api.get_user_images): cardinalidad acotada
+    return request.endpoint or "unmatched"
+
+
+# ----------- Funciones para los demás módulos -----------------------------
+
+def add_statement_listener(listener):
+    """Registra listener(sql, segundos) para cada consulta, con la duración medida por los hooks de abajo"""
+    if listener not in _statement_listeners:
+        _statement_listeners.append(listener)
+
+
+def observe_storage_upload(backend, seconds, size):
+    if prometheus_client is None:
+        return
+    STORAGE_UPLOAD_DURATION.labels(backend).observe(seconds)
+    if size:
+        STORAGE_UPLOAD_BYTES.labels(backend).inc(size)
+
+
+def set_mail_queue_depth(depth):
+    if prometheus_client is not None:
+        MAIL_QUEUE_DEPTH.set(depth)
+
+
+def count_mail(sent=0, failed=0):
+    if prometheus_client is None:
+        return
+    if sent:
+        MAIL_SENT.inc(sent)
+    if failed:
+        MAIL_FAILED.inc(failed)
+
+
+def count_compressed(endpoint, encoding, original, compressed):
+    if prometheus_client is None:
+        return
+    COMPRESSION_INPUT_BYTES.labels(endpoint, encoding).inc(original)
+    COMPRESSION_OUTPUT_BYTES.labels(endpoint, encoding).inc(compressed)
+
+
+# ----------- Hooks -----------------------------
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault("statement_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    started = connection.info.get("statement_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+
+    for listener in _statement_listeners:
+        listener(statement, elapsed)
+
+    if prometheus_client is not None:
+        DB_STATEMENT_DURATION.observe(elapsed)
+    if has_request_context() and "metrics_started" in g:
+        g.db_statements = g.get("db_statements", 0) + 1
+        g.db_time = g.get("db_time", 0.0) + elapsed
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.db_statements = 0
+    g.db_time = 0.0
+    if prometheus_client is not None:
+        REQUESTS_IN_FLIGHT.inc()
+
+
+def _after_request(response):
+    if prometheus_client is not None and "metrics_started" in g:
+        endpoint = _endpoint()
+        REQUEST_LATENCY.labels(request.method, endpoint, response.status_code) \
+            .observe(time.perf_counter() - g.metrics_started)
+        DB_STATEMENTS_PER_REQUEST.labels(endpoint).observe(g.db_statements)
+        DB_TIME_PER_REQUEST.labels(endpoint).observe(g.db_time)
+    return response
+
+
+def _teardown_request(error):
+    # teardown corre siempre, también si el endpoint lanzó una excepción
+    if prometheus_client is not None and "metrics_started" in g:
+        REQUESTS_IN_FLIGHT.dec()
+
+
+def metrics_response():
+    """Cuerpo de /metrics; con PROMETHEUS_MULTIPROC_DIR suma los valores de todos los workers"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(prometheus_client.generate_latest(registry), content_type=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+def setup_metrics(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        if prometheus_client is None:
+            return {"error": "prometheus_client no está instalado"}, 503
+
+        token = app.config.get("METRICS_TOKEN")
+        if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return {"error": "No autorizado"}, 401
+
+        return metrics_response()
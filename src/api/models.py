@@ -1,5 +1,6 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, Boolean, UniqueConstraint
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, Boolean, UniqueConstraint, Index, Text, BigInteger
 from sqlalchemy.orm import Mapped, mapped_column, sessionmaker, relationship
 from datetime import datetime, timezone
 
@@ -17,6 +18,7 @@ class User(db.Model):
     public_id: Mapped[str] = mapped_column(String(255), nullable=True)
     password: Mapped[str] = mapped_column(String(500), nullable=False) 
     salt: Mapped[str] = mapped_column(String(80), nullable = False, default = 1 )
+    token_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")   # se incrementa al cambiar el rol (invalida los claims del JWT)
 
     farm_of_user: Mapped[list["Farm"]] = relationship(back_populates="farm_to_user")    
 
@@ -49,6 +51,7 @@ class Farm(db.Model):
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=False)
     farm_location: Mapped[str] = mapped_column(String(100), nullable=False)
     farm_name: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
+    data_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")   # se incrementa al subir o borrar imágenes / informes (ETag de los listados)
     
     farm_to_user: Mapped["User"] = relationship(back_populates="farm_of_user")
     images: Mapped[list["Farm_images"]] = relationship(back_populates="images_table")
@@ -65,14 +68,23 @@ class Farm(db.Model):
     
 class Farm_images(db.Model):
     __tablename__ = "farm_images"
+    __table_args__ = (
+        # Listados por campo ordenados por (upload_date, id) -> paginación por cursor
+        Index('ix_farm_images_farm_id_upload_date', 'farm_id', 'upload_date', 'id'),
+        # Conteos por tipo de imagen (NDVI / AERIAL) de cada campo
+        Index('ix_farm_images_farm_id_image_type', 'farm_id', 'image_type'),
+        # Deduplicación: buscar si el mismo archivo ya fue subido
+        Index('ix_farm_images_content_hash', 'content_hash'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     farm_id: Mapped[int] = mapped_column(ForeignKey("farm.id"), nullable=False)
     image_url: Mapped[str] = mapped_column(String(500), nullable=False)
     image_type: Mapped[str] = mapped_column(String(50), nullable=False)  # 'NDVI' o 'AERIAL'
-    upload_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.now(timezone.utc))
+    upload_date: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     file_name: Mapped[str] = mapped_column(String(255), nullable=True)
     uploaded_by: Mapped[str] = mapped_column(String(100), nullable=True) 
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=True)   # SHA-256 del archivo
 
     images_table: Mapped["Farm"] = relationship(back_populates="images")
 
@@ -85,20 +97,32 @@ class Farm_images(db.Model):
             "upload_date": self.upload_date.isoformat() if self.upload_date else None,
             "file_name": self.file_name,
             "uploaded_by": self.uploaded_by,
+            "content_hash": self.content_hash,
         }
 
 class DiagnosticReport(db.Model):
     __tablename__ = 'diagnostic_reports'
+    __table_args__ = (
+        # Reportes / diagnósticos de un campo ordenados por (uploaded_at, id)
+        Index('ix_diagnostic_reports_farm_id_is_diagnostic_uploaded_at', 'farm_id', 'is_diagnostic', 'uploaded_at', 'id'),
+        # Conteo de reportes por usuario
+        Index('ix_diagnostic_reports_user_id_is_diagnostic', 'user_id', 'is_diagnostic'),
+        # Deduplicación: buscar si el mismo archivo ya fue subido
+        Index('ix_diagnostic_reports_content_hash', 'content_hash'),
+        # Últimos reportes / diagnósticos de todos los campos (overview del admin)
+        Index('ix_diagnostic_reports_is_diagnostic_id', 'is_diagnostic', 'id'),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('user.id'), nullable=False)
     farm_id: Mapped[int] = mapped_column(Integer, ForeignKey('farm.id'), nullable=True)
     file_name: Mapped[str] = mapped_column(String(255), nullable=False)
     file_url: Mapped[str] = mapped_column(String(255), nullable=False)
-    uploaded_at: Mapped[str] = mapped_column(DateTime, default=datetime.now(timezone.utc))
+    uploaded_at: Mapped[str] = mapped_column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     uploaded_by: Mapped[str] = mapped_column(String(80), nullable=False)
     description: Mapped[str] = mapped_column(String(500), nullable=True)                  # Para distinguir reportes de usuarios vs diagnósticos de admin
     is_diagnostic: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=True)   # SHA-256 del archivo
 
     user_report : Mapped['User'] = relationship(back_populates='user_diagnostic_reports')
     farm_report : Mapped['Farm'] = relationship(back_populates='diagnostic_reports')
@@ -115,4 +139,118 @@ class DiagnosticReport(db.Model):
             "uploaded_by": self.uploaded_by,
             'is_diagnostic': self.is_diagnostic,
             "description": self.description,
-        }
\ No newline at end of file
+            "content_hash": self.content_hash,
+        }
+
+class UploadJob(db.Model):
+    __tablename__ = 'upload_jobs'
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)                             # uuid4
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)                             # image, report, diagnostic o avatar
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default='pending', index=True)  # pending, processing, done o failed
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('user.id'), nullable=False)
+    farm_id: Mapped[int] = mapped_column(Integer, ForeignKey('farm.id'), nullable=True)
+    file_name: Mapped[str] = mapped_column(String(255), nullable=False)
+    spool_path: Mapped[str] = mapped_column(String(500), nullable=True)                       # archivo temporal en disco hasta que se sube
+    params: Mapped[str] = mapped_column(Text, nullable=True)                                  # JSON con image_type, description, opciones del upload
+    result_id: Mapped[int] = mapped_column(Integer, nullable=True)                            # id del Farm_images / DiagnosticReport / User creado
+    result_url: Mapped[str] = mapped_column(String(500), nullable=True)
+    error: Mapped[str] = mapped_column(String(500), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def serialize(self):
+        params = json.loads(self.params or "{}")
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "farm_id": self.farm_id,
+            "file_name": self.file_name,
+            "sha256": params.get("sha256"),
+            "size": params.get("size"),
+            "result_id": self.result_id,
+            "result_url": self.result_url,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+class UploadSession(db.Model):
+    """Subida reanudable en curso: el archivo llega por bloques a disco (ver api/resumable.py)"""
+    __tablename__ = 'upload_sessions'
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)                             # uuid4
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)                             # image o report
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default='uploading', index=True)  # uploading, completing o completed
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('user.id'), nullable=False)
+    farm_id: Mapped[int] = mapped_column(Integer, ForeignKey('farm.id'), nullable=False)
+    file_name: Mapped[str] = mapped_column(String(255), nullable=False)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)                             # tamaño total declarado al iniciar
+    bytes_received: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)         # offset desde donde sigue la subida
+    sha256: Mapped[str] = mapped_column(String(64), nullable=True)                            # checksum esperado del archivo completo
+    params: Mapped[str] = mapped_column(Text, nullable=True)                                  # JSON con image_type, description, opciones del upload
+    job_id: Mapped[str] = mapped_column(String(36), ForeignKey('upload_jobs.id'), nullable=True)  # UploadJob creado al completar
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "farm_id": self.farm_id,
+            "file_name": self.file_name,
+            "size": self.size,
+            "offset": self.bytes_received,
+            "sha256": self.sha256,
+            "job_id": self.job_id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+class FarmStats(db.Model):
+    """Contadores de cada campo, mantenidos en la misma transacción que las subidas / borrados (ver api/stats.py)"""
+    __tablename__ = 'farm_stats'
+    __table_args__ = (
+        # Campos sin diagnósticos (overview del admin)
+        Index('ix_farm_stats_admin_diagnostics', 'admin_diagnostics', 'farm_id'),
+    )
+
+    farm_id: Mapped[int] = mapped_column(Integer, ForeignKey('farm.id', ondelete='CASCADE'), primary_key=True)
+    user_reports: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    admin_diagnostics: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    total_images: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    ndvi_images: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    aerial_images: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+
+    def serialize(self):
+        return {
+            "user_reports": self.user_reports,
+            "admin_diagnostics": self.admin_diagnostics,
+            "total_images": self.total_images,
+            "ndvi_images": self.ndvi_images,
+            "aerial_images": self.aerial_images
+        }
+
+class GlobalStats(db.Model):
+    """Una sola fila (id=1) con los totales del overview del admin"""
+    __tablename__ = 'global_stats'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    total_user_reports: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    total_admin_diagnostics: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    total_images: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    total_farms: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    farms_with_diagnostics: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    total_users: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")     # solo is_admin='user'
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)                                  # último rebuild-stats
+
+    def serialize(self):
+        return {
+            "total_user_reports": self.total_user_reports,
+            "total_admin_diagnostics": self.total_admin_diagnostics,
+            "farms_without_diagnostics": self.total_farms - self.farms_with_diagnostics,
+            "total_farms": self.total_farms,
+            "total_users": self.total_users
+        }
@@ -0,0 +1,148 @@
+"""
+Paginación por cursor (keyset) y proyección de campos para los endpoints de listas.
+
+Parámetros de query string:
+    limit   -> cantidad máxima de elementos por página (por defecto 50, máximo 500)
+    cursor  -> valor opaco devuelto como "next_cursor" en la página anterior
+    fields  -> lista separada por comas de las columnas a devolver (ej: fields=id,image_url)
+
+En vez de OFFSET se filtra por las columnas de orden (ej: (uploaded_at, id)), así cada página
+es un index scan acotado y el tamaño de la respuesta no crece con el historial de imágenes.
+"""
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime
+from flask import request
+from sqlalchemy import and_, or_, DateTime, Select
+from api.models import db
+from api.utils import APIException
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def _to_json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values):
+    """Codifica los valores de las columnas de orden del último elemento como cursor opaco"""
+    raw = json.dumps([_to_json_value(value) for value in values])
+    return urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, order_columns):
+    """
+    Decodifica un cursor recibido en la query string
+
+    Raises:
+        APIException: si el cursor está mal formado
+    """
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        if not isinstance(values, list) or len(values) != len(order_columns):
+            raise ValueError("cursor length")
+
+        decoded = []
+        for column, value in zip(order_columns, values):
+            if isinstance(column.type, DateTime) and value is not None:
+                value = datetime.fromisoformat(value)
+            decoded.append(value)
+        return decoded
+    except (ValueError, TypeError, UnicodeError):
+        raise APIException("Cursor inválido", status_code=400)
+
+
+def get_limit():
+    """Lee y valida el parámetro limit"""
+    limit = request.args.get("limit", DEFAULT_LIMIT, type=int)
+    if limit is None or limit < 1:
+        raise APIException("limit debe ser un entero positivo", status_code=400)
+    return min(limit, MAX_LIMIT)
+
+
+def get_fields(allowed):
+    """
+    Lee el parámetro fields y valida que solo pida columnas permitidas
+
+    Args:
+        allowed (list): nombres de columnas que se pueden proyectar
+
+    Returns:
+        list: columnas pedidas, o None si no se pidió proyección
+    """
+    raw = request.args.get("fields")
+    if not raw:
+        return None
+
+    fields = [field.strip() for field in raw.split(",") if field.strip()]
+    invalid = [field for field in fields if field not in allowed]
+    if invalid:
+        raise APIException(f"Campos no permitidos: {invalid}. Permitidos: {list(allowed)}", status_code=400)
+
+    return fields
+
+
+def _after_cursor(order_columns, values, descending):
+    """
+    Condición "fila posterior al cursor" expandida como
+    (a < x) OR (a = x AND b < y) ... para que funcione igual en SQLite y Postgres
+    """
+    conditions = []
+    for index, column in enumerate(order_columns):
+        equals = [order_columns[i] == values[i] for i in range(index)]
+        beyond = column < values[index] if descending else column > values[index]
+        conditions.append(and_(*equals, beyond))
+    return or_(*conditions)
+
+
+def get_page(order_columns):
+    """
+    Lee y valida limit y cursor de la query string.
+    Llamarlo al inicio del endpoint (fuera del try) para que un cursor inválido responda 400.
+
+    Returns:
+        dict: {"limit": int, "after": valores del cursor o None}
+    """
+    cursor = request.args.get("cursor")
+    return {
+        "limit": get_limit(),
+        "after": decode_cursor(cursor, order_columns) if cursor else None
+    }
+
+
+def paginate(query, order_columns, page, descending=True, cursor_values=None):
+    """
+    Aplica orden, cursor y límite a una consulta
+
+    Args:
+        query (Query | Select): consulta base ya filtrada; un Select de Core (ver read_models.py)
+            devuelve las filas como tuplas sin cargar objetos del ORM
+        order_columns (list): columnas de orden, la última debe ser única (ej: [uploaded_at, id])
+        page (dict): resultado de get_page()
+        descending (bool): True para los más recientes primero
+        cursor_values (callable): opcional, extrae de una fila los valores de orden
+            (necesario cuando la fila es una tupla de entidades, ej: (Farm, User))
+
+    Returns:
+        tuple: (filas de la página, next_cursor o None si no hay más)
+    """
+    limit = page["limit"]
+
+    if page["after"] is not None:
+        query = query.filter(_after_cursor(order_columns, page["after"], descending))
+
+    ordering = [column.desc() if descending else column.asc() for column in order_columns]
+    query = query.order_by(*ordering).limit(limit + 1)
+    rows = db.session.execute(query).all() if isinstance(query, Select) else query.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        values = cursor_values(last) if cursor_values else [getattr(last, column.key) for column in order_columns]
+        next_cursor = encode_cursor(values)
+
+    return rows, next_cursor
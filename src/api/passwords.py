@@ -0,0 +1,132 @@
+"""
+Hash de contraseñas fuera del thread del request.
+
+El KDF de werkzeug (scrypt / pbkdf2) es CPU puro: una ráfaga de logins dejaba a todos los
+workers de gunicorn ocupados calculando hashes. Ahora el cálculo corre en un pool de
+procesos (escapa del GIL) con una cola acotada: si ya hay PASSWORD_HASH_MAX_PENDING hashes
+en curso, /login, /register y /update-password responden 429 con Retry-After en vez de
+encolar sin límite.
+
+Configuración (app.config):
+    PASSWORD_HASH_METHOD      -> método de werkzeug, ej: "scrypt:32768:8:1" o "pbkdf2:sha256:600000"
+    PASSWORD_HASH_POOL        -> "process" (por defecto) o "inline" (en el mismo thread, para tests)
+    PASSWORD_HASH_WORKERS     -> procesos del pool de CADA worker de gunicorn (por defecto, las CPUs
+                                 repartidas entre los WEB_CONCURRENCY workers, mínimo 1)
+    PASSWORD_HASH_MAX_PENDING -> hashes en curso o en cola antes de responder 429
+    PASSWORD_HASH_TIMEOUT     -> segundos máximos de espera por un hash; si se superan también se
+                                 responde 429 (el hash se cancela si todavía no empezó)
+
+Al hacer login con un hash calculado con otros parámetros, se vuelve a calcular con el
+método actual (rehash transparente), así se puede ajustar el costo midiendo los logins/s
+con benchmarks/password_hashing.py.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from threading import BoundedSemaphore, Lock
+from flask import current_app, jsonify
+from werkzeug.security import generate_password_hash, check_password_hash
+from api.utils import APIException
+
+DEFAULT_METHOD = "scrypt:32768:8:1"
+
+_executor = None
+_slots = None
+_executor_lock = Lock()
+
+
+class PasswordHashingBusy(APIException):
+    """Todos los lugares de la cola de hashing están ocupados"""
+
+    def __init__(self, retry_after=1):
+        super().__init__("Demasiadas solicitudes, intenta de nuevo en unos segundos", status_code=429)
+        self.retry_after = retry_after
+
+
+# ----------- Funciones que corren en el pool (deben ser de nivel módulo) -----------------------------
+
+def _generate(secret, method):
+    return generate_password_hash(secret, method=method)
+
+
+def _check(password_hash, secret):
+    return check_password_hash(password_hash, secret)
+
+
+# ----------- Pool -----------------------------
+
+def default_workers():
+    """Procesos del pool por worker de gunicorn: entre todos los workers no superan las CPUs"""
+    return max(1, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY") or 1)))
+
+
+def _get_executor():
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            workers = current_app.config.get("PASSWORD_HASH_WORKERS") or default_workers()
+            # "spawn": los procesos hijos no heredan threads ni conexiones a la base del worker
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _slots = BoundedSemaphore(current_app.config.get("PASSWORD_HASH_MAX_PENDING") or workers * 4)
+    return _executor, _slots
+
+
+def _run(function, *args):
+    """Ejecuta function en el pool respetando el límite de pendientes"""
+    if current_app.config.get("PASSWORD_HASH_POOL", "process") == "inline":
+        return function(*args)
+
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        raise PasswordHashingBusy()
+
+    try:
+        future = executor.submit(function, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    timeout = current_app.config.get("PASSWORD_HASH_TIMEOUT", 10)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        # Si todavía estaba en cola se cancela (el callback libera el lugar); si ya corre,
+        # el lugar se libera al terminar, así el límite refleja lo que ocupa el pool
+        future.cancel()
+        raise PasswordHashingBusy(retry_after=max(1, int(timeout)))
+
+
+# ----------- API -----------------------------
+
+def _method():
+    return current_app.config.get("PASSWORD_HASH_METHOD", DEFAULT_METHOD)
+
+
+def hash_password(password, salt):
+    """Hash de password + salt con el método configurado (en el pool)"""
+    return _run(_generate, f"{password}{salt}", _method())
+
+
+def verify_password(password_hash, password, salt):
+    """Verifica password + salt contra el hash guardado (en el pool)"""
+    return _run(_check, password_hash, f"{password}{salt}")
+
+
+@lru_cache(maxsize=8)
+def _hash_prefix(method):
+    # werkzeug completa los parámetros por defecto ("scrypt" -> "scrypt:32768:8:1")
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+def needs_rehash(password_hash):
+    """True si el hash se calculó con un método o parámetros distintos de los actuales"""
+    return password_hash.split("$", 1)[0] != _hash_prefix(_method())
+
+
+def setup_password_hashing(app):
+    @app.errorhandler(PasswordHashingBusy)
+    def handle_hashing_busy(error):
+        response = jsonify(error.to_dict())
+        response.headers["Retry-After"] = str(error.retry_after)
+        return response, error.status_code
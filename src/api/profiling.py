@@ -0,0 +1,178 @@
+"""
+Perfilado de SQL por request y detector de N+1 (opt-in).
+
+Con SQL_PROFILING activado (variable de entorno SQL_PROFILING=1) cada request registra todas
+sus consultas con su duración y una huella normalizada (literales, listas IN y parámetros
+reemplazados por ?), y la respuesta lleva:
+    X-DB-Statements: 14
+    Server-Timing: db;dur=8.31;desc="14 consultas", app;dur=23.90
+    X-DB-N-Plus-One: 3f2a9c1b04de*10      (solo si alguna huella se repite SQL_N_PLUS_ONE_THRESHOLD veces o más)
+
+Las repeticiones se informan con el SQL en el log de la app y se acumulan por endpoint en
+GET /api/admin/sql-profile, para encontrar los endpoints que hacen una consulta por fila.
+
+Para tests / benchmarks, assert_max_statements() verifica un presupuesto de consultas sin
+necesidad de activar el modo:
+    with assert_max_statements(5):
+        client.get("/api/admin/all-farms", headers=headers)
+Solo cuenta las consultas del contexto que abrió el bloque (contextvars): las de otros threads,
+como los workers de subidas o de correos, no entran en el presupuesto.
+
+Las consultas y su duración llegan de los listeners del Engine de api/metrics.py
+(add_statement_listener), así no hay un segundo par de eventos midiendo lo mismo.
+"""
+import hashlib
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from flask import request, g, has_request_context, current_app
+from api.metrics import add_statement_listener
+
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+
+# listas activas de assert_max_statements / capture_statements del contexto actual
+_captures = ContextVar("sql_captures", default=())
+_report_lock = Lock()
+_report = {}                   # endpoint -> resumen acumulado
+
+_NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),                       # strings
+    (re.compile(r"%\(\w+\)s|:\w+|\$\d+|%s"), "?"),              # parámetros con nombre / posicionales
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),                    # números
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?+)"),         # IN (?, ?, ?) -> una sola forma
+    (re.compile(r"__\[POSTCOMPILE_\w+\]"), "(?+)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def fingerprint(statement):
+    """
+    Forma normalizada de una consulta: dos consultas que solo difieren en los valores
+    tienen la misma huella
+
+    Returns:
+        tuple: (huella de 12 caracteres, SQL normalizado)
+    """
+    normalized = statement.strip()
+    for pattern, replacement in _NORMALIZE:
+        normalized = pattern.sub(replacement, normalized)
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12], normalized
+
+
+# ----------- Captura -----------------------------
+
+def _record_statement(statement, seconds):
+    entry = (statement, seconds)
+    for captured in _captures.get():
+        captured.append(entry)
+    if has_request_context() and "sql_profile" in g:
+        g.sql_profile.append(entry)
+
+
+add_statement_listener(_record_statement)
+
+
+@contextmanager
+def capture_statements():
+    """Lista de (sql, segundos) de las consultas ejecutadas dentro del bloque, en este contexto"""
+    captured = []
+    token = _captures.set(_captures.get() + (captured,))
+    try:
+        yield captured
+    finally:
+        _captures.reset(token)
+
+
+@contextmanager
+def assert_max_statements(budget):
+    """Falla con AssertionError si el bloque ejecuta más de `budget` consultas"""
+    with capture_statements() as captured:
+        yield captured
+    if len(captured) > budget:
+        repeated = find_repeated(captured, threshold=2)
+        details = "\n".join(f"  {count}x {sql}" for _, count, sql in repeated) or \
+            "\n".join(f"  {statement}" for statement, _ in captured)
+        raise AssertionError(f"{len(captured)} consultas, el presupuesto es {budget}:\n{details}")
+
+
+def find_repeated(statements, threshold):
+    """
+    Huellas que se repiten `threshold` veces o más
+
+    Returns:
+        list: (huella, repeticiones, SQL normalizado), de la más repetida a la menos
+    """
+    counts = {}
+    for statement, _ in statements:
+        key, normalized = fingerprint(statement)
+        count, _ = counts.get(key, (0, normalized))
+        counts[key] = (count + 1, normalized)
+    repeated = [(key, count, normalized) for key, (count, normalized) in counts.items() if count >= threshold]
+    return sorted(repeated, key=lambda item: item[1], reverse=True)
+
+
+# ----------- Modo por request -----------------------------
+
+def _before_request():
+    if not current_app.config.get("SQL_PROFILING"):
+        return
+    g.sql_profile = []
+    g.sql_profile_started = time.perf_counter()
+
+
+def _after_request(response):
+    if "sql_profile" not in g:
+        return response
+
+    statements = g.sql_profile
+    db_ms = sum(duration for _, duration in statements) * 1000
+    app_ms = (time.perf_counter() - g.sql_profile_started) * 1000
+    threshold = current_app.config.get("SQL_N_PLUS_ONE_THRESHOLD", DEFAULT_N_PLUS_ONE_THRESHOLD)
+    repeated = find_repeated(statements, threshold)
+
+    response.headers["X-DB-Statements"] = str(len(statements))
+    response.headers.add("Server-Timing", f'db;dur={db_ms:.2f};desc="{len(statements)} consultas"')
+    response.headers.add("Server-Timing", f"app;dur={app_ms:.2f}")
+    if repeated:
+        response.headers["X-DB-N-Plus-One"] = ", ".join(f"{key}*{count}" for key, count, _ in repeated)
+        for key, count, normalized in repeated:
+            current_app.logger.warning(f"Posible N+1 en {request.method} {request.path}: {count}x [{key}] {normalized}")
+
+    _record(request.endpoint or "unmatched", len(statements), db_ms, repeated)
+    return response
+
+
+def _record(endpoint, statements, db_ms, repeated):
+    with _report_lock:
+        summary = _report.setdefault(endpoint, {"requests": 0, "statements": 0, "max_statements": 0,
+                                                "db_ms": 0.0, "n_plus_one": {}})
+        summary["requests"] += 1
+        summary["statements"] += statements
+        summary["max_statements"] = max(summary["max_statements"], statements)
+        summary["db_ms"] += db_ms
+        for key, count, normalized in repeated:
+            offender = summary["n_plus_one"].setdefault(key, {"sql": normalized, "max_repeats": 0, "requests": 0})
+            offender["max_repeats"] = max(offender["max_repeats"], count)
+            offender["requests"] += 1
+
+
+def profiling_report():
+    """Resumen por endpoint: requests, consultas promedio / máximas, ms en la base y N+1 detectados"""
+    with _report_lock:
+        return {
+            endpoint: {
+                "requests": summary["requests"],
+                "avg_statements": round(summary["statements"] / summary["requests"], 2),
+                "max_statements": summary["max_statements"],
+                "avg_db_ms": round(summary["db_ms"] / summary["requests"], 3),
+                "n_plus_one": list(summary["n_plus_one"].values())
+            }
+            for endpoint, summary in sorted(_report.items(), key=lambda item: -item[1]["max_statements"])
+        }
+
+
+def setup_profiling(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -0,0 +1,105 @@
+"""
+Read models para los listados: filas como tuplas de columnas y JSON rápido.
+
+Los listados grandes (imágenes de un campo, reportes, detalle de un campo en el admin) no
+necesitan objetos del ORM: se arma un SELECT de Core con solo las columnas pedidas, las filas
+llegan como tuplas y se convierten a dict con un zip contra la tupla de claves calculada una
+vez por listado (sin getattr, isoformat ni hasattr por fila). Las fechas quedan como datetime
+y las serializa el encoder.
+
+El JSON de la app lo genera FastJSONProvider: con orjson instalado, que escribe datetime en
+ISO 8601 sin pasar por Python, las claves salen en el orden de las columnas (sin sort_keys) y
+la respuesta se arma directamente con los bytes. Sin orjson (o si orjson no puede con algún
+valor, ej: enteros de más de 64 bits) se usa el json de la librería estándar con la misma
+salida para las fechas.
+"""
+from datetime import date
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+from api.models import db
+
+try:
+    import orjson
+except ImportError:                     # opcional: sin orjson se usa el json estándar
+    orjson = None
+
+
+def select_fields(model, fields, order_columns=()):
+    """
+    SELECT de Core con las columnas pedidas, más las de orden (necesarias para el cursor)
+
+    Args:
+        model: modelo de la tabla
+        fields (list): columnas a devolver, en el orden en que salen en el JSON
+        order_columns (list): columnas de orden de la paginación
+
+    Returns:
+        Select: la consulta; las filas empiezan con las columnas de fields
+    """
+    keys = list(dict.fromkeys(list(fields) + [column.key for column in order_columns]))
+    return select(*[getattr(model, key) for key in keys])
+
+
+def as_dicts(rows, fields):
+    """
+    Convierte filas de select_fields() en dicts con las claves de fields
+
+    zip corta en la última clave: las columnas de orden agregadas al final no se devuelven
+    """
+    keys = tuple(fields)
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def fetch_dicts(statement, fields):
+    """Ejecuta un SELECT de select_fields() y devuelve las filas como dicts"""
+    return as_dicts(db.session.execute(statement).all(), fields)
+
+
+# ----------- Proveedor de JSON de la app -----------------------------
+
+def _default(value):
+    # Mismo formato que los serialize() de los modelos: fechas en ISO 8601
+    if isinstance(value, date):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify / app.json con orjson si está instalado"""
+
+    default = staticmethod(_default)
+    sort_keys = False                   # los read models ya definen el orden de las claves
+
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def _orjson_dumps(self, obj):
+        try:
+            return orjson.dumps(obj, default=_default, option=self._options())
+        except TypeError:               # orjson.JSONEncodeError
+            return None
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            encoded = self._orjson_dumps(obj)
+            if encoded is not None:
+                return encoded.decode("utf-8")
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        if orjson is None or pretty:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        encoded = self._orjson_dumps(obj)
+        if encoded is None:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(encoded + b"\n", mimetype=self.mimetype)
+
+
+def setup_json(app):
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,276 @@
+"""
+Subidas reanudables para ortofotos y reportes grandes desde conexiones inestables.
+
+En vez de mandar el archivo entero en un solo request (/upload-image, /upload-report), el
+cliente abre una sesión y lo envía por bloques. Si se corta la conexión pregunta cuántos
+bytes llegaron y sigue desde ahí, sin volver a transferir lo que ya está en el servidor:
+
+    POST   /api/uploads/resumable                 -> abre la sesión: kind (image o report), farm_id,
+                                                     file_name, size, sha256 y los datos de la subida
+    GET    /api/uploads/resumable/<id>            -> estado, con el header Upload-Offset
+    PATCH  /api/uploads/resumable/<id>            -> agrega un bloque (body crudo) a partir de
+                                                     Upload-Offset, que debe ser el offset actual
+    POST   /api/uploads/resumable/<id>/complete   -> verifica tamaño y SHA-256 y encola el UploadJob
+    DELETE /api/uploads/resumable/<id>            -> cancela y borra lo recibido
+
+Los bloques se escriben en un único archivo <id>.part dentro de UPLOAD_SPOOL_FOLDER/resumable
+(mismo disco que el spool: al completar se mueve con un rename) y el offset se guarda en
+upload_sessions. Si el request se corta a mitad de un bloque se conserva lo que llegó.
+
+Al completar, el archivo pasa al mismo flujo que una subida normal (api/uploads.py): un
+UploadJob pendiente que sube el archivo y crea el Farm_images / DiagnosticReport. Completar
+dos veces devuelve el mismo job (la respuesta pudo perderse). Si el SHA-256 no coincide la
+sesión vuelve a 0 bytes y el cliente tiene que reenviar el archivo.
+
+Las sesiones sin completar y sin actividad durante RESUMABLE_UPLOAD_TTL_HOURS se borran con
+`flask cleanup-resumable-uploads`.
+"""
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from werkzeug.exceptions import ClientDisconnected
+from api.models import db, UploadSession, UploadJob
+from api.ingest import file_sha256, CHUNK_SIZE
+from api.uploads import build_upload_job, dispatch_job
+from api.utils import APIException
+
+DEFAULT_MAX_SIZE_MB = 4096
+DEFAULT_CHUNK_MB = 8
+DEFAULT_TTL_HOURS = 48
+
+
+def _folder():
+    folder = os.path.join(current_app.config["UPLOAD_SPOOL_FOLDER"], "resumable")
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def part_path(upload):
+    return os.path.join(_folder(), f"{upload.id}.part")
+
+
+def max_size():
+    return current_app.config.get("RESUMABLE_UPLOAD_MAX_MB", DEFAULT_MAX_SIZE_MB) * 1024 * 1024
+
+
+def resumable_chunk_size():
+    """Tamaño de bloque sugerido al cliente (cada PATCH igual está limitado por MAX_UPLOAD_CONTENT_LENGTH)"""
+    return current_app.config.get("RESUMABLE_CHUNK_MB", DEFAULT_CHUNK_MB) * 1024 * 1024
+
+
+def create_upload_session(kind, user_id, farm_id, file_name, size, sha256=None, **params):
+    """
+    Abre una subida reanudable con el archivo vacío en disco
+
+    Args:
+        kind (str): image o report
+        user_id (int): usuario que sube el archivo
+        farm_id (int): campo al que pertenece
+        file_name (str): nombre seguro del archivo
+        size (int): tamaño total en bytes
+        sha256 (str): checksum del archivo completo (también se puede mandar al completar)
+        **params: image_type, description y upload_options, como en enqueue_upload
+
+    Raises:
+        APIException: si el tamaño no es válido
+
+    Returns:
+        UploadSession: la sesión creada (ya commiteada)
+    """
+    if size <= 0:
+        raise APIException("size debe ser un entero positivo", status_code=400)
+    if size > max_size():
+        raise APIException(f"El archivo supera el máximo de {max_size() // (1024 * 1024)} MB", status_code=413)
+
+    upload = UploadSession(
+        id=str(uuid.uuid4()),
+        kind=kind,
+        status="uploading",
+        user_id=int(user_id),
+        farm_id=int(farm_id),
+        file_name=file_name,
+        size=size,
+        bytes_received=0,
+        sha256=sha256.lower() if sha256 else None,
+        params=json.dumps(params)
+    )
+    open(part_path(upload), "wb").close()
+
+    try:
+        db.session.add(upload)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        os.remove(part_path(upload))
+        raise
+    return upload
+
+
+def _set_received(upload, expected_offset, new_offset, **values):
+    """
+    Actualiza el offset solo si nadie lo cambió desde que se leyó (UPDATE condicional),
+    así dos PATCH simultáneos no pueden avanzar la misma sesión
+
+    Returns:
+        bool: True si se actualizó
+    """
+    updated = UploadSession.query.filter_by(
+        id=upload.id, status="uploading", bytes_received=expected_offset
+    ).update({"bytes_received": new_offset, "updated_at": datetime.now(timezone.utc), **values},
+             synchronize_session=False)
+    db.session.commit()
+    return updated == 1
+
+
+def append_chunk(upload, offset, stream, length=None):
+    """
+    Escribe un bloque a partir de `offset`, que tiene que ser el offset actual de la sesión
+
+    Args:
+        upload (UploadSession): la sesión
+        offset (int): header Upload-Offset del request
+        stream: body del request
+        length (int): Content-Length del request, si vino
+
+    Raises:
+        APIException: 409 si la sesión no está abierta o el offset no coincide,
+            413 si el bloque supera el tamaño declarado (el offset no avanza)
+
+    Returns:
+        int: el nuevo offset
+    """
+    if upload.status != "uploading":
+        raise APIException("La subida ya fue completada", status_code=409, payload={"status": upload.status})
+    if offset != upload.bytes_received:
+        raise APIException("Upload-Offset no coincide con los bytes recibidos", status_code=409,
+                           payload={"offset": upload.bytes_received})
+
+    remaining = upload.size - offset
+    if length is not None and length > remaining:
+        raise APIException("El bloque supera el tamaño declarado del archivo", status_code=413,
+                           payload={"offset": offset})
+
+    written = 0
+    with open(part_path(upload), "r+b") as target:
+        target.seek(offset)
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if written + len(chunk) > remaining:
+                    # Sin Content-Length (chunked): lo escrito de este bloque se descarta, el
+                    # offset queda donde estaba y el próximo PATCH lo sobrescribe
+                    raise APIException("El bloque supera el tamaño declarado del archivo", status_code=413,
+                                       payload={"offset": offset})
+                target.write(chunk)
+                written += len(chunk)
+        except ClientDisconnected:
+            # Conexión cortada: se guarda lo que llegó y el cliente sigue desde el nuevo offset
+            pass
+        target.flush()
+
+    # Solo se llega acá con el bloque leído hasta el final o cortado por el cliente
+    if written and not _set_received(upload, offset, offset + written):
+        raise APIException("Otra petición modificó la subida al mismo tiempo", status_code=409)
+
+    return offset + written
+
+
+def complete_upload_session(upload, sha256=None):
+    """
+    Verifica el archivo completo y lo pasa al flujo normal de subidas (UploadJob)
+
+    Args:
+        upload (UploadSession): la sesión
+        sha256 (str): checksum esperado, si no se mandó al iniciar
+
+    Raises:
+        APIException: 409 si faltan bytes, 400 si no hay checksum, 422 si el checksum no coincide
+
+    Returns:
+        UploadJob: el job creado, o el existente si la sesión ya estaba completa
+    """
+    if upload.status == "completed":
+        return db.session.get(UploadJob, upload.job_id)
+    if upload.bytes_received != upload.size:
+        raise APIException("Todavía faltan bytes del archivo", status_code=409,
+                           payload={"offset": upload.bytes_received, "size": upload.size})
+
+    expected = (sha256 or upload.sha256 or "").lower()
+    if not expected:
+        raise APIException("Falta sha256 del archivo completo", status_code=400)
+
+    # Tomar la sesión antes de leer el archivo (mismo UPDATE condicional que claim_job)
+    if not _set_received(upload, upload.size, upload.size, status="completing"):
+        raise APIException("La subida ya se está completando", status_code=409)
+
+    path = part_path(upload)
+    actual = file_sha256(path)
+    if actual != expected:
+        open(path, "wb").close()
+        UploadSession.query.filter_by(id=upload.id).update(
+            {"status": "uploading", "bytes_received": 0, "updated_at": datetime.now(timezone.utc)},
+            synchronize_session=False)
+        db.session.commit()
+        raise APIException("El SHA-256 no coincide: hay que volver a enviar el archivo", status_code=422,
+                           payload={"expected": expected, "actual": actual, "offset": 0})
+
+    spool_path = os.path.join(current_app.config["UPLOAD_SPOOL_FOLDER"], uuid.uuid4().hex)
+    os.replace(path, spool_path)
+
+    params = json.loads(upload.params or "{}")
+    try:
+        job = build_upload_job(upload.kind, upload.user_id, spool_path, upload.file_name, upload.farm_id,
+                               sha256=actual, size=upload.size, **params)
+        db.session.flush()
+        upload = db.session.get(UploadSession, upload.id)
+        upload.status = "completed"
+        upload.job_id = job.id
+        upload.updated_at = datetime.now(timezone.utc)
+        db.session.commit()
+    except Exception:
+        # Dejar la sesión como estaba para poder reintentar el complete
+        db.session.rollback()
+        os.replace(spool_path, path)
+        UploadSession.query.filter_by(id=upload.id).update({"status": "uploading"}, synchronize_session=False)
+        db.session.commit()
+        raise
+
+    dispatch_job(job.id)
+    return job
+
+
+def cancel_upload_session(upload):
+    """Borra la sesión y lo recibido (no se puede cancelar una subida ya completada)"""
+    if upload.status != "uploading":
+        raise APIException("La subida ya fue completada", status_code=409, payload={"status": upload.status})
+    path = part_path(upload)
+    db.session.delete(upload)
+    db.session.commit()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def expire_upload_sessions(ttl_hours=None):
+    """
+    Borra las sesiones sin completar y sin actividad durante ttl_hours (y sus archivos)
+
+    Returns:
+        int: sesiones borradas
+    """
+    ttl_hours = ttl_hours or current_app.config.get("RESUMABLE_UPLOAD_TTL_HOURS", DEFAULT_TTL_HOURS)
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=ttl_hours)
+
+    expired = UploadSession.query.filter(
+        UploadSession.status.in_(("uploading", "completing")), UploadSession.updated_at < cutoff
+    ).all()
+    for upload in expired:
+        path = part_path(upload)
+        db.session.delete(upload)
+        if os.path.exists(path):
+            os.remove(path)
+    db.session.commit()
+    return len(expired)
@@ -1,19 +1,39 @@
 """
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
-from flask import Flask, request, jsonify, Blueprint, send_from_directory
-from api.models import db, User, Farm, Farm_images, DiagnosticReport
+from flask import Flask, request, jsonify, Blueprint, send_from_directory, current_app, g
+from api.models import db, User, Farm, Farm_images, DiagnosticReport, FarmStats
 from api.utils import generate_sitemap, APIException, send_email
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from base64 import b64encode
 import os
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
 from datetime import timedelta, datetime, timezone
 import cloudinary
-import cloudinary.uploader as uploader
-from api.utils import is_user_admin_by_id
+from api.auth import create_user_token, admin_required, farm_owner_or_admin, is_admin
+from api.identity import get_current_user, get_farm, get_farm_owner, cache_stats
+from api.passwords import hash_password, verify_password, needs_rehash
+from api.stats import farm_statistics_query, statistics_from_row, get_farm_statistics, get_user_statistics, get_global_stats, count_new_images
+from sqlalchemy.orm import selectinload
+from api.pagination import get_page, get_fields, paginate
+from api.read_models import select_fields, as_dicts, fetch_dicts
+from api.uploads import enqueue_upload, spool_file, spool_stream, upload_files_concurrently, find_stored_urls, is_url_referenced
+from sqlalchemy import insert, select, func
+from api.ingest import ingest_request_body, ingest_info, file_sha256, allow_large_body
+from api.models import UploadJob, UploadSession
+from api.storage import get_storage, LocalStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+from api.direct_uploads import presign_image_upload, confirm_image_upload
+from api.derivatives import cached_derivatives, schedule_derivatives, derivative_urls_builder, valid_signature, url_expiry
+from api.mailer import mail_stats
+from api.profiling import profiling_report
+from api.resumable import create_upload_session, append_chunk, complete_upload_session, cancel_upload_session, resumable_chunk_size
+from api.etags import bump_farm_versions, listing_etag, user_farms_version, not_modified, not_modified_response, etag_response
 
 api = Blueprint('api', __name__)
 
@@ -27,20 +47,48 @@ CORS(api,
 )
 
 # Manejo del Hash de la contraseña creando 2 funciones
+# (el KDF corre en el pool de api/passwords.py; si está saturado se responde 429)
 
 
 def create_password(password, salt):
-    return generate_password_hash(f"{password}{salt}")
+    return hash_password(password, salt)
 
 
 def check_password(password_hash, password, salt):
-    return check_password_hash(password_hash, f"{password}{salt}")
+    return verify_password(password_hash, password, salt)
 
 # Acá termina el manejo del Hash.
 
 # Verificar si el usuario es admin
 def is_admin_user(user_id):
-    return is_user_admin_by_id(user_id)
+    return is_admin(user_id)
+
+# Columnas que se pueden pedir con ?fields= en los listados
+IMAGE_FIELDS = ["id", "farm_id", "image_url", "image_type", "upload_date", "file_name", "uploaded_by", "content_hash"]
+REPORT_FIELDS = ["id", "user_id", "farm_id", "file_name", "file_url", "uploaded_at", "uploaded_by", "is_diagnostic", "description", "content_hash"]
+
+IMAGE_ORDER = [Farm_images.upload_date, Farm_images.id]
+
+# Los derivados de una imagen no cambian: el navegador puede guardarlos un día
+DERIVATIVES_MAX_AGE = 24 * 60 * 60
+REPORT_ORDER = [DiagnosticReport.uploaded_at, DiagnosticReport.id]
+
+# Imágenes serializadas con las URLs firmadas de su miniatura y sus tiles (si se pidió el id)
+def serialize_images(rows, fields):
+    items = as_dicts(rows, fields)
+    if "id" in fields:
+        urls = derivative_urls_builder()
+        for item in items:
+            item.update(urls(item["id"]))
+    return items
+
+# Archivo y datos de una subida: multipart (request.form / request.files) o el archivo
+# directo como body (application/octet-stream) con los datos en la query string
+def get_upload_source(field_name):
+    allow_large_body()
+    if request.mimetype == "application/octet-stream":
+        return request.args, ingest_request_body(field_name)
+    return request.form, request.files.get(field_name)
 
 # Duración de vida del token
 expires_token = 200
@@ -61,6 +109,7 @@ def handle_check():
 
 @api.route('/register', methods=['POST'])
 def add_user():
+    allow_large_body(current_app.config.get("MAX_AVATAR_CONTENT_LENGTH"))   # el avatar viene en el form
     data_form = request.form        # Trae datos del formulario
     data_files = request.files      # Trae archivos del formulario
 
@@ -89,32 +138,33 @@ def add_user():
     if existing_user:
         return jsonify({"error": "User already exists"}), 400
 
-    try:
-        # Crear el salt antes de crear la contraseña
-        salt = b64encode(os.urandom(32)).decode("utf-8")
+    # Crear el salt antes de crear la contraseña (fuera del try: si el pool de hashing
+    # está saturado se responde 429)
+    salt = b64encode(os.urandom(32)).decode("utf-8")
+    password_hash = create_password(data['password'], salt)
 
-        # Subir imagen a Cloudinary
-
-        if data["avatar"] is not None:
-            # funcion .upload(lo_que_quiero_subir)
-            result_image = uploader.upload(data["avatar"])
-
-            data["avatar"] = result_image["secure_url"]
-
-        # Crear el usuario
+    try:
+        # Crear el usuario (el avatar se completa cuando termina su upload job)
         user = User()
         user.full_name = data['full_name']
         user.email = data['email']
         user.phone_number = data['phone_number']
-        user.avatar = data['avatar']
+        user.avatar = None
         user.salt = salt
-        user.password = create_password(data['password'], salt)
+        user.password = password_hash
 
         # Transacción a la BD:
         db.session.add(user)
         db.session.commit()
 
-        return jsonify({"message": "User created successfully"}), 201
+        response_body = {"message": "User created successfully"}
+
+        # Subir imagen a Cloudinary en segundo plano
+        if data["avatar"] is not None:
+            job = enqueue_upload("avatar", user.id, data["avatar"], secure_filename(data["avatar"].filename or "avatar"))
+            response_body["avatar_job_id"] = job.id
+
+        return jsonify(response_body), 201
 
     except Exception as error:
         db.session.rollback()
@@ -138,8 +188,16 @@ def handle_login():
             return jsonify("Credentials are wrong, try again"), 400
         else:
             if check_password(user.password, password, user.salt):
-                token = create_access_token(identity=str(
-                    user.id), expires_delta=expires_delta)
+                # Rehash transparente si el hash se hizo con otros parámetros
+                if needs_rehash(user.password):
+                    try:
+                        user.password = create_password(password, user.salt)
+                        db.session.commit()
+                    except Exception as error:
+                        db.session.rollback()
+                        print(f"No se pudo actualizar el hash del usuario {user.id}: {error}")
+
+                token = create_user_token(user, expires_delta=expires_delta)
                 return jsonify({
                     "token": token}), 200
             else:
@@ -152,7 +210,7 @@ def handle_login():
 def get_dashboard():
     current_user_id = get_jwt_identity()
 
-    user = User.query.get(current_user_id)
+    user = get_current_user()
 
     if user is None:
         return jsonify(
@@ -199,9 +257,8 @@ def reset_password_user():
 @api.route("/update-password", methods=["PUT"])
 @jwt_required()
 def update_password():
-    user_id = get_jwt_identity()
     body = request.get_json()
-    user = User.query.filter_by(user_id=user_id).one_or_none()
+    user = get_current_user()
 
     if user is not None:
         salt = b64encode(os.urandom(32)).decode("utf-8")
@@ -231,7 +288,7 @@ def update_password():
 @jwt_required()
 def get_profile():
     current_user_id = get_jwt_identity()
-    user = User.query.filter_by(id=current_user_id).first()
+    user = get_current_user()
 
     if not user:
         return jsonify({"error": "Usuario no encontrado"}), 404
@@ -265,16 +322,13 @@ def get_about_us():
 @api.route('/upload-image', methods=['POST'])
 @jwt_required()
 def upload_image():
-    data_form = request.form        # Trae datos del formulario
-    data_files = request.files      # Trae archivos del formulario
-
-    print(data_files)
+    # Trae datos del formulario y el archivo (multipart o body crudo, leído por streaming)
+    data_form, image_file = get_upload_source("image_url")
 
     try:
         current_user_id = get_jwt_identity()
         farm_id = data_form.get("farm_id")
         image_type = data_form.get("image_type")  # 'ndvi' o 'aerial'
-        image_file = data_files.get("image_url")  # imagen
 
         if image_file is None:
             return jsonify({"error": "No se recibió ningún archivo de imagen"}), 400
@@ -282,44 +336,300 @@ def upload_image():
         if not farm_id or not image_type or not image_file:
             return jsonify({"error": "Faltan datos requeridos"}), 400
 
-        user = User.query.filter_by(id=current_user_id).first()
+        user = get_current_user()
 
         if not user:
             return jsonify({"error": "Usuario no encontrado"}), 404
 
-        # Subir imagen a Cloudinary
-        upload_result = uploader.upload(image_file, folder="dron_images")
-
-        # Obtener la URL segura
-        image_url = upload_result.get('secure_url')
-
-        # file_name = image_file.filename
-
-        file_name = upload_result.get("original_filename"),
-        uploaded_by = str(user.email)  # o email si lo tienes
+        # Validar el campo antes de aceptar el archivo (la subida real ocurre después)
+        if not get_farm(farm_id):
+            return jsonify({"error": "Campo no encontrado"}), 404
 
-        # Crear instancia del modelo
-        new_image = Farm_images(
+        # Guardar en disco y encolar la subida a Cloudinary
+        job = enqueue_upload(
+            "image", user.id, image_file, secure_filename(image_file.filename or "image"),
             farm_id=farm_id,
             image_type=image_type,
-            image_url=image_url,
-            upload_date=datetime.now(timezone.utc),
-            file_name=file_name,
-            uploaded_by=uploaded_by
+            upload_options={"folder": "dron_images"}
         )
-        db.session.add(new_image)
-        db.session.commit()
 
         return jsonify({
-            "message": "Image uploaded successfully",
-            "url": image_url,
-            "data": new_image.serialize()
-        }), 201
+            "message": "Image upload accepted",
+            "job_id": job.id,
+            "status_url": f"/api/upload-jobs/{job.id}",
+            "data": job.serialize()
+        }), 202
 
     except Exception as error:
         db.session.rollback()
         return jsonify({"message": "Error al subir imagen", "error": {error.args}}), 500
 
+# ----------- SUBIDAS DIRECTAS AL ALMACENAMIENTO (ver api/direct_uploads.py) -----------------------------
+
+# Parámetros firmados para que el cliente suba la imagen sin pasar por la API
+@api.route('/upload-image/presign', methods=['POST'])
+@jwt_required()
+def presign_upload_image():
+    data = request.get_json(silent=True) or {}
+    farm_id = data.get("farm_id")
+    image_type = data.get("image_type")
+    file_name = secure_filename(data.get("file_name") or "image")
+
+    if not farm_id or not image_type:
+        return jsonify({"error": "Faltan datos requeridos"}), 400
+
+    # Mismas validaciones que /upload-images/batch
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Usuario no encontrado"}), 404
+    farm = get_farm(farm_id)
+    if not farm:
+        return jsonify({"error": "Campo no encontrado"}), 404
+
+    if farm.user_id != user.id and not is_admin_user(user.id):
+        return jsonify({"error": "No autorizado para subir imágenes a este campo"}), 403
+
+    return jsonify({
+        **presign_image_upload(user.id, farm.id, image_type, file_name),
+        "confirm_url": "/api/upload-image/confirm"
+    }), 201
+
+# Registrar la imagen una vez subida: verifica el ticket y la firma del almacenamiento
+@api.route('/upload-image/confirm', methods=['POST'])
+@jwt_required()
+def confirm_upload_image():
+    data = request.get_json(silent=True) or {}
+
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Usuario no encontrado"}), 404
+
+    image, created = confirm_image_upload(user, data.get("ticket"), data.get("result"))
+    return jsonify({
+        "message": "Imagen registrada" if created else "La imagen ya estaba registrada",
+        "data": image.serialize()
+    }), 201 if created else 200
+
+# "Bucket" local de las URLs firmadas (STORAGE_BACKEND=local): sin JWT, lo autoriza el token
+@api.route('/direct-uploads/<token>', methods=['PUT'])
+def receive_direct_upload(token):
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        return jsonify({"error": "No disponible con este almacenamiento"}), 404
+
+    # El tamaño firmado en el token lo controla receive_direct_upload
+    allow_large_body(current_app.config.get("DIRECT_UPLOAD_MAX_MB", 1024) * 1024 * 1024)
+    try:
+        return jsonify(storage.receive_direct_upload(token, request.stream)), 201
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 403
+    except RequestEntityTooLarge:
+        return jsonify({"error": "El archivo supera el tamaño permitido"}), 413
+
+# subir muchas imágenes de un vuelo de dron en un solo request
+
+ZIP_TYPES = {"application/zip", "application/x-zip-compressed"}
+ARCHIVE_TYPES = ZIP_TYPES | {"application/x-tar", "application/gzip", "application/x-gzip"}
+
+
+def _spool_archive(archive_stream, default_image_type, is_zip):
+    """
+    Extrae las imágenes de un zip o tar a la carpeta de spool.
+    Si el archivo está dentro de una carpeta ndvi/ o aerial/, esa carpeta define su tipo.
+    """
+    items = []
+
+    def add_member(name, stream):
+        folder = name.replace("\\", "/").split("/")[0].upper() if "/" in name else ""
+        path, content_hash = spool_stream(stream)
+        items.append({
+            "file_name": secure_filename(os.path.basename(name)),
+            "image_type": folder if folder in ("NDVI", "AERIAL") else default_image_type,
+            "path": path,
+            "sha256": content_hash
+        })
+
+    try:
+        if is_zip:
+            with zipfile.ZipFile(archive_stream) as archive:
+                for member in archive.infolist():
+                    if not member.is_dir():
+                        with archive.open(member) as member_stream:
+                            add_member(member.filename, member_stream)
+        else:
+            # "r|*" lee el tar secuencialmente (con o sin gzip), sin necesitar seek:
+            # se puede consumir directo del body del request
+            with tarfile.open(fileobj=archive_stream, mode="r|*") as archive:
+                for member in archive:
+                    if member.isfile():
+                        add_member(member.name, archive.extractfile(member))
+    except Exception:
+        # no dejar archivos huérfanos en spool si el comprimido está corrupto
+        for item in items:
+            os.remove(item["path"])
+        raise
+
+    return items
+
+
+@api.route('/upload-images/batch', methods=['POST'])
+@jwt_required()
+def upload_images_batch():
+    """
+    Sube varias imágenes de un campo en un solo request.
+
+    Acepta:
+        - multipart con varios archivos en "images" (y opcionalmente un "image_types" por archivo)
+        - multipart con un zip/tar en "archive"
+        - el zip/tar directamente como body (Content-Type application/zip o application/x-tar)
+          con farm_id e image_type en la query string
+    """
+    current_user_id = get_jwt_identity()
+    allow_large_body()
+    data_form = request.form if request.mimetype not in ARCHIVE_TYPES else request.args
+
+    farm_id = data_form.get("farm_id")
+    image_type = data_form.get("image_type")
+
+    if not farm_id:
+        return jsonify({"error": "Falta farm_id"}), 400
+
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Usuario no encontrado"}), 404
+
+    farm = get_farm(farm_id)
+    if not farm:
+        return jsonify({"error": "Campo no encontrado"}), 404
+
+    if farm.user_id != int(current_user_id) and not is_admin_user(current_user_id):
+        return jsonify({"error": "No autorizado para subir imágenes a este campo"}), 403
+
+    items = []
+    try:
+        # 1) Guardar todos los archivos en disco
+        if request.mimetype in ZIP_TYPES:
+            # zip necesita seek (el índice está al final): se copia el body a un temporal
+            with tempfile.TemporaryFile() as archive_file:
+                shutil.copyfileobj(request.stream, archive_file)
+                items = _spool_archive(archive_file, image_type, is_zip=True)
+        elif request.mimetype in ARCHIVE_TYPES:
+            items = _spool_archive(request.stream, image_type, is_zip=False)
+        elif "archive" in request.files:
+            archive_stream = request.files["archive"].stream
+            is_zip = zipfile.is_zipfile(archive_stream)
+            archive_stream.seek(0)
+            items = _spool_archive(archive_stream, image_type, is_zip)
+        else:
+            image_files = request.files.getlist("images")
+            image_types = data_form.getlist("image_types")
+            for index, image_file in enumerate(image_files):
+                content_hash = ingest_info(image_file).get("sha256")
+                path = spool_file(image_file)
+                items.append({
+                    "file_name": secure_filename(image_file.filename or f"image_{index}"),
+                    "image_type": image_types[index] if index < len(image_types) else image_type,
+                    "path": path,
+                    "sha256": content_hash or file_sha256(path)
+                })
+    except (zipfile.BadZipFile, tarfile.TarError) as error:
+        for item in items:
+            os.remove(item["path"])
+        return jsonify({"error": f"Archivo comprimido inválido: {error}"}), 400
+
+    if not items:
+        return jsonify({"error": "No se recibió ninguna imagen"}), 400
+
+    max_files = current_app.config.get("BATCH_UPLOAD_MAX_FILES", 500)
+    invalid = [item for item in items if not item["image_type"]]
+    if len(items) > max_files or invalid:
+        for item in items:
+            os.remove(item["path"])
+        if invalid:
+            return jsonify({"error": "Falta image_type para algunas imágenes"}), 400
+        return jsonify({"error": f"Máximo {max_files} imágenes por request"}), 400
+
+    # 2) Deduplicar por contenido: lo ya almacenado (o repetido dentro del lote) no se vuelve a subir
+    hashes = [item["sha256"] for item in items]
+    stored_urls = find_stored_urls(hashes)
+    existing_rows = dict(
+        ((content_hash, image_type), image_id) for content_hash, image_type, image_id in
+        db.session.query(Farm_images.content_hash, Farm_images.image_type, Farm_images.id)
+        .filter(Farm_images.farm_id == farm.id, Farm_images.content_hash.in_(set(hashes)))
+    )
+
+    to_upload = {}
+    for item in items:
+        if item["sha256"] in stored_urls or item["sha256"] in to_upload:
+            os.remove(item["path"])
+        else:
+            to_upload[item["sha256"]] = item
+
+    # 3) Subir en paralelo con un pool acotado
+    upload_results = dict(zip(to_upload, upload_files_concurrently(list(to_upload.values()), {"folder": "dron_images"})))
+
+    # 4) Un solo INSERT masivo y un solo commit para todas las imágenes nuevas
+    results = []
+    rows = []
+    new_rows = {}
+    for item in items:
+        content_hash = item["sha256"]
+        result = {"file_name": item["file_name"], "image_type": item["image_type"]}
+
+        if content_hash in stored_urls:
+            url, error = stored_urls[content_hash], None
+            result["deduplicated"] = True
+        else:
+            upload_result, error = upload_results[content_hash]
+            url = upload_result["url"] if error is None else None
+
+        if error is not None:
+            result.update({"status": "failed", "error": str(error)})
+            results.append(result)
+            continue
+
+        result.update({"status": "uploaded", "image_url": url})
+        row_key = (content_hash, item["image_type"])
+        if row_key in existing_rows:
+            result["id"] = existing_rows[row_key]
+        elif row_key not in new_rows:
+            new_rows[row_key] = len(rows)
+            rows.append({
+                "farm_id": farm.id,
+                "image_type": item["image_type"],
+                "image_url": url,
+                "upload_date": datetime.now(timezone.utc),
+                "file_name": item["file_name"],
+                "uploaded_by": str(user.email),
+                "content_hash": content_hash
+            })
+        results.append(result)
+
+    try:
+        if rows:
+            image_ids = db.session.scalars(
+                insert(Farm_images).returning(Farm_images.id, sort_by_parameter_order=True), rows
+            ).all()
+            for result, item in zip(results, items):
+                row_key = (item["sha256"], item["image_type"])
+                if result["status"] == "uploaded" and "id" not in result:
+                    result["id"] = image_ids[new_rows[row_key]]
+            # El INSERT masivo no dispara los eventos del ORM: invalidar el ETag y contar a mano
+            bump_farm_versions([farm.id])
+            count_new_images(farm.id, [row["image_type"] for row in rows])
+        db.session.commit()
+    except Exception as error:
+        db.session.rollback()
+        return jsonify({"error": f"Error al guardar las imágenes: {str(error)}", "results": results}), 500
+
+    uploaded = sum(1 for result in results if result["status"] == "uploaded")
+    return jsonify({
+        "message": f"{uploaded} de {len(items)} imágenes subidas",
+        "uploaded": uploaded,
+        "failed": len(items) - uploaded,
+        "results": results
+    }), 201 if uploaded else 502
+
 # obtener imagenes del usuario autenticado
 
 @api.route('/user-images', methods=['GET'])
@@ -327,35 +637,46 @@ def upload_image():
 def get_user_images():
     current_user_id = get_jwt_identity()
 
-    user = User.query.filter_by(id=current_user_id).first()
+    user = get_current_user()
 
     if not user:
         return jsonify({"error": "Usuario no encontrado"}), 404
 
-    farms = Farm.query.filter_by(user_id=current_user_id).all()
-    farm_ids = [farm.id for farm in farms]
+    # Si ningún campo del usuario cambió desde la última respuesta: 304 sin consultar las imágenes
+    # (url_expiry cambia el ETag cuando vencen las URLs firmadas de miniaturas y tiles)
+    etag = listing_etag(user_farms_version(user.id), url_expiry())
+    if not_modified(etag):
+        return not_modified_response(etag)
 
-    # La función in_() se usa para filtrar por varios valores (como un WHERE ... IN (...) en SQL). SELECT * FROM farm_images WHERE farm_id IN (1, 2, 5);....Este SQL dice: dame todas las imágenes cuya farm_id esté en la lista [1, 2, 5].
-    images = Farm_images.query.filter(Farm_images.farm_id.in_(farm_ids)).all()
+    page = get_page(IMAGE_ORDER)
+    fields = get_fields(IMAGE_FIELDS) or ["id", "farm_id", "image_url", "image_type", "upload_date"]
 
-    result = [{
-        "id": images.id,
-        "farm_id": images.farm_id,
-        "image_url": images.image_url,
-        "image_type": images.image_type,
-        "upload_date": images.upload_date.isoformat() if images.upload_date else None
-    } for images in images]
+    farm_ids = db.session.query(Farm.id).filter(Farm.user_id == current_user_id)
 
-    return jsonify(result), 200
+    # La función in_() se usa para filtrar por varios valores (como un WHERE ... IN (...) en SQL). SELECT * FROM farm_images WHERE farm_id IN (SELECT id FROM farm WHERE user_id = ...)
+    query = select_fields(Farm_images, fields, IMAGE_ORDER).where(Farm_images.farm_id.in_(farm_ids.scalar_subquery()))
+    images, next_cursor = paginate(query, IMAGE_ORDER, page)
+
+    return etag_response({
+        "items": serialize_images(images, fields),
+        "next_cursor": next_cursor
+    }, etag), 200
 
 # obtener todas las imagenes de un campo
 
 @api.route('/user-images/<int:farm_id>', methods=['GET'])
-@jwt_required()
+@farm_owner_or_admin(message="No autorizado para ver las imágenes de este campo")
 def get_farm_images(farm_id):
+    page = get_page(IMAGE_ORDER)
+    fields = get_fields(IMAGE_FIELDS) or IMAGE_FIELDS
+
     try:
-        images = Farm_images.query.filter_by(farm_id=farm_id).all()
-        return jsonify([img.serialize() for img in images]), 200
+        query = select_fields(Farm_images, fields, IMAGE_ORDER).where(Farm_images.farm_id == farm_id)
+        images, next_cursor = paginate(query, IMAGE_ORDER, page)
+        return jsonify({
+            "items": serialize_images(images, fields),
+            "next_cursor": next_cursor
+        }), 200
     except Exception as error:
         return jsonify({"Error": "Error al obtener imágenes", "error": {error.args}}), 500
 
@@ -366,7 +687,7 @@ def delete_image(image_id):
     current_user_id = get_jwt_identity()
     image = Farm_images.query.get(image_id)
 
-    user = User.query.filter_by(id=current_user_id).first()
+    user = get_current_user()
 
     if not user:
         return jsonify({"error": "Usuario no encontrado"}), 404
@@ -375,9 +696,7 @@ def delete_image(image_id):
         return jsonify({"error": "Imagen no encontrada"}), 404
 
     # Verifica que la imagen pertenezca a una finca del usuario
-    farm = Farm.query.get(image.farm_id)
-
-    if not farm or farm.user_id != current_user_id:
+    if get_farm_owner(image.farm_id) != int(current_user_id):
         return jsonify({"message": "No autorizado para eliminar esta imagen"}), 403
 
     db.session.delete(image)
@@ -395,8 +714,7 @@ def get_image(image_id):
     if not image:
         return jsonify({"message": "Imagen no encontrada"}), 404
 
-    farm = Farm.query.get(image.farm_id)
-    if not farm or farm.user_id != current_user_id:
+    if get_farm_owner(image.farm_id) != int(current_user_id):
         return jsonify({"message": "No autorizado"}), 403
 
     return jsonify({
@@ -407,6 +725,83 @@ def get_image(image_id):
         "upload_date": image.upload_date.isoformat() if image.upload_date else None
     }), 200
 
+# Miniatura y tiles de una imagen. Se autorizan con la firma ?sig= que viene en los listados
+# (para poder usarlas en <img>) o con el token del dueño del campo / admin.
+def get_image_for_derivatives(image_id):
+    image = Farm_images.query.get(image_id)
+    if not image:
+        return None, (jsonify({"error": "Imagen no encontrada"}), 404)
+
+    if valid_signature(image_id, request.args.get("sig"), request.args.get("exp")):
+        return image, None
+
+    verify_jwt_in_request(optional=True)
+    current_user_id = get_jwt_identity()
+    if current_user_id is None:
+        return None, (jsonify({"error": "Falta la firma o el token"}), 401)
+
+    if get_farm_owner(image.farm_id) != int(current_user_id) and not is_admin_user(current_user_id):
+        return None, (jsonify({"error": "No autorizado"}), 403)
+
+    return image, None
+
+# Derivados en caché; si faltan se encolan (el request nunca decodifica la imagen) y se responde
+# 202 con Retry-After, o 422 si la imagen es demasiado grande para procesarla
+def get_ready_derivatives(image):
+    folder, meta = cached_derivatives(image)
+    if meta is not None:
+        return folder, meta, None
+
+    reason = schedule_derivatives(image)
+    if reason:
+        return None, None, (jsonify({"error": reason}), 422)
+
+    response = jsonify({"message": "Generando miniatura y tiles, reintentar en unos segundos"})
+    response.status_code = 202
+    response.headers["Retry-After"] = "5"
+    response.headers["Cache-Control"] = "no-store"
+    return None, None, response
+
+@api.route('/images/<int:image_id>/thumb', methods=['GET'])
+def get_image_thumbnail(image_id):
+    image, error_response = get_image_for_derivatives(image_id)
+    if error_response:
+        return error_response
+
+    folder, meta, pending_response = get_ready_derivatives(image)
+    if pending_response:
+        return pending_response
+
+    return send_from_directory(folder, f"thumb.{meta['format']}", max_age=DERIVATIVES_MAX_AGE)
+
+@api.route('/images/<int:image_id>/tiles', methods=['GET'])
+def get_image_tiles_info(image_id):
+    image, error_response = get_image_for_derivatives(image_id)
+    if error_response:
+        return error_response
+
+    _, meta, pending_response = get_ready_derivatives(image)
+    if pending_response:
+        return pending_response
+
+    return jsonify({key: meta[key] for key in ("width", "height", "tile_size", "max_zoom", "format")}), 200
+
+@api.route('/images/<int:image_id>/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_image_tile(image_id, z, x, y):
+    image, error_response = get_image_for_derivatives(image_id)
+    if error_response:
+        return error_response
+
+    folder, meta, pending_response = get_ready_derivatives(image)
+    if pending_response:
+        return pending_response
+
+    tile_path = os.path.join("tiles", str(z), str(x), f"{y}.{meta['format']}")
+    if z > meta["max_zoom"] or not os.path.exists(os.path.join(folder, tile_path)):
+        return jsonify({"error": "Tile fuera de la imagen"}), 404
+
+    return send_from_directory(folder, tile_path, max_age=DERIVATIVES_MAX_AGE)
+
 # 12) [GET] /users Listar todos los registros de usuario en la base de datos.
 
 @api.route('/users', methods=['GET'])
@@ -517,6 +912,7 @@ def get_aerial_images_by_farm(farm_id):
 @jwt_required()
 def update_avatar():
 
+    allow_large_body(current_app.config.get("MAX_AVATAR_CONTENT_LENGTH"))
     data_files = request.files      # Trae archivos del formulario
 
     if 'avatar' not in data_files:
@@ -527,21 +923,22 @@ def update_avatar():
         return jsonify({"error": "Nombre de archivo vacío"}), 400
 
     try:
-        user_id = get_jwt_identity()
-        user = User.query.filter_by(id=user_id).one_or_none()
+        user = get_current_user()
 
         if user is None:
             return jsonify({"error": "Usuario no encontrado"}), 404
 
-        # Eliminar imagen anterior si tiene public_id
-        if user.public_id:
-            uploader.destroy(user.public_id)
+        storage = get_storage()
+
+        # Eliminar imagen anterior si tiene public_id (salvo que el mismo archivo lo use una imagen o reporte)
+        if user.public_id and not is_url_referenced(user.avatar):
+            storage.delete(user.public_id)
 
         # Subir nueva imagen
-        result_image = uploader.upload(image)
+        result_image = storage.put(image.stream, file_name=secure_filename(image.filename))
 
-        avatar_url = result_image.get("secure_url")
-        public_id = result_image.get("public_id")
+        avatar_url = result_image["url"]
+        public_id = result_image["key"]
 
         # Actualizar usuario
         user.avatar = avatar_url
@@ -560,8 +957,7 @@ def update_avatar():
 @jwt_required()
 def get_avatar():
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_current_user()
 
         if not user:
             return jsonify({"error": "Usuario no encontrado"}), 404
@@ -588,12 +984,12 @@ def get_single_report(farm_id):
     farm_id = request.args.get('farm_id', type=int)
 
     # objeto de tipo Farm
-    farm = Farm.query.get(farm_id)
+    farm = get_farm(farm_id)
 
     if not farm:
         return jsonify({"error": "Campo no encontrado"}), 404
 
-    current_user = User.query.get(current_user_id)
+    current_user = get_current_user()
     # Verificar permisos si no admin
     # getattr() en Python se utiliza para acceder a atributos de un objeto de forma dinámica, utilizando el nombre del atributo como una cadena.
     # getattr(objeto, nombre_atributo, valor_predeterminado)
@@ -621,22 +1017,14 @@ def get_single_report(farm_id):
         
 # Solo admin puede subir diagnósticos
 @api.route('/upload-diagnostic', methods=['POST'])
-@jwt_required()
+@admin_required(message="Solo los administradores pueden subir diagnósticos")
 def upload_diagnostic_admin_only():
     current_user_id = get_jwt_identity()
-    
-    # VERIFICAR PERMISOS DE ADMIN
-    if not is_admin_user(current_user_id):
-        return jsonify({"error": "Solo los administradores pueden subir diagnósticos"}), 403
-
-    data_files = request.files
-    data_form = request.form
 
-    print("Admin uploading diagnostic:", data_files.keys())
+    data_form, file_report = get_upload_source('diagnostic_file')
 
     try:
         farm_id = data_form.get("farm_id")
-        file_report = data_files.get('diagnostic_file')
         
         if not file_report:
             return jsonify({"error": "No se envió ningún informe de diagnóstico"}), 400
@@ -655,56 +1043,37 @@ def upload_diagnostic_admin_only():
         if extension not in ALLOWED_EXT:
             return jsonify({"error": f"Formato no permitido. Permitidos: {ALLOWED_EXT}"}), 400
 
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         if not user:
             return jsonify({"error": "Usuario no encontrado"}), 404
 
         # Verificar que la farm existe
-        farm = Farm.query.get(farm_id)
+        farm = get_farm(farm_id)
         if not farm:
             return jsonify({"error": "Campo no encontrado"}), 404
 
-        # Subir archivo a Cloudinary CON PERMISOS PÚBLICOS
-        try:
-            upload_result = uploader.upload(
-                file_report,
-                public_id=f"diagnostic_{secure_file_name.rsplit('.', 1)[0]}_{current_user_id}_{farm_id}",
-                folder="diagnostics",
-                access_mode="public",
-                type="upload",
-                delivery_type="upload",
-                # resource_type="raw"  # necesario para PDF, DOCX, TXT
-            )
-            
-            print(f"Cloudinary upload result: {upload_result.get('secure_url')}")
-            
-        except Exception as error:
-            print(f"Error en Cloudinary: {error}")
-            return jsonify({"error": f"Error al subir a Cloudinary: {error.args}"}), 500
-
-        secure_report_url = upload_result.get("secure_url")
-
-        # Guardar en la base de datos COMO DIAGNÓSTICO
-        new_diagnostic = DiagnosticReport(
-            user_id=current_user_id,
+        # Guardar en disco y encolar la subida a Cloudinary CON PERMISOS PÚBLICOS.
+        # El worker crea el DiagnosticReport COMO DIAGNÓSTICO al terminar.
+        job = enqueue_upload(
+            "diagnostic", current_user_id, file_report, secure_file_name,
             farm_id=farm_id,
-            file_name=secure_file_name,
-            file_url=secure_report_url,
-            uploaded_at=datetime.now(timezone.utc),
-            uploaded_by=user.email,
             description=data_form.get('description', 'Informe de diagnóstico'),
-            is_diagnostic=True  # MARCAR COMO DIAGNÓSTICO
+            upload_options={
+                "public_id": f"diagnostic_{secure_file_name.rsplit('.', 1)[0]}_{current_user_id}_{farm_id}",
+                "folder": "diagnostics",
+                "access_mode": "public",
+                "type": "upload",
+                "delivery_type": "upload",
+                # "resource_type": "raw"  # necesario para PDF, DOCX, TXT
+            }
         )
-        
-        db.session.add(new_diagnostic)
-        db.session.commit()
 
         return jsonify({
-            "message": "Informe de diagnóstico subido correctamente",
-            "diagnostic_id": new_diagnostic.id,
-            "file_url": secure_report_url,
-            "data": new_diagnostic.serialize()
-        }), 201
+            "message": "Informe de diagnóstico recibido, subida en proceso",
+            "job_id": job.id,
+            "status_url": f"/api/upload-jobs/{job.id}",
+            "data": job.serialize()
+        }), 202
 
     except Exception as error:
         db.session.rollback()
@@ -713,51 +1082,55 @@ def upload_diagnostic_admin_only():
 
 # Obtener solo diagnósticos
 @api.route('/get-diagnostics/<int:farm_id>', methods=['GET'])
-@jwt_required()
+@farm_owner_or_admin(message="No autorizado para ver estos diagnósticos")
 def get_diagnostics_only(farm_id):
-    current_user_id = get_jwt_identity()
+    # g.farm ya lo cargó el decorador: el ETag no cuesta otra consulta
+    etag = listing_etag(g.farm.id, g.farm.data_version)
+    if not_modified(etag):
+        return not_modified_response(etag)
+
+    page = get_page(REPORT_ORDER)
+    fields = get_fields(REPORT_FIELDS) or REPORT_FIELDS
     
     try:
-        # Verificar que la farm existe
-        farm = Farm.query.get(farm_id)
-        if not farm:
-            return jsonify({"error": "Campo no encontrado"}), 404
-
-        current_user = User.query.get(current_user_id)
-        if not current_user:
-            return jsonify({"error": "Usuario no encontrado"}), 404
-        
-        # Verificar permisos: debe ser el dueño de la farm o admin
-        if not is_admin_user(current_user_id) and farm.user_id != int(current_user_id):
-            return jsonify({"error": "No autorizado para ver estos diagnósticos"}), 403
-        
         # Obtener SOLO diagnósticos (no reportes de usuarios)
-        diagnostics = DiagnosticReport.query.filter_by(
-            farm_id=farm_id,
-            is_diagnostic=True
-        ).order_by(DiagnosticReport.uploaded_at.desc()).all()
+        query = select_fields(DiagnosticReport, fields, REPORT_ORDER).where(
+            DiagnosticReport.farm_id == farm_id,
+            DiagnosticReport.is_diagnostic == True
+        )
+        diagnostics, next_cursor = paginate(query, REPORT_ORDER, page)
 
-        return jsonify([diagnostic.serialize() for diagnostic in diagnostics]), 200
+        return etag_response({
+            "items": as_dicts(diagnostics, fields),
+            "next_cursor": next_cursor
+        }, etag), 200
 
     except Exception as error:
         print(f"Error getting diagnostics: {error}")
         return jsonify({"error": f"Error al obtener informes de diagnóstico: {error.args}"}), 500
 
 # Upload-report para usuarios (NO diagnósticos)
+# Opciones del uploader para el informe de un usuario (subida normal o reanudable)
+def report_upload_options(secure_file_name, user_id, farm_id):
+    return {
+        "public_id": f"report_{secure_file_name.rsplit('.', 1)[0]}_{user_id}_{farm_id}",
+        "folder": "reports",
+        "access_mode": "public",
+        "type": "upload",
+        "delivery_type": "upload",
+        # "resource_type": "raw"  # necesario para PDF, DOCX, TXT
+    }
+
 @api.route('/upload-report', methods=['POST'])
 @jwt_required()
 def upload_report():
     current_user_id = get_jwt_identity()
     user_id = current_user_id
 
-    data_files = request.files
-    data_form = request.form
-
-    print("User uploading report:", data_files.keys())
+    data_form, file_report = get_upload_source('file_url')  # Mantener nombre original
 
     try:
         farm_id = data_form.get("farm_id")
-        file_report = data_files.get('file_url')  # Mantener nombre original
         
         if not file_report:
             return jsonify({"error": "No se envió ningún archivo"}), 400
@@ -776,67 +1149,166 @@ def upload_report():
         if extension not in ALLOWED_EXT:
             return jsonify({"error": f"Formato no permitido. Permitidos: {ALLOWED_EXT}"}), 400
 
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         if not user:
             return jsonify({"error": "Usuario no encontrado"}), 404
 
         # Verificar que farm existe y pertenece al usuario
-        farm = Farm.query.get(farm_id)
+        farm = get_farm(farm_id)
         if not farm:
             return jsonify({"error": "Campo no encontrado"}), 404
         
         if farm.user_id != int(current_user_id):
             return jsonify({"error": "No autorizado para subir reportes a este campo"}), 403
 
-        # Subir archivo a Cloudinary
-        try:
-            upload_result = uploader.upload(
-                file_report,
-                public_id=f"report_{secure_file_name.rsplit('.', 1)[0]}_{current_user_id}_{farm_id}",
-                folder="reports",
-                access_mode="public",
-                type="upload",
-                delivery_type="upload",
-                # resource_type="raw"  # necesario para PDF, DOCX, TXT
-            )
-        except Exception as error:
-            return jsonify({"error": f"Error al subir a Cloudinary: {error.arg}"}), 500
-
-        secure_report_url = upload_result.get("secure_url")
-        print("User report uploaded to:", secure_report_url)
-
-        # Guardar en la base de datos COMO REPORTE DE USUARIO
-        new_report = DiagnosticReport(
-            user_id=user_id,
+        # Guardar en disco y encolar la subida a Cloudinary.
+        # El worker crea el DiagnosticReport COMO REPORTE DE USUARIO al terminar.
+        job = enqueue_upload(
+            "report", user_id, file_report, secure_file_name,
             farm_id=farm_id,
-            file_name=secure_file_name,
-            file_url=secure_report_url,
-            uploaded_at=datetime.now(timezone.utc),
-            uploaded_by=user.email,
             description=data_form.get('description', 'Informe de usuario'),
-            is_diagnostic=False  # NO es diagnóstico, es reporte de usuario
+            upload_options=report_upload_options(secure_file_name, current_user_id, farm_id)
         )
-        
-        db.session.add(new_report)
-        db.session.commit()
 
         return jsonify({
-            "message": "Informe subido correctamente",
-            "report_id": new_report.id,
-            "file_url": secure_report_url,
-            "data": new_report.serialize()
-        }), 201
+            "message": "Informe recibido, subida en proceso",
+            "job_id": job.id,
+            "status_url": f"/api/upload-jobs/{job.id}",
+            "data": job.serialize()
+        }), 202
 
     except Exception as error:
         db.session.rollback()
         print(f"Error uploading report: {error}")
         return jsonify({"error": f"Error al subir el archivo: {error.args}"}), 500
 
+# Estado de una subida asíncrona
+@api.route('/upload-jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_upload_job(job_id):
+    current_user_id = get_jwt_identity()
+
+    job = db.session.get(UploadJob, job_id)
+    if not job:
+        return jsonify({"error": "Job no encontrado"}), 404
+
+    # Solo el usuario que subió el archivo o un admin pueden ver el job
+    if job.user_id != int(current_user_id) and not is_admin_user(current_user_id):
+        return jsonify({"error": "No autorizado para ver este job"}), 403
+
+    return jsonify(job.serialize()), 200
+
+# ============ SUBIDAS REANUDABLES (ver api/resumable.py) ============
+
+def get_own_upload_session(upload_id):
+    """Sesión de subida del usuario actual; 404 si no existe o es de otro usuario"""
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != int(get_jwt_identity()):
+        raise APIException("Subida no encontrada", status_code=404)
+    return upload
+
+def upload_session_response(upload, status_code=200):
+    response = jsonify({
+        **upload.serialize(),
+        "upload_url": f"/api/uploads/resumable/{upload.id}",
+        "chunk_size": resumable_chunk_size()
+    })
+    response.status_code = status_code
+    response.headers["Upload-Offset"] = str(upload.bytes_received)
+    response.headers["Upload-Length"] = str(upload.size)
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+# Abrir una subida reanudable de una imagen o de un informe
+@api.route('/uploads/resumable', methods=['POST'])
+@jwt_required()
+def create_resumable_upload():
+    current_user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+
+    kind = data.get("kind")
+    farm_id = data.get("farm_id")
+    size = data.get("size")
+    file_name = secure_filename(data.get("file_name") or "")
+
+    if kind not in ("image", "report"):
+        return jsonify({"error": "kind debe ser image o report"}), 400
+    if not farm_id or not file_name or not isinstance(size, int):
+        return jsonify({"error": "Faltan datos requeridos (farm_id, file_name, size)"}), 400
+
+    farm = get_farm(farm_id)
+    if not farm:
+        return jsonify({"error": "Campo no encontrado"}), 404
+
+    # Vale para los dos tipos: complete_upload_session crea la fila en este campo
+    if farm.user_id != int(current_user_id) and not is_admin_user(current_user_id):
+        return jsonify({"error": "No autorizado para subir archivos a este campo"}), 403
+
+    # Mismas validaciones que /upload-image y /upload-report
+    if kind == "image":
+        if not data.get("image_type"):
+            return jsonify({"error": "Faltan datos requeridos"}), 400
+        params = {"image_type": data["image_type"], "upload_options": {"folder": "dron_images"}}
+    else:
+        ALLOWED_EXT = {'pdf', 'docx', 'doc', 'txt'}
+        extension = file_name.rsplit('.', 1)[-1].lower() if '.' in file_name else ''
+        if extension not in ALLOWED_EXT:
+            return jsonify({"error": f"Formato no permitido. Permitidos: {ALLOWED_EXT}"}), 400
+        params = {
+            "description": data.get('description', 'Informe de usuario'),
+            "upload_options": report_upload_options(file_name, current_user_id, farm_id)
+        }
+
+    upload = create_upload_session(kind, current_user_id, farm.id, file_name, size, data.get("sha256"), **params)
+    return upload_session_response(upload, 201)
+
+# Estado de una subida reanudable: Upload-Offset dice desde dónde seguir
+@api.route('/uploads/resumable/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_resumable_upload(upload_id):
+    return upload_session_response(get_own_upload_session(upload_id))
+
+# Agregar un bloque al archivo (body crudo, a partir de Upload-Offset)
+@api.route('/uploads/resumable/<upload_id>', methods=['PATCH'])
+@jwt_required()
+def patch_resumable_upload(upload_id):
+    upload = get_own_upload_session(upload_id)
+
+    offset = request.headers.get("Upload-Offset", type=int)
+    if offset is None or offset < 0:
+        return jsonify({"error": "Falta el header Upload-Offset"}), 400
+
+    allow_large_body()
+    append_chunk(upload, offset, request.stream, request.content_length)
+    return upload_session_response(get_own_upload_session(upload_id))
+
+# Verificar el archivo completo y encolar la subida, igual que /upload-image o /upload-report
+@api.route('/uploads/resumable/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_resumable_upload(upload_id):
+    upload = get_own_upload_session(upload_id)
+    data = request.get_json(silent=True) or {}
+
+    job = complete_upload_session(upload, data.get("sha256"))
+    return jsonify({
+        "message": "Archivo recibido, subida en proceso",
+        "job_id": job.id,
+        "status_url": f"/api/upload-jobs/{job.id}",
+        "data": job.serialize()
+    }), 202
+
+# Cancelar una subida reanudable y borrar lo recibido
+@api.route('/uploads/resumable/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def delete_resumable_upload(upload_id):
+    cancel_upload_session(get_own_upload_session(upload_id))
+    return jsonify({"message": "Subida cancelada"}), 200
+
 @api.route('/download-report/<int:report_id>', methods=['GET'])
 @jwt_required()
 def download_report(report_id):
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = get_current_user()
     email = User.query.filter_by(email = email, user_id = current_user_id)
     if not user:
         return jsonify({"error": "Usuario no encontrado"}), 404
@@ -869,35 +1341,29 @@ def download_report(report_id):
 
 # Reports que solo devuelve reportes de usuarios (no diagnósticos)
 @api.route('/reports', methods=['GET'])
-@jwt_required()
+@farm_owner_or_admin(message="No autorizado para ver estos reportes")
 def list_reports():
-    current_user_id = get_jwt_identity()
-    farm_id = request.args.get('farm_id', type=int)
+    farm_id = g.farm.id
 
-    if not farm_id:
-        return jsonify({"error": "farm_id es requerido"}), 400
+    etag = listing_etag(farm_id, g.farm.data_version)
+    if not_modified(etag):
+        return not_modified_response(etag)
 
-    try:
-        # Verificar que farm existe y el usuario tiene acceso
-        farm = Farm.query.get(farm_id)
-        if not farm:
-            return jsonify({"error": "Campo no encontrado"}), 404
-        
-        current_user = User.query.get(current_user_id)
-        if not current_user:
-            return jsonify({"error": "Usuario no encontrado"}), 404
-
-        # Verificar permisos: debe ser el dueño de farm o admin
-        if not is_admin_user(current_user_id) and farm.user_id != int(current_user_id):
-            return jsonify({"error": "No autorizado para ver estos reportes"}), 403
+    page = get_page(REPORT_ORDER)
+    fields = get_fields(REPORT_FIELDS) or REPORT_FIELDS
 
+    try:
         # Obtener SOLO reportes de usuarios (no diagnósticos)
-        reports = DiagnosticReport.query.filter_by(
-            farm_id=farm_id,
-            is_diagnostic=False  # Solo reportes de usuarios
-        ).order_by(DiagnosticReport.uploaded_at.desc()).all()
+        query = select_fields(DiagnosticReport, fields, REPORT_ORDER).where(
+            DiagnosticReport.farm_id == farm_id,
+            DiagnosticReport.is_diagnostic == False  # Solo reportes de usuarios
+        )
+        reports, next_cursor = paginate(query, REPORT_ORDER, page)
 
-        return jsonify([report.serialize() for report in reports]), 200
+        return etag_response({
+            "items": as_dicts(reports, fields),
+            "next_cursor": next_cursor
+        }, etag), 200
 
     except Exception as error:
         print(f"Error getting reports: {error}")
@@ -923,10 +1389,10 @@ def upload_informe():
         if file_report.filename == '':
             return jsonify({"error": "No selected file"}), 400
 
-        # Subir a Cloudinary
-        upload_result = uploader.upload(file_report)
+        # Subir al almacenamiento
+        upload_result = get_storage().put(file_report.stream, file_name=secure_filename(file_report.filename))
 
-        file_url = upload_result['secure_url']
+        file_url = upload_result['url']
         file_name = file_report.filename
 
         # Guardar en la base de datos
@@ -954,28 +1420,51 @@ def upload_informe():
 
 # ============ ENDPOINTS DE ADMINISTRACIÓN  ============
 
+# CONTADORES DE LA CACHÉ DE IDENTIDAD (aciertos / fallos, para monitoreo)
+@api.route('/admin/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats_admin():
+    """Aciertos y fallos de la caché de usuarios / campos (solo admin)"""
+    return jsonify(cache_stats()), 200
+
+# MÉTRICAS DE LA COLA DE CORREOS (profundidad, enviados, fallidos, latencias)
+@api.route('/admin/mail-stats', methods=['GET'])
+@admin_required
+def get_mail_stats_admin():
+    """Estado de la cola de correos salientes (solo admin)"""
+    return jsonify(mail_stats()), 200
+
+# CONSULTAS SQL POR ENDPOINT Y N+1 DETECTADOS (con SQL_PROFILING=1)
+@api.route('/admin/sql-profile', methods=['GET'])
+@admin_required
+def get_sql_profile_admin():
+    """Resumen del perfilado de SQL por endpoint (solo admin)"""
+    return jsonify({
+        "enabled": bool(current_app.config.get("SQL_PROFILING")),
+        "endpoints": profiling_report()
+    }), 200
+
 # VER TODOS LOS USUARIOS CON SUS CAMPOS
 @api.route('/admin/all-users', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_all_users_admin():
     """Ver todos los usuarios con sus campos (solo admin)"""
-    current_user_id = get_jwt_identity()
     
-    if not is_admin_user(current_user_id):
-        return jsonify({"error": "Solo administradores pueden acceder"}), 403
+    page = get_page([User.id])
     
     try:
-        users = User.query.all()
+        # Campos cargados con selectin (1 consulta para todos) y contadores agrupados (1 consulta)
+        users, next_cursor = paginate(User.query.options(selectinload(User.farm_of_user)), [User.id], page, descending=False)
+        user_statistics = get_user_statistics([user.id for user in users])
         
         result = []
         for user in users:
             user_farms = [farm.serialize() for farm in user.farm_of_user]
             
             # Contar reportes e imágenes por usuario
-            total_reports = DiagnosticReport.query.filter_by(user_id=user.id, is_diagnostic=False).count()
-            total_images = 0
-            for farm in user.farm_of_user:
-                total_images += Farm_images.query.filter_by(farm_id=farm.id).count()
+            statistics = user_statistics.get(user.id, {"total_reports": 0, "total_images": 0})
+            total_reports = statistics["total_reports"]
+            total_images = statistics["total_images"]
             
             result.append({
                 "user_id": user.id,
@@ -991,8 +1480,9 @@ def get_all_users_admin():
             })
         
         return jsonify({
-            "total_users": len(result),
-            "users": result
+            "total_users": User.query.count(),
+            "users": result,
+            "next_cursor": next_cursor
         }), 200
         
     except Exception as error:
@@ -1000,26 +1490,20 @@ def get_all_users_admin():
 
 # VER TODOS LOS CAMPOS CON DETALLES
 @api.route('/admin/all-farms', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_all_farms_admin():
     """Ver todos los campos de todos los usuarios con estadísticas (solo admin)"""
-    current_user_id = get_jwt_identity()
     
-    if not is_admin_user(current_user_id):
-        return jsonify({"error": "Solo administradores pueden acceder"}), 403
+    page = get_page([Farm.id])
     
     try:
-        # Obtener todos los campos con información del usuario
-        farms = db.session.query(Farm, User).join(User, Farm.user_id == User.id).all()
+        # Obtener los campos con información del usuario y sus contadores en una sola consulta
+        rows, next_cursor = paginate(farm_statistics_query(), [Farm.id], page, descending=False,
+                                     cursor_values=lambda row: [row.Farm.id])
         
         result = []
-        for farm, user in farms:
-            # Estadísticas del campo
-            reports_count = DiagnosticReport.query.filter_by(farm_id=farm.id, is_diagnostic=False).count()
-            diagnostics_count = DiagnosticReport.query.filter_by(farm_id=farm.id, is_diagnostic=True).count()
-            images_count = Farm_images.query.filter_by(farm_id=farm.id).count()
-            ndvi_images = Farm_images.query.filter_by(farm_id=farm.id, image_type='NDVI').count()
-            aerial_images = Farm_images.query.filter_by(farm_id=farm.id, image_type='AERIAL').count()
+        for row in rows:
+            farm, user = row.Farm, row.User
             
             result.append({
                 "farm_id": farm.id,
@@ -1029,18 +1513,13 @@ def get_all_farms_admin():
                 "user_name": user.full_name,
                 "user_email": user.email,
                 "user_avatar": user.avatar,
-                "statistics": {
-                    "user_reports": reports_count,
-                    "admin_diagnostics": diagnostics_count,
-                    "total_images": images_count,
-                    "ndvi_images": ndvi_images,
-                    "aerial_images": aerial_images
-                }
+                "statistics": statistics_from_row(row)
             })
         
         return jsonify({
-            "total_farms": len(result),
-            "farms": result
+            "total_farms": Farm.query.count(),
+            "farms": result,
+            "next_cursor": next_cursor
         }), 200
         
     except Exception as error:
@@ -1048,36 +1527,35 @@ def get_all_farms_admin():
 
 # VER DETALLES ESPECÍFICOS DE UN CAMPO
 @api.route('/admin/farm-details/<int:farm_id>', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_farm_details_admin(farm_id):
     """Ver detalles completos de un campo específico (solo admin)"""
-    current_user_id = get_jwt_identity()
-    
-    if not is_admin_user(current_user_id):
-        return jsonify({"error": "Solo administradores pueden acceder"}), 403
     
     try:
-        # Obtener campo con información del usuario
-        farm = Farm.query.get(farm_id)
-        if not farm:
+        # Obtener campo con información del usuario y sus estadísticas
+        farm_statistics = get_farm_statistics(farm_id)
+        if farm_statistics is None:
             return jsonify({"error": "Campo no encontrado"}), 404
         
-        user = User.query.get(farm.user_id)
+        farm, user, statistics = farm_statistics
         
-        # Obtener reportes del usuario para este campo
-        user_reports = DiagnosticReport.query.filter_by(
-            farm_id=farm_id, 
-            is_diagnostic=False
-        ).order_by(DiagnosticReport.uploaded_at.desc()).all()
-        
-        # Obtener diagnósticos del admin para este campo
-        admin_diagnostics = DiagnosticReport.query.filter_by(
-            farm_id=farm_id, 
-            is_diagnostic=True
-        ).order_by(DiagnosticReport.uploaded_at.desc()).all()
+        # Reportes del usuario y diagnósticos del admin en una sola consulta, como tuplas de columnas
+        reports = fetch_dicts(
+            select_fields(DiagnosticReport, REPORT_FIELDS)
+            .where(DiagnosticReport.farm_id == farm_id)
+            .order_by(DiagnosticReport.uploaded_at.desc()),
+            REPORT_FIELDS
+        )
+        user_reports = [report for report in reports if not report["is_diagnostic"]]
+        admin_diagnostics = [report for report in reports if report["is_diagnostic"]]
         
         # Obtener imágenes del campo
-        images = Farm_images.query.filter_by(farm_id=farm_id).order_by(Farm_images.upload_date.desc()).all()
+        images = fetch_dicts(
+            select_fields(Farm_images, IMAGE_FIELDS)
+            .where(Farm_images.farm_id == farm_id)
+            .order_by(Farm_images.upload_date.desc()),
+            IMAGE_FIELDS
+        )
         
         result = {
             "farm": {
@@ -1092,15 +1570,15 @@ def get_farm_details_admin(farm_id):
                 "phone_number": user.phone_number,
                 "avatar": user.avatar
             },
-            "user_reports": [report.serialize() for report in user_reports],
-            "admin_diagnostics": [diagnostic.serialize() for diagnostic in admin_diagnostics],
-            "images": [image.serialize() for image in images],
+            "user_reports": user_reports,
+            "admin_diagnostics": admin_diagnostics,
+            "images": images,
             "statistics": {
-                "total_user_reports": len(user_reports),
-                "total_admin_diagnostics": len(admin_diagnostics),
-                "total_images": len(images),
-                "ndvi_images": len([img for img in images if img.image_type == 'NDVI']),
-                "aerial_images": len([img for img in images if img.image_type == 'AERIAL'])
+                "total_user_reports": statistics["user_reports"],
+                "total_admin_diagnostics": statistics["admin_diagnostics"],
+                "total_images": statistics["total_images"],
+                "ndvi_images": statistics["ndvi_images"],
+                "aerial_images": statistics["aerial_images"]
             }
         }
         
@@ -1111,21 +1589,16 @@ def get_farm_details_admin(farm_id):
 
 # SUBIR DIAGNÓSTICO A CAMPO ESPECÍFICO
 @api.route('/admin/upload-diagnostic', methods=['POST'])
-@jwt_required()
+@admin_required(message="Solo administradores pueden subir diagnósticos")
 def upload_diagnostic_to_specific_farm():
     """Subir diagnóstico a un campo específico (solo admin)"""
     current_user_id = get_jwt_identity()
-    
-    if not is_admin_user(current_user_id):
-        return jsonify({"error": "Solo administradores pueden subir diagnósticos"}), 403
 
-    data_files = request.files
-    data_form = request.form
+    data_form, file_report = get_upload_source('diagnostic_file')
 
     try:
         farm_id = data_form.get("farm_id")
         description = data_form.get("description", "Diagnóstico profesional del campo")
-        file_report = data_files.get('diagnostic_file')
         
         if not file_report:
             return jsonify({"error": "No se envió archivo de diagnóstico"}), 400
@@ -1134,7 +1607,7 @@ def upload_diagnostic_to_specific_farm():
             return jsonify({"error": "farm_id es requerido"}), 400
 
         # Verificar que la farm existe
-        farm = Farm.query.get(farm_id)
+        farm = get_farm(farm_id)
         if not farm:
             return jsonify({"error": "Campo no encontrado"}), 404
 
@@ -1146,54 +1619,39 @@ def upload_diagnostic_to_specific_farm():
         if extension not in ALLOWED_EXT:
             return jsonify({"error": f"Formato no permitido. Permitidos: {ALLOWED_EXT}"}), 400
 
-        user = User.query.get(current_user_id)
+        user = get_current_user()
         if not user:
             return jsonify({"error": "Usuario administrador no encontrado"}), 404
 
-        # Subir archivo a Cloudinary CON PERMISOS PÚBLICOS
-        try:
-            upload_result = uploader.upload(
-                file_report,
-                public_id=f"diagnostic_{farm_id}_{secure_file_name.rsplit('.', 1)[0]}_{current_user_id}",
-                folder="diagnostics",
-                # resource_type="auto",
-                access_mode="public",
-                type="upload",
-                delivery_type="upload",
-                # resource_type="raw"  # necesario para PDF, DOCX, TXT
-            )
-        except Exception as error:
-            return jsonify({"error": f"Error al subir a Cloudinary: {str(error)}"}), 500
-
-        secure_report_url = upload_result.get("secure_url")
-
-        # Guardar en la base de datos COMO DIAGNÓSTICO
-        new_diagnostic = DiagnosticReport(
-            user_id=current_user_id,  # Admin que sube
-            farm_id=farm_id,          # Campo específico
-            file_name=secure_file_name,
-            file_url=secure_report_url,
-            uploaded_at=datetime.now(timezone.utc),
-            uploaded_by=user.email,
+        # Guardar en disco y encolar la subida a Cloudinary CON PERMISOS PÚBLICOS.
+        # El worker crea el DiagnosticReport COMO DIAGNÓSTICO (admin que sube, campo específico).
+        job = enqueue_upload(
+            "diagnostic", current_user_id, file_report, secure_file_name,
+            farm_id=farm_id,
             description=description,
-            is_diagnostic=True  # MARCAR COMO DIAGNÓSTICO
+            upload_options={
+                "public_id": f"diagnostic_{farm_id}_{secure_file_name.rsplit('.', 1)[0]}_{current_user_id}",
+                "folder": "diagnostics",
+                # "resource_type": "auto",
+                "access_mode": "public",
+                "type": "upload",
+                "delivery_type": "upload",
+                # "resource_type": "raw"  # necesario para PDF, DOCX, TXT
+            }
         )
-        
-        db.session.add(new_diagnostic)
-        db.session.commit()
 
         return jsonify({
-            "message": "Diagnóstico subido correctamente",
-            "diagnostic_id": new_diagnostic.id,
-            "file_url": secure_report_url,
+            "message": "Diagnóstico recibido, subida en proceso",
+            "job_id": job.id,
+            "status_url": f"/api/upload-jobs/{job.id}",
             "farm_info": {
                 "farm_id": farm.id,
                 "farm_name": farm.farm_name,
                 "farm_location": farm.farm_location,
                 "owner": farm.farm_to_user.full_name
             },
-            "data": new_diagnostic.serialize()
-        }), 201
+            "data": job.serialize()
+        }), 202
 
     except Exception as error:
         db.session.rollback()
@@ -1201,42 +1659,38 @@ def upload_diagnostic_to_specific_farm():
 
 # VER TODOS LOS REPORTES POR ESTADO
 @api.route('/admin/reports-overview', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_reports_overview_admin():
     """Overview de todos los reportes y diagnósticos (solo admin)"""
-    current_user_id = get_jwt_identity()
-    
-    if not is_admin_user(current_user_id):
-        return jsonify({"error": "Solo administradores pueden acceder"}), 403
     
     try:
-        # Reportes de usuarios (pendientes de diagnóstico)
-        user_reports = DiagnosticReport.query.filter_by(is_diagnostic=False).all()
-        
-        # Diagnósticos ya realizados
-        admin_diagnostics = DiagnosticReport.query.filter_by(is_diagnostic=True).all()
-        
-        # Campos sin diagnósticos
-        farms_with_diagnostics = [d.farm_id for d in admin_diagnostics]
-        farms_without_diagnostics = Farm.query.filter(~Farm.id.in_(farms_with_diagnostics)).all()
+        # Totales ya calculados en global_stats (ver api/stats.py): no se cuentan filas
+        overview = get_global_stats()
+
+        # Últimos 10 de cada tipo con ORDER BY id DESC LIMIT 10 sobre (is_diagnostic, id)
+        user_reports = DiagnosticReport.query.filter_by(is_diagnostic=False) \
+            .order_by(DiagnosticReport.id.desc()).limit(10).all()
+        admin_diagnostics = DiagnosticReport.query.filter_by(is_diagnostic=True) \
+            .order_by(DiagnosticReport.id.desc()).limit(10).all()
+
+        # Primeros 5 campos sin diagnósticos, con sus reportes de usuario desde farm_stats
+        farms_without_diagnostics = db.session.query(Farm, User.full_name, FarmStats.user_reports) \
+            .join(FarmStats, FarmStats.farm_id == Farm.id) \
+            .join(User, Farm.user_id == User.id) \
+            .filter(FarmStats.admin_diagnostics == 0) \
+            .order_by(FarmStats.farm_id).limit(5).all()
         
         result = {
-            "overview": {
-                "total_user_reports": len(user_reports),
-                "total_admin_diagnostics": len(admin_diagnostics),
-                "farms_without_diagnostics": len(farms_without_diagnostics),
-                "total_farms": Farm.query.count(),
-                "total_users": User.query.filter_by(is_admin='user').count()
-            },
-            "recent_user_reports": [report.serialize() for report in user_reports[-10:]],  # Últimos 10
-            "recent_diagnostics": [diagnostic.serialize() for diagnostic in admin_diagnostics[-10:]],  # Últimos 10
+            "overview": overview,
+            "recent_user_reports": [report.serialize() for report in reversed(user_reports)],  # Últimos 10
+            "recent_diagnostics": [diagnostic.serialize() for diagnostic in reversed(admin_diagnostics)],  # Últimos 10
             "farms_needing_attention": [{
                 "farm_id": farm.id,
                 "farm_name": farm.farm_name,
                 "farm_location": farm.farm_location,
-                "owner": farm.farm_to_user.full_name,
-                "user_reports": DiagnosticReport.query.filter_by(farm_id=farm.id, is_diagnostic=False).count()
-            } for farm in farms_without_diagnostics[:5]]  # Primeros 5
+                "owner": owner,
+                "user_reports": reports
+            } for farm, owner, reports in farms_without_diagnostics]  # Primeros 5
         }
         
         return jsonify(result), 200
@@ -1246,25 +1700,29 @@ def get_reports_overview_admin():
 
 # OBTENER DIAGNÓSTICOS DE UN CAMPO ESPECÍFICO
 @api.route('/admin/diagnostics/<int:farm_id>', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_farm_diagnostics_admin(farm_id):
     """Obtener todos los diagnósticos de un campo específico (solo admin)"""
-    current_user_id = get_jwt_identity()
     
-    if not is_admin_user(current_user_id):
-        return jsonify({"error": "Solo administradores pueden acceder"}), 403
+    page = get_page(REPORT_ORDER)
+    fields = get_fields(REPORT_FIELDS) or REPORT_FIELDS
     
     try:
         # Verificar que la farm existe
-        farm = Farm.query.get(farm_id)
+        farm = get_farm(farm_id)
         if not farm:
             return jsonify({"error": "Campo no encontrado"}), 404
         
         # Obtener diagnósticos del campo
-        diagnostics = DiagnosticReport.query.filter_by(
-            farm_id=farm_id, 
-            is_diagnostic=True
-        ).order_by(DiagnosticReport.uploaded_at.desc()).all()
+        statement = select_fields(DiagnosticReport, fields, REPORT_ORDER).where(
+            DiagnosticReport.farm_id == farm_id,
+            DiagnosticReport.is_diagnostic == True
+        )
+        diagnostics, next_cursor = paginate(statement, REPORT_ORDER, page)
+        # El total sale de la misma consulta, sin cursor ni límite
+        total_diagnostics = db.session.execute(
+            select(func.count()).select_from(statement.subquery())
+        ).scalar()
         
         result = {
             "farm_info": {
@@ -1273,8 +1731,9 @@ def get_farm_diagnostics_admin(farm_id):
                 "farm_location": farm.farm_location,
                 "owner": farm.farm_to_user.full_name
             },
-            "diagnostics": [diagnostic.serialize() for diagnostic in diagnostics],
-            "total_diagnostics": len(diagnostics)
+            "diagnostics": as_dicts(diagnostics, fields),
+            "total_diagnostics": total_diagnostics,
+            "next_cursor": next_cursor
         }
         
         return jsonify(result), 200
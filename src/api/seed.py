@@ -0,0 +1,171 @@
+"""
+Datos sintéticos para pruebas de carga (flask seed-bench).
+
+Genera usuarios, campos, imágenes y reportes / diagnósticos con INSERT masivos de Core
+(executemany por lotes de batch_size filas, sin objetos del ORM) y ids asignados de antemano,
+así no hace falta leer ids generados para armar las claves foráneas. Con la misma semilla los
+datos son siempre los mismos, para comparar corridas de benchmarks.
+
+Como los INSERT de Core no disparan los eventos del ORM, al final se recalculan farm_stats /
+global_stats (rebuild_stats) y, en Postgres, se ajustan las secuencias de los ids.
+
+Todos los usuarios generados tienen la contraseña BENCH_PASSWORD (hash calculado una sola vez)
+y emails bench<id>@agrivision.test.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, text
+from api.models import db, User, Farm, Farm_images, DiagnosticReport
+from api.passwords import hash_password
+from api.stats import rebuild_stats
+
+BENCH_PASSWORD = "bench-password"
+BENCH_SALT = "bench-salt"
+BENCH_EMAIL = "bench{id}@agrivision.test"
+START_DATE = datetime(2024, 1, 1)
+IMAGE_TYPES = ("NDVI", "AERIAL")
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _insert_batches(model, rows, batch_size):
+    """Inserta las filas de un generador en lotes, un commit por lote"""
+    batch = []
+    total = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(insert(model), batch)
+            db.session.commit()
+            total += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(model), batch)
+        db.session.commit()
+        total += len(batch)
+    return total
+
+
+def _fix_sequences():
+    # Postgres: los ids se insertaron explícitos, la secuencia tiene que seguir después del máximo
+    if db.engine.dialect.name != "postgresql":
+        return
+    for table in ("user", "farm", "farm_images", "diagnostic_reports"):
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM \"{table}\"), 1))"
+        ))
+    db.session.commit()
+
+
+def seed_bench(users, farms_per_user, images_per_farm, reports_per_farm, seed=42, batch_size=10000, echo=print):
+    """
+    Genera el dataset sintético
+
+    Args:
+        users (int): usuarios a crear
+        farms_per_user (int): campos por usuario
+        images_per_farm (int): imágenes por campo (NDVI y AERIAL alternadas)
+        reports_per_farm (int): reportes por campo (la mitad son diagnósticos)
+        seed (int): semilla del generador aleatorio
+        batch_size (int): filas por INSERT / commit
+        echo (callable): salida del progreso
+
+    Returns:
+        dict: filas insertadas por tabla y segundos totales
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    if db.engine.dialect.name == "sqlite":
+        db.session.execute(text("PRAGMA synchronous = OFF"))
+
+    first_user = _next_id(User)
+    first_farm = _next_id(Farm)
+    first_image = _next_id(Farm_images)
+    first_report = _next_id(DiagnosticReport)
+    password = hash_password(BENCH_PASSWORD, BENCH_SALT)
+
+    user_ids = range(first_user, first_user + users)
+
+    def farms_of(index):
+        # campos del usuario número `index` (0..users-1)
+        first = first_farm + index * farms_per_user
+        return range(first, first + farms_per_user)
+
+    def user_rows():
+        for user_id in user_ids:
+            yield {
+                "id": user_id,
+                "full_name": f"Bench User {user_id}",
+                "phone_number": f"{rng.randrange(10 ** 8, 10 ** 9)}",
+                "email": BENCH_EMAIL.format(id=user_id),
+                "is_admin": "user",
+                "password": password,
+                "salt": BENCH_SALT,
+                "token_version": 0,
+            }
+
+    def farm_rows():
+        for index, user_id in enumerate(user_ids):
+            for farm_id in farms_of(index):
+                yield {
+                    "id": farm_id,
+                    "user_id": user_id,
+                    "farm_name": f"Bench Farm {farm_id}",
+                    "farm_location": f"Lote {farm_id} - {rng.choice(('Norte', 'Sur', 'Este', 'Oeste'))}",
+                    "data_version": 0,
+                }
+
+    def image_rows():
+        image_id = first_image
+        for index, user_id in enumerate(user_ids):
+            for farm_id in farms_of(index):
+                for number in range(images_per_farm):
+                    yield {
+                        "id": image_id,
+                        "farm_id": farm_id,
+                        "image_type": IMAGE_TYPES[number % 2],
+                        "image_url": f"/uploads/bench/{image_id}.jpg",
+                        "upload_date": START_DATE + timedelta(minutes=rng.randrange(525600)),
+                        "file_name": f"vuelo_{farm_id}_{number}.jpg",
+                        "uploaded_by": BENCH_EMAIL.format(id=user_id),
+                        "content_hash": f"{rng.getrandbits(256):064x}",
+                    }
+                    image_id += 1
+
+    def report_rows():
+        report_id = first_report
+        for index, user_id in enumerate(user_ids):
+            for farm_id in farms_of(index):
+                for number in range(reports_per_farm):
+                    is_diagnostic = number % 2 == 1
+                    yield {
+                        "id": report_id,
+                        "user_id": user_id,
+                        "farm_id": farm_id,
+                        "file_name": f"{'diagnostico' if is_diagnostic else 'reporte'}_{farm_id}_{number}.pdf",
+                        "file_url": f"/uploads/bench/report_{report_id}.pdf",
+                        "uploaded_at": START_DATE + timedelta(minutes=rng.randrange(525600)),
+                        "uploaded_by": "admin@agrivision.test" if is_diagnostic else BENCH_EMAIL.format(id=user_id),
+                        "description": "Diagnóstico sintético" if is_diagnostic else None,
+                        "is_diagnostic": is_diagnostic,
+                        "content_hash": f"{rng.getrandbits(256):064x}",
+                    }
+                    report_id += 1
+
+    counts = {}
+    for name, model, rows in (("users", User, user_rows()), ("farms", Farm, farm_rows()),
+                              ("images", Farm_images, image_rows()), ("reports", DiagnosticReport, report_rows())):
+        table_started = time.perf_counter()
+        counts[name] = _insert_batches(model, rows, batch_size)
+        echo(f"{name}: {counts[name]} filas en {time.perf_counter() - table_started:.1f} s")
+
+    _fix_sequences()
+    rebuild_stats()
+
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    return counts
@@ -0,0 +1,174 @@
+"""
+Archivos estáticos del SPA (carpeta dist/ generada por `npm run build`).
+
+Al arrancar se arma un manifiesto en memoria de dist/ (ruta -> tamaño, ETag, tipo y variantes
+comprimidas), así cada request es una búsqueda en un dict en vez de un os.path.isfile.
+
+    - assets/*-<hash>.js|css|...  -> Vite pone el hash del contenido en el nombre: si el archivo
+      cambia, cambia la URL. Se sirven con Cache-Control: public, max-age=1 año, immutable
+      y el navegador no vuelve a preguntar.
+    - index.html y el resto       -> no-cache: el navegador revalida siempre (ETag -> 304),
+      así un deploy nuevo se ve en la próxima carga.
+    - rutas que no existen        -> index.html (rutas del router de React), salvo dentro de
+      assets/: un bundle viejo que ya no existe responde 404 en vez de HTML.
+
+Si junto a un archivo existen sus variantes precomprimidas (.br / .gz) se elige según el
+Accept-Encoding del cliente, con Vary: Accept-Encoding. Las genera `flask compress-assets`
+después de `npm run build` (ver render_build.sh); brotli es opcional, sin él solo hay .gz.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+from flask import request, send_file, abort
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# Nombres de Vite: index-4f3a2b1c.js, logo-Bx9_aZ3q.svg
+HASHED_NAME = re.compile(r"-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml",
+                      "application/xml", "application/manifest+json")
+MIN_COMPRESS_SIZE = 1024
+
+
+def is_hashed_asset(path):
+    return path.startswith("assets/") and bool(HASHED_NAME.search(path))
+
+
+def _etag(full_path):
+    stat = os.stat(full_path)
+    return hashlib.sha1(f"{stat.st_size}-{stat.st_mtime_ns}".encode("utf-8")).hexdigest()[:20]
+
+
+class StaticManifest:
+    """Índice en memoria de los archivos de dist/ y sus variantes comprimidas"""
+
+    def __init__(self, root):
+        self.root = os.path.realpath(root)
+        self.files = {}
+        self.scan()
+
+    def scan(self):
+        files = {}
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith((".br", ".gz")):
+                    continue
+                full_path = os.path.join(folder, name)
+                path = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+                files[path] = {
+                    "full_path": full_path,
+                    "mimetype": mimetypes.guess_type(name)[0] or "application/octet-stream",
+                    "etag": _etag(full_path),
+                    "immutable": is_hashed_asset(path),
+                    "variants": {
+                        encoding: full_path + suffix
+                        for encoding, suffix in ENCODINGS if os.path.isfile(full_path + suffix)
+                    }
+                }
+        self.files = files
+
+    def get(self, path):
+        return self.files.get(path)
+
+
+def _choose_encoding(entry):
+    if not entry["variants"]:
+        return None
+    accepted = request.accept_encodings
+    best = None
+    for encoding, _ in ENCODINGS:
+        if encoding in entry["variants"] and accepted[encoding] > 0:
+            if best is None or accepted[encoding] > accepted[best]:
+                best = encoding
+    return best
+
+
+def serve_static(manifest, path):
+    """
+    Respuesta para una ruta del SPA
+
+    Args:
+        manifest (StaticManifest): manifiesto de dist/
+        path (str): ruta pedida, relativa a dist/
+
+    Returns:
+        Response: el archivo (o su variante comprimida), index.html o 404
+    """
+    entry = manifest.get(path)
+    if entry is None:
+        if path.startswith("assets/"):
+            abort(404)
+        entry = manifest.get("index.html")
+        if entry is None:
+            abort(404)
+
+    encoding = _choose_encoding(entry)
+    file_path = entry["variants"][encoding] if encoding else entry["full_path"]
+
+    response = send_file(
+        file_path,
+        mimetype=entry["mimetype"],
+        etag=f"{entry['etag']}-{encoding}" if encoding else entry["etag"],
+        conditional=True,
+        max_age=IMMUTABLE_MAX_AGE if entry["immutable"] else 0
+    )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if entry["variants"]:
+        response.vary.add("Accept-Encoding")
+
+    if entry["immutable"]:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+# ----------- Precompresión (flask compress-assets) -----------------------------
+
+def _compressible(path):
+    mimetype = mimetypes.guess_type(path)[0] or ""
+    return mimetype.startswith(COMPRESSIBLE_TYPES) and os.path.getsize(path) >= MIN_COMPRESS_SIZE
+
+
+def compress_assets(root):
+    """
+    Genera las variantes .gz (y .br si está instalado brotli) de los archivos de texto de dist/
+
+    Returns:
+        list: (ruta, tamaño original, tamaño gzip, tamaño brotli o None)
+    """
+    results = []
+    for folder, _, names in os.walk(root):
+        for name in names:
+            full_path = os.path.join(folder, name)
+            if name.endswith((".br", ".gz")) or not _compressible(full_path):
+                continue
+
+            with open(full_path, "rb") as source, gzip.open(full_path + ".gz", "wb", compresslevel=9) as target:
+                shutil.copyfileobj(source, target)
+
+            brotli_size = None
+            if brotli is not None:
+                with open(full_path, "rb") as source:
+                    compressed = brotli.compress(source.read(), quality=11)
+                with open(full_path + ".br", "wb") as target:
+                    target.write(compressed)
+                brotli_size = len(compressed)
+
+            results.append((os.path.relpath(full_path, root), os.path.getsize(full_path),
+                            os.path.getsize(full_path + ".gz"), brotli_size))
+    return results
+
+
+def setup_static_assets(app, root):
+    app.extensions["static_manifest"] = StaticManifest(root)
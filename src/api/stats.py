@@ -0,0 +1,346 @@
+"""
+Estadísticas agregadas por campo (farm).
+
+Todos los contadores de un campo (reportes de usuario, diagnósticos, imágenes totales,
+NDVI y AERIAL) se calculan en UNA sola consulta agrupada, en vez de hacer 5 COUNT por campo.
+
+Además mantiene las tablas farm_stats / global_stats para el overview del admin (ver abajo).
+"""
+from collections import Counter
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import func, case, event, select, insert, update, delete
+from api.models import db, User, Farm, Farm_images, DiagnosticReport, FarmStats, GlobalStats
+
+
+def _reports_by_farm():
+    """Subconsulta: reportes de usuario y diagnósticos agrupados por farm_id (agregación condicional)"""
+    return db.session.query(
+        DiagnosticReport.farm_id.label("farm_id"),
+        func.sum(case((DiagnosticReport.is_diagnostic.is_(False), 1), else_=0)).label("user_reports"),
+        func.sum(case((DiagnosticReport.is_diagnostic.is_(True), 1), else_=0)).label("admin_diagnostics"),
+    ).group_by(DiagnosticReport.farm_id).subquery()
+
+
+def _images_by_farm():
+    """Subconsulta: imágenes totales, NDVI y AERIAL agrupadas por farm_id (agregación condicional)"""
+    return db.session.query(
+        Farm_images.farm_id.label("farm_id"),
+        func.count(Farm_images.id).label("total_images"),
+        func.sum(case((Farm_images.image_type == 'NDVI', 1), else_=0)).label("ndvi_images"),
+        func.sum(case((Farm_images.image_type == 'AERIAL', 1), else_=0)).label("aerial_images"),
+    ).group_by(Farm_images.farm_id).subquery()
+
+
+def farm_statistics_query():
+    """
+    Construye la consulta (Farm, User, contadores...) para todos los campos.
+
+    Las dos subconsultas se agrupan por separado y luego se unen con LEFT JOIN al campo,
+    así no se multiplica reportes x imágenes y los campos sin datos salen con 0.
+
+    Returns:
+        Query: consulta lista para filtrar, ordenar o paginar
+    """
+    reports = _reports_by_farm()
+    images = _images_by_farm()
+
+    return db.session.query(
+        Farm,
+        User,
+        func.coalesce(reports.c.user_reports, 0).label("user_reports"),
+        func.coalesce(reports.c.admin_diagnostics, 0).label("admin_diagnostics"),
+        func.coalesce(images.c.total_images, 0).label("total_images"),
+        func.coalesce(images.c.ndvi_images, 0).label("ndvi_images"),
+        func.coalesce(images.c.aerial_images, 0).label("aerial_images"),
+    ).join(User, Farm.user_id == User.id) \
+     .outerjoin(reports, reports.c.farm_id == Farm.id) \
+     .outerjoin(images, images.c.farm_id == Farm.id)
+
+
+def statistics_from_row(row):
+    """
+    Convierte una fila de farm_statistics_query() en el diccionario de estadísticas
+
+    Returns:
+        dict: user_reports, admin_diagnostics, total_images, ndvi_images, aerial_images
+    """
+    return {
+        "user_reports": int(row.user_reports),
+        "admin_diagnostics": int(row.admin_diagnostics),
+        "total_images": int(row.total_images),
+        "ndvi_images": int(row.ndvi_images),
+        "aerial_images": int(row.aerial_images)
+    }
+
+
+def get_farm_statistics(farm_id):
+    """
+    Estadísticas de un solo campo
+
+    Args:
+        farm_id (int): ID del campo
+
+    Returns:
+        tuple: (farm, user, dict de estadísticas) o None si el campo no existe
+    """
+    row = farm_statistics_query().filter(Farm.id == farm_id).one_or_none()
+
+    if row is None:
+        return None
+
+    return row.Farm, row.User, statistics_from_row(row)
+
+
+def get_user_statistics(user_ids=None):
+    """
+    Reportes de usuario e imágenes totales de cada usuario, en una sola consulta agrupada
+
+    Args:
+        user_ids (list): opcional, limita el cálculo a estos usuarios (ej: la página actual)
+
+    Returns:
+        dict: {user_id: {"total_reports": int, "total_images": int}}
+    """
+    reports = db.session.query(
+        DiagnosticReport.user_id.label("user_id"),
+        func.count(DiagnosticReport.id).label("total_reports"),
+    ).filter(DiagnosticReport.is_diagnostic.is_(False))
+
+    images = db.session.query(
+        Farm.user_id.label("user_id"),
+        func.count(Farm_images.id).label("total_images"),
+    ).join(Farm_images, Farm_images.farm_id == Farm.id)
+
+    query = db.session.query(User.id)
+
+    if user_ids is not None:
+        reports = reports.filter(DiagnosticReport.user_id.in_(user_ids))
+        images = images.filter(Farm.user_id.in_(user_ids))
+        query = query.filter(User.id.in_(user_ids))
+
+    reports = reports.group_by(DiagnosticReport.user_id).subquery()
+    images = images.group_by(Farm.user_id).subquery()
+
+    query = query.add_columns(
+        func.coalesce(reports.c.total_reports, 0),
+        func.coalesce(images.c.total_images, 0),
+    ).outerjoin(reports, reports.c.user_id == User.id) \
+     .outerjoin(images, images.c.user_id == User.id)
+
+    rows = query.all()
+
+    return {
+        user_id: {"total_reports": int(total_reports), "total_images": int(total_images)}
+        for user_id, total_reports, total_images in rows
+    }
+
+
+# ============ CONTADORES MANTENIDOS (farm_stats / global_stats) ============
+#
+# El overview del admin lee contadores ya calculados en vez de contar filas. Se actualizan con
+# UPDATE ... SET x = x + 1 en la misma transacción que el INSERT / DELETE que los cambia
+# (eventos de SQLAlchemy), así nunca quedan desfasados de los datos. Los INSERT masivos que no
+# pasan por el ORM llaman a count_new_images(). `flask rebuild-stats` los recalcula desde cero.
+# La fila de global_stats la crea la migración (o db.create_all()); un GET nunca la recalcula.
+
+GLOBAL_STATS_ID = 1
+
+
+def _update_global(connection, **deltas):
+    table = GlobalStats.__table__
+    connection.execute(
+        update(table).where(table.c.id == GLOBAL_STATS_ID)
+        .values({name: table.c[name] + delta for name, delta in deltas.items()})
+    )
+
+
+def _update_farm(connection, farm_id, **deltas):
+    """Suma los deltas a la fila del campo; False si el campo no tiene fila (ya se borró)"""
+    table = FarmStats.__table__
+    result = connection.execute(
+        update(table).where(table.c.farm_id == farm_id)
+        .values({name: table.c[name] + delta for name, delta in deltas.items()})
+    )
+    return result.rowcount > 0
+
+
+def _count_report(connection, farm_id, is_diagnostic, delta):
+    column = "admin_diagnostics" if is_diagnostic else "user_reports"
+    global_deltas = {"total_admin_diagnostics" if is_diagnostic else "total_user_reports": delta}
+
+    if farm_id is not None:
+        if not _update_farm(connection, farm_id, **{column: delta}):
+            return
+        if is_diagnostic:
+            # El campo pasa de 0 diagnósticos a tener alguno, o al revés
+            table = FarmStats.__table__
+            current = connection.execute(
+                select(table.c.admin_diagnostics).where(table.c.farm_id == farm_id)
+            ).scalar()
+            if (current - delta > 0) != (current > 0):
+                global_deltas["farms_with_diagnostics"] = 1 if current > 0 else -1
+
+    _update_global(connection, **global_deltas)
+
+
+def _image_deltas(image_type, delta):
+    deltas = {"total_images": delta}
+    if image_type == 'NDVI':
+        deltas["ndvi_images"] = delta
+    elif image_type == 'AERIAL':
+        deltas["aerial_images"] = delta
+    return deltas
+
+
+def _count_image(connection, farm_id, image_type, delta):
+    if _update_farm(connection, farm_id, **_image_deltas(image_type, delta)):
+        _update_global(connection, total_images=delta)
+
+
+def count_new_images(farm_id, image_types):
+    """
+    Suma al campo las imágenes insertadas con un INSERT masivo (sin eventos del ORM).
+    Los deltas se juntan antes: un UPDATE a farm_stats y uno a global_stats por lote, no por imagen.
+    """
+    deltas = Counter()
+    for image_type in image_types:
+        deltas.update(_image_deltas(image_type, 1))
+    if not deltas:
+        return
+
+    connection = db.session.connection()
+    if _update_farm(connection, farm_id, **deltas):
+        _update_global(connection, total_images=deltas["total_images"])
+
+
+def _previous(target, attribute):
+    """Valor del atributo antes del cambio pendiente (o el actual si no cambió)"""
+    history = db.inspect(target).attrs[attribute].history
+    return history.deleted[0] if history.deleted else getattr(target, attribute)
+
+
+@event.listens_for(DiagnosticReport, "after_insert")
+def _report_inserted(mapper, connection, report):
+    _count_report(connection, report.farm_id, report.is_diagnostic, 1)
+
+
+@event.listens_for(DiagnosticReport, "after_delete")
+def _report_deleted(mapper, connection, report):
+    _count_report(connection, _previous(report, "farm_id"), _previous(report, "is_diagnostic"), -1)
+
+
+@event.listens_for(DiagnosticReport, "after_update")
+def _report_updated(mapper, connection, report):
+    old = (_previous(report, "farm_id"), _previous(report, "is_diagnostic"))
+    if old != (report.farm_id, report.is_diagnostic):
+        _count_report(connection, *old, -1)
+        _count_report(connection, report.farm_id, report.is_diagnostic, 1)
+
+
+@event.listens_for(Farm_images, "after_insert")
+def _image_inserted(mapper, connection, image):
+    _count_image(connection, image.farm_id, image.image_type, 1)
+
+
+@event.listens_for(Farm_images, "after_delete")
+def _image_deleted(mapper, connection, image):
+    _count_image(connection, _previous(image, "farm_id"), _previous(image, "image_type"), -1)
+
+
+@event.listens_for(Farm_images, "after_update")
+def _image_updated(mapper, connection, image):
+    old = (_previous(image, "farm_id"), _previous(image, "image_type"))
+    if old != (image.farm_id, image.image_type):
+        _count_image(connection, *old, -1)
+        _count_image(connection, image.farm_id, image.image_type, 1)
+
+
+@event.listens_for(Farm, "after_insert")
+def _farm_inserted(mapper, connection, farm):
+    connection.execute(insert(FarmStats.__table__).values(farm_id=farm.id))
+    _update_global(connection, total_farms=1)
+
+
+@event.listens_for(Farm, "before_delete")
+def _farm_deleted(mapper, connection, farm):
+    # Se descuenta lo que todavía tenga el campo; los hijos que se borren después ya no
+    # encuentran la fila y no vuelven a descontar
+    table = FarmStats.__table__
+    row = connection.execute(select(table).where(table.c.farm_id == farm.id)).one_or_none()
+    deltas = {"total_farms": -1}
+    if row is not None:
+        deltas.update(
+            total_user_reports=-row.user_reports,
+            total_admin_diagnostics=-row.admin_diagnostics,
+            total_images=-row.total_images,
+            farms_with_diagnostics=-1 if row.admin_diagnostics > 0 else 0,
+        )
+        connection.execute(delete(table).where(table.c.farm_id == farm.id))
+    _update_global(connection, **deltas)
+
+
+@event.listens_for(User, "after_insert")
+def _user_inserted(mapper, connection, user):
+    if user.is_admin == 'user':
+        _update_global(connection, total_users=1)
+
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, user):
+    if _previous(user, "is_admin") == 'user':
+        _update_global(connection, total_users=-1)
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, user):
+    old = _previous(user, "is_admin")
+    if old != user.is_admin and 'user' in (old, user.is_admin):
+        _update_global(connection, total_users=1 if user.is_admin == 'user' else -1)
+
+
+def rebuild_stats():
+    """
+    Recalcula farm_stats y global_stats desde cero (flask rebuild-stats)
+
+    Returns:
+        dict: los totales recalculados
+    """
+    FarmStats.query.delete()
+
+    rows = farm_statistics_query().all()
+    db.session.add_all([FarmStats(farm_id=row.Farm.id, **statistics_from_row(row)) for row in rows])
+
+    global_stats = db.session.get(GlobalStats, GLOBAL_STATS_ID) or GlobalStats(id=GLOBAL_STATS_ID)
+    global_stats.total_user_reports = DiagnosticReport.query.filter_by(is_diagnostic=False).count()
+    global_stats.total_admin_diagnostics = DiagnosticReport.query.filter_by(is_diagnostic=True).count()
+    global_stats.total_images = sum(int(row.total_images) for row in rows)
+    global_stats.total_farms = len(rows)
+    global_stats.farms_with_diagnostics = sum(1 for row in rows if row.admin_diagnostics > 0)
+    global_stats.total_users = User.query.filter_by(is_admin='user').count()
+    global_stats.updated_at = datetime.now(timezone.utc)
+    db.session.add(global_stats)
+    db.session.commit()
+
+    return global_stats.serialize()
+
+
+def get_global_stats():
+    """
+    Totales del overview, leídos de la fila de global_stats
+
+    Un GET nunca recalcula: si la fila falta (base creada sin la migración) se responde en 0
+    y se avisa en el log para correr `flask rebuild-stats`.
+    """
+    global_stats = db.session.get(GlobalStats, GLOBAL_STATS_ID)
+    if global_stats is None:
+        current_app.logger.warning("Falta la fila de global_stats: correr `flask rebuild-stats`")
+        global_stats = GlobalStats(id=GLOBAL_STATS_ID, total_user_reports=0, total_admin_diagnostics=0,
+                                   total_images=0, total_farms=0, farms_with_diagnostics=0, total_users=0)
+    return global_stats.serialize()
+
+
+@event.listens_for(GlobalStats.__table__, "after_create")
+def _seed_global_stats(table, connection, **kwargs):
+    # Con db.create_all() (tests, bases locales) la fila queda creada igual que con la migración
+    connection.execute(insert(table).values(id=GLOBAL_STATS_ID))
@@ -0,0 +1,322 @@
+"""
+Almacenamiento de archivos (imágenes, reportes, diagnósticos y avatares).
+
+Todas las subidas pasan por get_storage(), que devuelve el backend configurado en
+STORAGE_BACKEND:
+    "cloudinary" -> CloudinaryStorage (por defecto)
+    "local"      -> LocalStorage: guarda en UPLOAD_FOLDER con rutas por contenido (SHA-256),
+                    servidas por /uploads/<path>. Sirve para trabajar offline y para
+                    benchmarks sin I/O de red.
+
+Interfaz de un backend:
+    put(source, folder=None, public_id=None, file_name=None, **options) -> {"url", "key", "size"}
+    get(key)                   -> bytes
+    stream(key, chunk_size)    -> iterador de bytes
+    stream_url(url, chunk_size) -> iterador de bytes de un archivo ya guardado, a partir de su URL
+    delete(key)
+    url(key)                   -> URL pública
+
+Subidas directas desde el cliente (ver api/direct_uploads.py):
+    presign_upload(slot, expires_at, max_size, file_name) -> cómo subir el archivo sin pasar por
+                               la API: {"method", "url", "fields", "headers", "file_field"}
+    verify_direct_upload(slot, result) -> {"url", "key", "size", "sha256"} si la respuesta del
+                               almacenamiento está firmada y corresponde a ese slot (ValueError si no)
+
+LocalStorage simula las URLs firmadas con PUT /api/direct-uploads/<token> (para tests y
+desarrollo offline: en ese caso los bytes sí pasan por Flask).
+"""
+import hashlib
+import hmac
+import os
+import tempfile
+import time
+import urllib.request
+from functools import wraps
+from flask import current_app, url_for
+from itsdangerous import URLSafeSerializer, BadSignature
+from werkzeug.exceptions import RequestEntityTooLarge
+import cloudinary
+import cloudinary.uploader as cloudinary_uploader
+from cloudinary.utils import cloudinary_url, api_sign_request, verify_api_response_signature
+from api.metrics import observe_storage_upload
+
+CHUNK_SIZE = 64 * 1024
+
+
+def timed_put(put):
+    """Registra la duración y los bytes de cada subida (métricas de api/metrics.py)"""
+    @wraps(put)
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        result = put(self, *args, **kwargs)
+        observe_storage_upload(self.name, time.perf_counter() - started, result.get("size"))
+        return result
+    return wrapper
+
+
+class StorageBackend:
+    name = None
+
+    def put(self, source, folder=None, public_id=None, file_name=None, **options):
+        raise NotImplementedError
+
+    def get(self, key):
+        return b"".join(self.stream(key))
+
+    def stream(self, key, chunk_size=CHUNK_SIZE):
+        raise NotImplementedError
+
+    def stream_url(self, url, chunk_size=CHUNK_SIZE):
+        with urllib.request.urlopen(url) as response:
+            while True:
+                chunk = response.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def url(self, key):
+        raise NotImplementedError
+
+    def presign_upload(self, slot, expires_at, max_size, file_name=None):
+        raise NotImplementedError
+
+    def verify_direct_upload(self, slot, result):
+        raise NotImplementedError
+
+
+def _source_size(source):
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    return None
+
+
+class CloudinaryStorage(StorageBackend):
+    """Backend Cloudinary; los archivos grandes se suben por partes con upload_large"""
+    name = "cloudinary"
+
+    def __init__(self, large_threshold=20 * 1024 * 1024):
+        self.large_threshold = large_threshold
+
+    @timed_put
+    def put(self, source, folder=None, public_id=None, file_name=None, **options):
+        if folder is not None:
+            options["folder"] = folder
+        if public_id is not None:
+            options["public_id"] = public_id
+
+        size = _source_size(source)
+        if size is not None and size > self.large_threshold:
+            options.setdefault("resource_type", "auto")
+            result = cloudinary_uploader.upload_large(source, **options)
+        else:
+            result = cloudinary_uploader.upload(source, **options)
+
+        return {
+            "url": result.get("secure_url"),
+            "key": result.get("public_id"),
+            "size": result.get("bytes", size),
+        }
+
+    def stream(self, key, chunk_size=CHUNK_SIZE):
+        return self.stream_url(self.url(key), chunk_size)
+
+    def delete(self, key):
+        cloudinary_uploader.destroy(key)
+
+    def url(self, key):
+        return cloudinary_url(key, secure=True)[0]
+
+    def presign_upload(self, slot, expires_at, max_size, file_name=None):
+        # Subida firmada de Cloudinary: el cliente hace POST multipart con estos campos y "file".
+        # Cloudinary acepta la firma durante una hora desde timestamp; el tamaño máximo lo
+        # define la cuenta / el upload preset, no se puede firmar.
+        config = cloudinary.config()
+        params = {"public_id": slot, "timestamp": int(time.time())}
+        return {
+            "method": "POST",
+            "url": f"https://api.cloudinary.com/v1_1/{config.cloud_name}/image/upload",
+            "fields": {**params, "api_key": config.api_key, "signature": api_sign_request(params, config.api_secret)},
+            "headers": {},
+            "file_field": "file",
+        }
+
+    def verify_direct_upload(self, slot, result):
+        # result es la respuesta JSON de Cloudinary: public_id y version vienen firmados
+        public_id, version = result.get("public_id"), result.get("version")
+        if public_id != slot or not verify_api_response_signature(public_id, version, result.get("signature") or ""):
+            raise ValueError("La respuesta de Cloudinary no está firmada para esta subida")
+        return {
+            "url": cloudinary_url(public_id, version=version, format=result.get("format"), secure=True)[0],
+            "key": public_id,
+            "size": result.get("bytes"),
+            "sha256": None,
+        }
+
+
+class LocalStorage(StorageBackend):
+    """
+    Backend en disco con rutas por contenido: <root>/ab/cd/<sha256><ext>.
+    Dos archivos iguales terminan en la misma ruta, así que guardarlo de nuevo no ocupa más espacio.
+    """
+    name = "local"
+
+    def __init__(self, root, base_url="/uploads"):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def _path(self, key):
+        path = os.path.realpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.realpath(self.root) + os.sep):
+            raise ValueError(f"Key fuera del almacenamiento: {key}")
+        return path
+
+    @timed_put
+    def put(self, source, folder=None, public_id=None, file_name=None, **options):
+        # folder / public_id / opciones de Cloudinary no aplican: la ruta la define el contenido
+        os.makedirs(self.root, exist_ok=True)
+        content_hash = hashlib.sha256()
+        size = 0
+
+        with tempfile.NamedTemporaryFile(dir=self.root, prefix="put-", delete=False) as target:
+            source_file = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+            try:
+                while True:
+                    chunk = source_file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    content_hash.update(chunk)
+                    size += len(chunk)
+                    target.write(chunk)
+            except Exception:
+                target.close()
+                os.remove(target.name)
+                raise
+            finally:
+                if source_file is not source:
+                    source_file.close()
+
+        digest = content_hash.hexdigest()
+        extension = os.path.splitext(file_name or "")[1].lower()
+        key = f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(target.name, path)
+
+        return {"url": self.url(key), "key": key, "size": size, "sha256": digest}
+
+    def stream(self, key, chunk_size=CHUNK_SIZE):
+        with open(self._path(key), "rb") as source:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def stream_url(self, url, chunk_size=CHUNK_SIZE):
+        # las URLs propias (/uploads/<key>) se leen directo del disco
+        if url.startswith(self.base_url + "/"):
+            return self.stream(url[len(self.base_url) + 1:], chunk_size)
+        return super().stream_url(url, chunk_size)
+
+    def delete(self, key):
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def url(self, key):
+        return f"{self.base_url}/{key}"
+
+    # ----------- URLs firmadas simuladas (subidas directas) -----------------------------
+
+    def _direct_upload_serializer(self):
+        return URLSafeSerializer(current_app.config["JWT_SECRET_KEY"], salt="local-direct-upload")
+
+    def _result_signature(self, slot, key, size, sha256):
+        # Equivalente a la firma de la respuesta de Cloudinary: ata el archivo guardado al slot
+        secret = current_app.config["JWT_SECRET_KEY"].encode("utf-8")
+        message = f"{slot}:{key}:{size}:{sha256}".encode("utf-8")
+        return hmac.new(secret, message, hashlib.sha256).hexdigest()
+
+    def presign_upload(self, slot, expires_at, max_size, file_name=None):
+        token = self._direct_upload_serializer().dumps(
+            {"slot": slot, "exp": expires_at, "max_size": max_size, "file_name": file_name})
+        return {
+            "method": "PUT",
+            "url": url_for("api.receive_direct_upload", token=token, _external=True),
+            "fields": {},
+            "headers": {"Content-Type": "application/octet-stream"},
+            "file_field": None,
+        }
+
+    def receive_direct_upload(self, token, stream):
+        """
+        Recibe el body de PUT /api/direct-uploads/<token> (el "bucket" local)
+
+        Raises:
+            ValueError: si el token es inválido o venció
+            RequestEntityTooLarge: si el archivo supera el tamaño firmado
+
+        Returns:
+            dict: respuesta firmada para /upload-image/confirm
+        """
+        try:
+            upload = self._direct_upload_serializer().loads(token)
+        except BadSignature:
+            raise ValueError("URL de subida inválida")
+        if time.time() > upload["exp"]:
+            raise ValueError("La URL de subida venció")
+
+        stored = self.put(_LimitedReader(stream, upload["max_size"]), file_name=upload["file_name"])
+        return {
+            "key": stored["key"],
+            "size": stored["size"],
+            "sha256": stored["sha256"],
+            "signature": self._result_signature(upload["slot"], stored["key"], stored["size"], stored["sha256"]),
+        }
+
+    def verify_direct_upload(self, slot, result):
+        key, size, sha256 = result.get("key"), result.get("size"), result.get("sha256")
+        expected = self._result_signature(slot, key, size, sha256)
+        if not hmac.compare_digest(expected, str(result.get("signature") or "")):
+            raise ValueError("La respuesta del almacenamiento no está firmada para esta subida")
+        return {"url": self.url(key), "key": key, "size": size, "sha256": sha256}
+
+
+class _LimitedReader:
+    """Stream que corta con 413 al superar max_size bytes"""
+
+    def __init__(self, stream, max_size):
+        self._stream = stream
+        self._remaining = max_size
+
+    def read(self, size=-1):
+        chunk = self._stream.read(size)
+        self._remaining -= len(chunk)
+        if self._remaining < 0:
+            raise RequestEntityTooLarge()
+        return chunk
+
+
+def create_storage(app):
+    """Construye el backend según STORAGE_BACKEND"""
+    backend = app.config.get("STORAGE_BACKEND", "cloudinary")
+
+    if backend == "local":
+        return LocalStorage(app.config["UPLOAD_FOLDER"])
+    if backend == "cloudinary":
+        return CloudinaryStorage(app.config.get("CLOUDINARY_LARGE_THRESHOLD", 20 * 1024 * 1024))
+
+    raise ValueError(f"STORAGE_BACKEND desconocido: {backend}")
+
+
+def setup_storage(app):
+    app.extensions["storage"] = create_storage(app)
+
+
+def get_storage():
+    """Backend de almacenamiento de la app actual"""
+    return current_app.extensions["storage"]
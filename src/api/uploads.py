@@ -0,0 +1,431 @@
+"""
+Subidas asíncronas de archivos (imágenes, reportes, diagnósticos y avatares).
+
+El request solo guarda el archivo en disco (spool), crea un UploadJob en estado "pending"
+y responde 202 con el id del job. Un pool de workers sube el archivo al almacenamiento
+(api/storage.py) y crea la fila de Farm_images / DiagnosticReport o actualiza el avatar.
+
+Deduplicación: cada archivo se identifica por su SHA-256 (content_hash). Si ese contenido
+ya está almacenado se reutiliza su URL sin volver a subirlo, y si el mismo campo ya tiene
+esa imagen / ese reporte se devuelve la fila existente en vez de crear otra.
+
+Configuración (app.config):
+    UPLOAD_SPOOL_FOLDER  -> carpeta donde se guardan los archivos pendientes
+    UPLOAD_JOBS_MODE     -> "thread" (pool dentro del proceso, por defecto),
+                            "inline" (se procesa en el mismo request, útil para tests) o
+                            "external" (solo se encola; lo procesa `flask upload-worker`)
+    UPLOAD_WORKERS       -> tamaño del pool de threads (por defecto 4)
+    UPLOAD_JOB_STALE_MINUTES -> un job "pending" o "processing" sin novedades hace más de esto
+                            quedó huérfano (se reinició o se cayó el proceso que lo tenía):
+                            recover_stale_jobs lo vuelve a encolar. Tiene que superar la subida
+                            más larga, si no un job en curso se procesaría dos veces.
+    UPLOAD_JOB_RECOVERY_INTERVAL -> cada cuántos segundos lo revisa el modo "thread"
+
+La recuperación corre en `flask upload-worker` y, en modo "thread", en un thread que arranca
+con el primer request del proceso.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from threading import Lock, Thread
+from flask import current_app
+from api.models import db, User, Farm_images, DiagnosticReport, UploadJob
+from api.ingest import HashingSpooledFile, ingest_info, file_sha256, CHUNK_SIZE
+from api.storage import get_storage
+from api.derivatives import generate_after_upload
+
+DEFAULT_STALE_MINUTES = 30
+DEFAULT_RECOVERY_INTERVAL = 60
+
+_executor = None
+_executor_lock = Lock()
+_recovery_thread = None
+
+
+# ----------- Deduplicación -----------------------------
+
+def find_stored_urls(content_hashes):
+    """
+    Busca archivos ya almacenados con el mismo contenido (en imágenes y en reportes)
+
+    Args:
+        content_hashes (iterable): SHA-256 de los archivos a subir
+
+    Returns:
+        dict: {content_hash: url} solo para los hashes que ya existen
+    """
+    hashes = {content_hash for content_hash in content_hashes if content_hash}
+    if not hashes:
+        return {}
+
+    stored = {}
+    for hash_column, url_column in ((Farm_images.content_hash, Farm_images.image_url),
+                                    (DiagnosticReport.content_hash, DiagnosticReport.file_url)):
+        rows = db.session.query(hash_column, url_column).filter(hash_column.in_(hashes)).all()
+        for content_hash, url in rows:
+            stored.setdefault(content_hash, url)
+    return stored
+
+
+def is_url_referenced(url):
+    """True si alguna imagen o reporte usa esa URL (no se puede borrar el archivo compartido)"""
+    return db.session.query(
+        db.session.query(Farm_images.id).filter(Farm_images.image_url == url).exists()
+    ).scalar() or db.session.query(
+        db.session.query(DiagnosticReport.id).filter(DiagnosticReport.file_url == url).exists()
+    ).scalar()
+
+
+# ----------- Creación de filas -----------------------------
+
+def build_farm_image(farm_id, image_type, image_url, file_name, uploaded_by, content_hash=None):
+    """Crea (sin commit) la fila Farm_images de una imagen ya subida"""
+    new_image = Farm_images(
+        farm_id=farm_id,
+        image_type=image_type,
+        image_url=image_url,
+        upload_date=datetime.now(timezone.utc),
+        file_name=file_name,
+        uploaded_by=uploaded_by,
+        content_hash=content_hash
+    )
+    db.session.add(new_image)
+    return new_image
+
+
+def build_report(user_id, farm_id, file_name, file_url, uploaded_by, description, is_diagnostic, content_hash=None):
+    """Crea (sin commit) la fila DiagnosticReport de un reporte o diagnóstico ya subido"""
+    new_report = DiagnosticReport(
+        user_id=user_id,
+        farm_id=farm_id,
+        file_name=file_name,
+        file_url=file_url,
+        uploaded_at=datetime.now(timezone.utc),
+        uploaded_by=uploaded_by,
+        description=description,
+        is_diagnostic=is_diagnostic,
+        content_hash=content_hash
+    )
+    db.session.add(new_report)
+    return new_report
+
+
+def _existing_row_id(job, params, content_hash):
+    """Id de la fila del mismo campo con el mismo contenido, si ya existe"""
+    if job.kind == "image":
+        query = db.session.query(Farm_images.id).filter_by(
+            farm_id=job.farm_id, image_type=params["image_type"], content_hash=content_hash)
+    else:
+        query = db.session.query(DiagnosticReport.id).filter_by(
+            farm_id=job.farm_id, is_diagnostic=job.kind == "diagnostic", content_hash=content_hash)
+    return query.limit(1).scalar()
+
+
+def _finalize_job(job, upload_result, params, content_hash=None):
+    """Crea la fila final según el tipo de job (o reutiliza una idéntica) y devuelve su id"""
+    url = upload_result["url"]
+    user = db.session.get(User, job.user_id)
+
+    if job.kind in ("image", "report", "diagnostic") and content_hash:
+        existing_id = _existing_row_id(job, params, content_hash)
+        if existing_id is not None:
+            return existing_id
+
+    if job.kind == "image":
+        row = build_farm_image(job.farm_id, params["image_type"], url, job.file_name, str(user.email), content_hash)
+    elif job.kind in ("report", "diagnostic"):
+        row = build_report(job.user_id, job.farm_id, job.file_name, url, user.email,
+                           params.get("description"), job.kind == "diagnostic", content_hash)
+    elif job.kind == "avatar":
+        user.avatar = url
+        user.public_id = upload_result["key"]
+        return user.id
+    else:
+        raise ValueError(f"Tipo de job desconocido: {job.kind}")
+
+    db.session.flush()
+    return row.id
+
+
+# ----------- Encolado -----------------------------
+
+def spool_file(file_storage):
+    """
+    Guarda el archivo recibido en la carpeta de spool y devuelve la ruta.
+    Si llegó por ingesta streaming y ya está en disco, solo se renombra.
+    """
+    spool_folder = current_app.config["UPLOAD_SPOOL_FOLDER"]
+    os.makedirs(spool_folder, exist_ok=True)
+
+    path = os.path.join(spool_folder, uuid.uuid4().hex)
+    if isinstance(file_storage.stream, HashingSpooledFile):
+        return file_storage.stream.persist(path)
+
+    file_storage.save(path)
+    return path
+
+
+def build_upload_job(kind, user_id, spool_path, file_name, farm_id=None, **params):
+    """Crea (sin commit) el UploadJob pendiente de un archivo que ya está en la carpeta de spool"""
+    job = UploadJob(
+        id=str(uuid.uuid4()),
+        kind=kind,
+        status="pending",
+        user_id=int(user_id),
+        farm_id=int(farm_id) if farm_id is not None else None,
+        file_name=file_name,
+        spool_path=spool_path,
+        params=json.dumps(params)
+    )
+    db.session.add(job)
+    return job
+
+
+def enqueue_upload(kind, user_id, file_storage, file_name, farm_id=None, **params):
+    """
+    Guarda el archivo en disco, crea el UploadJob pendiente y lo despacha según UPLOAD_JOBS_MODE
+
+    Args:
+        kind (str): image, report, diagnostic o avatar
+        user_id (int): usuario que sube el archivo
+        file_storage (FileStorage): archivo recibido en request.files
+        file_name (str): nombre seguro del archivo
+        farm_id (int): campo al que pertenece (None para avatar)
+        **params: image_type, description y upload_options (kwargs del uploader).
+            Se agregan sha256 y size si el archivo pasó por la ingesta streaming.
+
+    Returns:
+        UploadJob: el job creado (ya commiteado)
+    """
+    params.update(ingest_info(file_storage))
+    job = build_upload_job(kind, user_id, spool_file(file_storage), file_name, farm_id, **params)
+
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        os.remove(job.spool_path)
+        raise
+
+    dispatch_job(job.id)
+    return job
+
+
+def dispatch_job(job_id):
+    """Procesa el job en el mismo request, en el pool de threads o lo deja para el worker externo"""
+    mode = current_app.config.get("UPLOAD_JOBS_MODE", "thread")
+
+    if mode == "inline":
+        process_upload_job(job_id)
+    elif mode == "thread":
+        _get_executor().submit(_run_in_app_context, current_app._get_current_object(), job_id)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get("UPLOAD_WORKERS", 4),
+                thread_name_prefix="upload-worker"
+            )
+    return _executor
+
+
+def _run_in_app_context(app, job_id):
+    with app.app_context():
+        process_upload_job(job_id)
+
+
+# ----------- Procesamiento -----------------------------
+
+def claim_job(job_id):
+    """
+    Marca el job como "processing" solo si sigue "pending" (UPDATE condicional),
+    así un job nunca lo procesan dos workers a la vez.
+
+    Returns:
+        bool: True si este worker se quedó con el job
+    """
+    claimed = UploadJob.query.filter_by(id=job_id, status="pending").update(
+        {"status": "processing", "updated_at": datetime.now(timezone.utc)},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return claimed == 1
+
+
+def process_upload_job(job_id):
+    """
+    Sube el archivo del job al almacenamiento y crea la fila final
+
+    Returns:
+        UploadJob: el job actualizado, o None si otro worker ya lo tomó
+    """
+    if not claim_job(job_id):
+        return None
+
+    job = db.session.get(UploadJob, job_id)
+    params = json.loads(job.params or "{}")
+
+    try:
+        content_hash = params.get("sha256") or file_sha256(job.spool_path)
+
+        # Si el contenido ya está almacenado se reutiliza la URL y no se sube de nuevo.
+        # Los avatares siempre se suben: se borran del almacenamiento al cambiarlos.
+        stored_url = find_stored_urls([content_hash]).get(content_hash) if job.kind != "avatar" else None
+        if stored_url:
+            upload_result = {"url": stored_url, "key": None, "size": params.get("size")}
+        else:
+            upload_result = get_storage().put(job.spool_path, file_name=job.file_name, **params.get("upload_options", {}))
+
+        job.result_id = _finalize_job(job, upload_result, params, content_hash)
+        job.result_url = upload_result["url"]
+        job.status = "done"
+        job.updated_at = datetime.now(timezone.utc)
+        db.session.commit()
+
+        if job.kind == "image":
+            generate_after_upload(db.session.get(Farm_images, job.result_id))
+
+    except Exception as error:
+        db.session.rollback()
+        print(f"Error procesando upload job {job_id}: {error}")
+        job = db.session.get(UploadJob, job_id)
+        job.status = "failed"
+        job.error = str(error)[:500]
+        job.updated_at = datetime.now(timezone.utc)
+        db.session.commit()
+
+    if job.spool_path and os.path.exists(job.spool_path):
+        os.remove(job.spool_path)
+
+    return job
+
+
+def pending_job_ids(limit=100):
+    """Ids de los jobs pendientes más antiguos (para el worker externo)"""
+    rows = db.session.query(UploadJob.id).filter_by(status="pending") \
+        .order_by(UploadJob.created_at).limit(limit).all()
+    return [row.id for row in rows]
+
+
+# ----------- Recuperación de jobs huérfanos -----------------------------
+
+def recover_stale_jobs(limit=100):
+    """
+    Vuelve a encolar los jobs "pending" / "processing" sin novedades hace más de
+    UPLOAD_JOB_STALE_MINUTES. Los "processing" pasan a "pending" con un UPDATE condicional
+    (si dos procesos los recuperan a la vez, solo uno gana); los que ya no tienen su archivo
+    en spool no se pueden subir y quedan "failed".
+
+    Returns:
+        list: ids de los jobs listos para process_upload_job
+    """
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(minutes=current_app.config.get("UPLOAD_JOB_STALE_MINUTES", DEFAULT_STALE_MINUTES))
+    rows = db.session.query(UploadJob.id, UploadJob.status, UploadJob.spool_path) \
+        .filter(UploadJob.status.in_(("pending", "processing")), UploadJob.updated_at < cutoff) \
+        .order_by(UploadJob.created_at).limit(limit).all()
+
+    job_ids = []
+    for job_id, status, spool_path in rows:
+        stale = UploadJob.query.filter(UploadJob.id == job_id, UploadJob.status == status,
+                                       UploadJob.updated_at < cutoff)
+        if not spool_path or not os.path.exists(spool_path):
+            stale.update({"status": "failed", "error": "El archivo temporal de la subida ya no existe",
+                          "updated_at": now}, synchronize_session=False)
+        elif status == "pending" or stale.update({"status": "pending", "updated_at": now},
+                                                 synchronize_session=False):
+            job_ids.append(job_id)
+    db.session.commit()
+    return job_ids
+
+
+def _recover_periodically(app):
+    interval = app.config.get("UPLOAD_JOB_RECOVERY_INTERVAL", DEFAULT_RECOVERY_INTERVAL)
+    while True:
+        with app.app_context():
+            try:
+                for job_id in recover_stale_jobs():
+                    dispatch_job(job_id)
+            except Exception as error:
+                db.session.rollback()
+                print(f"Error recuperando upload jobs: {error}")
+            finally:
+                db.session.remove()
+        time.sleep(interval)
+
+
+def _start_recovery():
+    global _recovery_thread
+    with _executor_lock:
+        if _recovery_thread is None:
+            _recovery_thread = Thread(target=_recover_periodically, args=(current_app._get_current_object(),),
+                                      name="upload-recovery", daemon=True)
+            _recovery_thread.start()
+
+
+def setup_upload_jobs(app):
+    # Solo el modo "thread" despacha jobs dentro del proceso web; el thread arranca con el primer
+    # request para no correr durante los comandos de flask (db upgrade, etc.)
+    if app.config.get("UPLOAD_JOBS_MODE", "thread") == "thread":
+        app.before_request(_start_recovery)
+
+
+# ----------- Subidas en lote -----------------------------
+
+def spool_stream(stream):
+    """
+    Guarda en la carpeta de spool el contenido de un stream (ej: un miembro de un zip/tar),
+    calculando el SHA-256 mientras se copia
+
+    Returns:
+        tuple: (ruta en spool, sha256)
+    """
+    spool_folder = current_app.config["UPLOAD_SPOOL_FOLDER"]
+    os.makedirs(spool_folder, exist_ok=True)
+
+    path = os.path.join(spool_folder, uuid.uuid4().hex)
+    content_hash = hashlib.sha256()
+    with open(path, "wb") as target:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            content_hash.update(chunk)
+            target.write(chunk)
+    return path, content_hash.hexdigest()
+
+
+def upload_files_concurrently(files, upload_options=None):
+    """
+    Sube varios archivos ya guardados en spool con un pool acotado (UPLOAD_WORKERS).
+    Borra cada archivo de spool al terminar.
+
+    Args:
+        files (list): lista de dicts con "path" y "file_name"
+        upload_options (dict): kwargs comunes para storage.put (ej: folder)
+
+    Returns:
+        list: por cada archivo, (upload_result, None) si salió bien o (None, error)
+    """
+    storage = get_storage()
+    upload_options = upload_options or {}
+
+    def upload_one(item):
+        try:
+            return storage.put(item["path"], file_name=item.get("file_name"), **upload_options), None
+        except Exception as error:
+            return None, error
+        finally:
+            if os.path.exists(item["path"]):
+                os.remove(item["path"])
+
+    max_workers = max(1, min(current_app.config.get("UPLOAD_WORKERS", 4), len(files)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch-upload") as executor:
+        return list(executor.map(upload_one, files))
@@ -2,9 +2,8 @@ from flask import url_for
 import os
 from email.mime.text import MIMEText                
 from email.mime.multipart import MIMEMultipart
-import smtplib
-import ssl
 from api.models import db, User
+from api.mailer import enqueue_mail
 
 class APIException(Exception):
     status_code = 400
@@ -52,12 +51,13 @@ def generate_sitemap(app):
 # Codigo extra para mandar mensaje.
 
 def send_email(subject, to, body_message):
+    """
+    Arma el correo y lo encola; lo envía el worker de api/mailer.py reutilizando la conexión SMTP
 
-    # Defino credenciales:
-    smtp_address = os.getenv("SMTP_ADDRESS")
-    smtp_port = os.getenv("SMTP_PORT")
+    Returns:
+        bool: True si quedó encolado, False si la cola está llena
+    """
     email_address = os.getenv("EMAIL_ADDRESS")
-    email_password = os.getenv("EMAIL_PASSWORD")   
 
     message = MIMEMultipart("alternative")
     message["Subject"] = subject                            
@@ -76,15 +76,7 @@ def send_email(subject, to, body_message):
 
     message.attach(html_mime)                   
 
-    try:
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL(smtp_address, smtp_port, context = context) as server:
-            server.login(email_address, email_password)
-            server.sendmail(email_address, to, message.as_string())     
-            return True
-    except Exception as error:
-        print(str(error))
-        return False
+    return enqueue_mail(email_address, [to], message.as_string())
 
 
 # ============ FUNCIONES DE ADMINISTRACIÓN DE USUARIOS ============
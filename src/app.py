@@ -10,6 +10,17 @@ from api.models import db, User, Farm, Farm_images, DiagnosticReport
 from api.routes import api
 from api.admin import setup_admin
 from api.commands import setup_commands
+from api.ingest import setup_ingest
+from api.storage import setup_storage
+from api.uploads import setup_upload_jobs
+from api.derivatives import setup_derivatives
+from api.identity import setup_identity_cache
+from api.passwords import setup_password_hashing, default_workers as default_password_workers
+from api.static_assets import setup_static_assets, serve_static
+from api.metrics import setup_metrics
+from api.profiling import setup_profiling
+from api.read_models import setup_json
+from api.compression import setup_compression
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 from base64 import b64encode
@@ -27,6 +38,9 @@ static_file_dir = os.path.join(os.path.dirname(
 
 app = Flask(__name__)
 
+# jsonify con orjson si está instalado (ver api/read_models.py)
+setup_json(app)
+
 load_dotenv()
 
 # jwt configuration. Must be after app = Flask(__name__)
@@ -62,6 +76,9 @@ setup_admin(app)
 # add the admin
 setup_commands(app)
 
+# archivos de los requests leídos por streaming a disco, con checksum
+setup_ingest(app)
+
 # Add all endpoints form the API with a "api" prefix
 app.register_blueprint(api, url_prefix='/api')
 
@@ -71,13 +88,89 @@ UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')  # ruta física en el servidor
 # Dónde queda la carpeta: Con os.getcwd() y ejecutando mi app desde la raíz del proyecto, la carpeta será ./uploads/.
 # Crear la carpeta: el endpoint crea reports/ con os.makedirs(..., exist_ok=True), pero puedes crear uploads en tu repo y añadir .gitkeep o ignorarla en git.
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 20 * 1024 * 1024  # 20 MB máximo por request (ajusta según necesites)
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("MAX_REQUEST_MB", 8)) * 1024 * 1024  # MB máximo por request (ajusta según necesites)
+# Las rutas de subida leen los archivos por streaming a disco (api/ingest.py) y suben su límite a este
+app.config['MAX_UPLOAD_CONTENT_LENGTH'] = int(os.getenv("MAX_UPLOAD_MB", 512)) * 1024 * 1024
+# /register y /update-avatar: el mismo límite que tenían antes de achicar MAX_CONTENT_LENGTH
+app.config['MAX_AVATAR_CONTENT_LENGTH'] = int(os.getenv("MAX_AVATAR_MB", 20)) * 1024 * 1024
+app.config['INGEST_MEMORY_THRESHOLD'] = 1024 * 1024                  # hasta 1 MB en memoria, más grande va a disco
+app.config['CLOUDINARY_LARGE_THRESHOLD'] = 20 * 1024 * 1024          # desde 20 MB se sube a Cloudinary por partes
+
+# Subidas asíncronas: el request deja el archivo en UPLOAD_SPOOL_FOLDER y responde 202,
+# un pool de workers lo sube al almacenamiento (ver api/uploads.py)
+app.config['UPLOAD_SPOOL_FOLDER'] = os.getenv("UPLOAD_SPOOL_FOLDER", os.path.join(BASE_DIR, 'upload_spool'))
+app.config['UPLOAD_JOBS_MODE'] = os.getenv("UPLOAD_JOBS_MODE", "thread")      # thread, inline o external (flask upload-worker)
+app.config['UPLOAD_WORKERS'] = int(os.getenv("UPLOAD_WORKERS", 4))
+app.config['UPLOAD_JOB_STALE_MINUTES'] = int(os.getenv("UPLOAD_JOB_STALE_MINUTES", 30))       # jobs sin novedades que se vuelven a encolar
+app.config['UPLOAD_JOB_RECOVERY_INTERVAL'] = int(os.getenv("UPLOAD_JOB_RECOVERY_INTERVAL", 60))  # segundos entre revisiones (modo thread)
+setup_upload_jobs(app)
+app.config['BATCH_UPLOAD_MAX_FILES'] = int(os.getenv("BATCH_UPLOAD_MAX_FILES", 500))  # imágenes por request en /upload-images/batch
+# Subidas reanudables por bloques (ver api/resumable.py); los bloques se guardan en UPLOAD_SPOOL_FOLDER/resumable
+app.config['RESUMABLE_UPLOAD_MAX_MB'] = int(os.getenv("RESUMABLE_UPLOAD_MAX_MB", 4096))       # tamaño máximo del archivo completo
+app.config['RESUMABLE_CHUNK_MB'] = int(os.getenv("RESUMABLE_CHUNK_MB", 8))                    # bloque sugerido al cliente
+app.config['RESUMABLE_UPLOAD_TTL_HOURS'] = int(os.getenv("RESUMABLE_UPLOAD_TTL_HOURS", 48))   # sesiones sin actividad que se borran
+# Subidas directas al almacenamiento con parámetros firmados (ver api/direct_uploads.py)
+app.config['DIRECT_UPLOAD_TTL'] = int(os.getenv("DIRECT_UPLOAD_TTL", 3600))          # segundos de validez de la firma y del ticket
+app.config['DIRECT_UPLOAD_MAX_MB'] = int(os.getenv("DIRECT_UPLOAD_MAX_MB", 1024))    # tamaño máximo (solo lo controla LocalStorage)
+
+# Almacenamiento de archivos (ver api/storage.py): "cloudinary" o "local" (UPLOAD_FOLDER, servido por /uploads)
+app.config['STORAGE_BACKEND'] = os.getenv("STORAGE_BACKEND", "cloudinary")
+setup_storage(app)
+
+# Miniaturas y tiles de las imágenes (ver api/derivatives.py), en caché de disco con expulsión LRU
+app.config['DERIVATIVES_FOLDER'] = os.getenv("DERIVATIVES_FOLDER", os.path.join(BASE_DIR, 'derivatives_cache'))
+app.config['DERIVATIVES_CACHE_MB'] = int(os.getenv("DERIVATIVES_CACHE_MB", 1024))
+app.config['DERIVATIVES_ON_UPLOAD'] = os.getenv("DERIVATIVES_ON_UPLOAD", "1") == "1"     # si no, se generan en el primer request
+app.config['THUMBNAIL_SIZE'] = 256
+app.config['TILE_SIZE'] = 256
+app.config['DERIVATIVES_MAX_PIXELS'] = int(os.getenv("DERIVATIVES_MAX_PIXELS", 100_000_000))   # imágenes más grandes no se decodifican
+app.config['DERIVATIVE_URL_TTL'] = int(os.getenv("DERIVATIVE_URL_TTL", 24 * 60 * 60))          # segundos de validez de las URLs firmadas
+setup_derivatives(app)
+
+# Caché de rol de usuarios y dueño de campos (ver api/identity.py); 0 la desactiva
+app.config['IDENTITY_CACHE_TTL'] = int(os.getenv("IDENTITY_CACHE_TTL", 30))
+app.config['IDENTITY_CACHE_SIZE'] = int(os.getenv("IDENTITY_CACHE_SIZE", 10000))
+setup_identity_cache(app)
+
+# Hash de contraseñas en un pool de procesos con cola acotada (ver api/passwords.py)
+app.config['PASSWORD_HASH_METHOD'] = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+app.config['PASSWORD_HASH_POOL'] = os.getenv("PASSWORD_HASH_POOL", "process")        # process o inline
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv("PASSWORD_HASH_WORKERS", default_password_workers()))  # por worker de gunicorn
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 4 * app.config['PASSWORD_HASH_WORKERS']))
+setup_password_hashing(app)
+
+# Cola de correos con conexión SMTP reutilizada y reintentos (ver api/mailer.py)
+app.config['MAIL_QUEUE_MODE'] = os.getenv("MAIL_QUEUE_MODE", "thread")        # thread o inline
+app.config['MAIL_QUEUE_MAX'] = int(os.getenv("MAIL_QUEUE_MAX", 1000))
+app.config['MAIL_BATCH_SIZE'] = int(os.getenv("MAIL_BATCH_SIZE", 20))
+app.config['MAIL_MAX_RETRIES'] = int(os.getenv("MAIL_MAX_RETRIES", 5))
+app.config['MAIL_RETRY_BACKOFF'] = float(os.getenv("MAIL_RETRY_BACKOFF", 1.0))
+app.config['MAIL_IDLE_TIMEOUT'] = int(os.getenv("MAIL_IDLE_TIMEOUT", 60))
+
+# Métricas de Prometheus en /metrics (ver api/metrics.py); con METRICS_TOKEN exige Authorization: Bearer
+app.config['METRICS_TOKEN'] = os.getenv("METRICS_TOKEN")
+setup_metrics(app)
+
+# Perfilado de SQL por request y detector de N+1 (ver api/profiling.py), desactivado por defecto
+app.config['SQL_PROFILING'] = os.getenv("SQL_PROFILING") == "1"
+app.config['SQL_N_PLUS_ONE_THRESHOLD'] = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 5))
+setup_profiling(app)
+
+# Compresión gzip / brotli de las respuestas (ver api/compression.py); desactivarla si ya comprime un proxy
+app.config['COMPRESSION_ENABLED'] = os.getenv("COMPRESSION_ENABLED", "1") == "1"
+app.config['COMPRESSION_LEVEL'] = int(os.getenv("COMPRESSION_LEVEL", 6))                      # gzip, 1-9
+app.config['COMPRESSION_BROTLI_QUALITY'] = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))    # brotli, 0-11
+app.config['COMPRESSION_MIN_SIZE'] = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))              # bytes
+setup_compression(app)
+
+# Manifiesto de dist/ armado al arrancar: después de un `npm run build` hay que reiniciar
+setup_static_assets(app, static_file_dir)
 
 from flask import send_from_directory
 
-@app.route('/uploads/<filename>')
+@app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(os.path.join(os.getcwd(), 'uploads'), filename)
+    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
 # Handle/serialize errors like a JSON object
 
@@ -91,16 +184,13 @@ def handle_invalid_usage(error):
 def sitemap():
     if ENV == "development":
         return generate_sitemap(app)
-    return send_from_directory(static_file_dir, 'index.html')
+    return serve_static(app.extensions["static_manifest"], 'index.html')
 
 # any other endpoint will try to serve it like a static file
+# (manifiesto en memoria de dist/, assets con hash cacheados como immutable, ver api/static_assets.py)
 @app.route('/<path:path>', methods=['GET'])
 def serve_any_other_file(path):
-    if not os.path.isfile(os.path.join(static_file_dir, path)):
-        path = 'index.html'
-    response = send_from_directory(static_file_dir, path)
-    response.cache_control.max_age = 0  # avoid cache memory
-    return response
+    return serve_static(app.extensions["static_manifest"], path)
 
 
 # this only runs if `$ python src/app.py` is executed
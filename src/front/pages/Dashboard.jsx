@@ -115,35 +115,103 @@ export const Dashboard = ({ selectedFarmId }) => {
         }
     };
 
-    // ============ FUNCIONES DE REPORTES DE USUARIOS ============
+    // Los listados de la API vienen paginados por cursor: se siguen los next_cursor hasta la última página
+    const fetchAllPages = async (url, itemsKey = "items") => {
+        const token = store.token;
+        const separator = url.includes("?") ? "&" : "?";
+        const items = [];
+        let cursor = null;
+        let data = null;
+
+        do {
+            const pageUrl = `${url}${separator}limit=500` + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : "");
+            const response = await fetch(pageUrl, {
+                headers: {
+                    'Authorization': `Bearer ${token}`,
+                    "Content-Type": "application/json"
+                }
+            });
 
-    const fetchReports = async () => {
-        const farmId = selectedFarmId || selectedFarm;
+            data = await response.json();
 
-        if (!farmId) {
-            setReports([]);
-            return;
-        }
+            if (!response.ok) {
+                const error = new Error(data.error || `Error del servidor: ${response.status}`);
+                error.status = response.status;
+                throw error;
+            }
+
+            items.push(...(data[itemsKey] || []));
+            cursor = data.next_cursor;
+        } while (cursor);
+
+        return { ...data, [itemsKey]: items };
+    };
+
+    // Las subidas responden 202 con status_url: se consulta el job hasta que termina (done o failed).
+    // Si pasan UPLOAD_JOB_MAX_WAIT ms se devuelve el job como esté (pending / processing).
+    const UPLOAD_JOB_MAX_WAIT = 10 * 60 * 1000;
+
+    const waitForUploadJob = async (data) => {
+        // Respuesta sin job (ej: el archivo ya estaba subido)
+        if (!data.status_url) return { ...(data.data || data), status: "done" };
 
         const token = store.token;
         const urlBackend = import.meta.env.VITE_BACKEND_URL;
+        const startedAt = Date.now();
+        let job = data.data || {};
+        let delay = 1000;
 
-        try {
-            const response = await fetch(`${urlBackend}/api/reports?farm_id=${farmId}`, {
+        while (Date.now() - startedAt < UPLOAD_JOB_MAX_WAIT) {
+            await new Promise(resolve => setTimeout(resolve, delay));
+
+            const response = await fetch(`${urlBackend}${data.status_url}`, {
                 headers: {
                     'Authorization': `Bearer ${token}`,
                     "Content-Type": "application/json"
                 }
             });
 
-            const data = await response.json();
+            job = await response.json();
 
-            if (response.ok) {
-                setReports(data);
-            } else {
-                console.error("Error al obtener reportes:", data.error);
-                setReports([]);
+            if (!response.ok) {
+                throw new Error(job.error || `Error del servidor: ${response.status}`);
+            }
+            if (job.status === "done" || job.status === "failed") {
+                return job;
             }
+
+            delay = Math.min(delay * 1.5, 10000);
+        }
+
+        return job;
+    };
+
+    // Mensaje para el usuario según cómo terminó el job
+    const alertUploadJob = (job, successMessage) => {
+        if (job.status === "failed") {
+            alert(`Error: ${job.error || "la subida falló"}`);
+        } else if (job.status === "done") {
+            alert(successMessage);
+        } else {
+            alert("El archivo se sigue procesando, aparecerá en la lista cuando termine");
+        }
+    };
+
+    // ============ FUNCIONES DE REPORTES DE USUARIOS ============
+
+    const fetchReports = async () => {
+        const farmId = selectedFarmId || selectedFarm;
+
+        if (!farmId) {
+            setReports([]);
+            return;
+        }
+
+        const urlBackend = import.meta.env.VITE_BACKEND_URL;
+
+        try {
+            const data = await fetchAllPages(`${urlBackend}/api/reports?farm_id=${farmId}`);
+            setReports(data.items);
         } catch (error) {
             console.error("Error al obtener reportes:", error);
             setReports([]);
@@ -158,33 +226,18 @@ export const Dashboard = ({ selectedFarmId }) => {
             return;
         }
 
-        const token = store.token;
         const urlBackend = import.meta.env.VITE_BACKEND_URL;
 
         try {
             // Usar el endpoint que obtiene diagnósticos de un campo específico
-            const response = await fetch(`${urlBackend}/api/admin/diagnostics/${farmId}`, {
-                method: "GET",
-                credentials: "include",
-                headers: {
-                    'Authorization': `Bearer ${token}`,
-                    "Content-Type": "application/json"
-                }
-            });
-
-            if (response.ok) {
-                const data = await response.json();
-                setDiagnosticReports(data.diagnostics || []);
-            } else if (response.status === 404) {
-                // No hay diagnósticos para este campo
-                setDiagnosticReports([]);
-            } else {
-                console.error("Error al obtener diagnósticos:", response.status);
-                setDiagnosticReports([]);
-            }
+            const data = await fetchAllPages(`${urlBackend}/api/admin/diagnostics/${farmId}`, "diagnostics");
+            setDiagnosticReports(data.diagnostics);
 
         } catch (error) {
-            console.error("Error al obtener diagnósticos:", error);
+            // 404: no hay diagnósticos para este campo
+            if (error.status !== 404) {
+                console.error("Error al obtener diagnósticos:", error);
+            }
             setDiagnosticReports([]);
         }
     };
@@ -224,8 +277,8 @@ export const Dashboard = ({ selectedFarmId }) => {
             const data = await response.json();
 
             if (response.ok) {
-                alert("Reporte subido correctamente");
                 setSelectedReportFile(null);
+                alertUploadJob(await waitForUploadJob(data), "Reporte subido correctamente");
                 fetchReports();                 // Actualizar la lista de reportes
             } else {
                 alert(`Error: ${data.error}`);
@@ -308,8 +361,8 @@ export const Dashboard = ({ selectedFarmId }) => {
             const data = await response.json();
 
             if (response.ok) {
-                alert("Diagnóstico subido correctamente");
                 setSelectedDiagnosticFile(null);
+                alertUploadJob(await waitForUploadJob(data), "Diagnóstico subido correctamente");
                 fetchDiagnosticReports();
             } else {
                 alert(`Error: ${data.error}`);
@@ -344,42 +397,22 @@ export const Dashboard = ({ selectedFarmId }) => {
     };
 
     const fetchAllUsersAdmin = async () => {
-        const token = store.token;
         const urlBackend = import.meta.env.VITE_BACKEND_URL;
 
         try {
-            const response = await fetch(`${urlBackend}/api/admin/all-users`, {
-                headers: {
-                    'Authorization': `Bearer ${token}`,
-                    'Content-Type': 'application/json'
-                }
-            });
-
-            if (response.ok) {
-                const data = await response.json();
-                setAllUsers(data.users);
-            }
+            const data = await fetchAllPages(`${urlBackend}/api/admin/all-users`, "users");
+            setAllUsers(data.users);
         } catch (error) {
             console.error("Error al obtener usuarios:", error);
         }
     };
 
     const fetchAllFarmsAdmin = async () => {
-        const token = store.token;
         const urlBackend = import.meta.env.VITE_BACKEND_URL;
 
         try {
-            const response = await fetch(`${urlBackend}/api/admin/all-farms`, {
-                headers: {
-                    'Authorization': `Bearer ${token}`,
-                    'Content-Type': 'application/json'
-                }
-            });
-
-            if (response.ok) {
-                const data = await response.json();
-                setAllFarms(data.farms);
-            }
+            const data = await fetchAllPages(`${urlBackend}/api/admin/all-farms`, "farms");
+            setAllFarms(data.farms);
         } catch (error) {
             console.error("Error al obtener campos:", error);
         }
@@ -434,8 +467,8 @@ export const Dashboard = ({ selectedFarmId }) => {
             const data = await response.json();
 
             if (response.ok) {
-                alert("Diagnóstico subido correctamente");
                 setSelectedDiagnosticFile(null);
+                alertUploadJob(await waitForUploadJob(data), "Diagnóstico subido correctamente");
 
                 // Recargar detalles
                 if (selectedAdminFarm) {
@@ -481,8 +514,8 @@ export const Dashboard = ({ selectedFarmId }) => {
             const data = await response.json();
 
             if (response.ok) {
-                alert("Imagen subida correctamente");
                 setSelectedImageFile(null);
+                alertUploadJob(await waitForUploadJob(data), "Imagen subida correctamente");
                 fetchImages(selectedFarm);      // Recargar imágenes del huerto específico
             } else {
                 alert("Error: " + data.error);
@@ -496,7 +529,6 @@ export const Dashboard = ({ selectedFarmId }) => {
 
     // Función para obtener imágenes filtradas por farm
     const fetchImages = async (farmId = null) => {
-        const token = store.token;
         const urlBackend = import.meta.env.VITE_BACKEND_URL;
 
         // Si no se pasa farmId, usar el seleccionado actualmente
@@ -511,24 +543,11 @@ export const Dashboard = ({ selectedFarmId }) => {
 
         try {
             // CAMBIO: Usar endpoint específico para una farm
-            const response = await fetch(`${urlBackend}/api/user-images/${targetFarmId}`, {
-                headers: {
-                    'Authorization': `Bearer ${token}`,
-                    "Content-Type": "application/json"
-                }
-            });
-
-            if (!response.ok) {
-                const text = await response.text();
-                console.error("Respuesta errónea:", text);
-                throw new Error(`Error del servidor: ${response.status}`);
-            }
-
-            const data = await response.json();
+            const data = await fetchAllPages(`${urlBackend}/api/user-images/${targetFarmId}`);
 
             // Filtrar las imágenes por tipo
-            const ndvi = data.filter(image => image.image_type === 'NDVI');
-            const aerial = data.filter(image => image.image_type === 'AERIAL');
+            const ndvi = data.items.filter(image => image.image_type === 'NDVI');
+            const aerial = data.items.filter(image => image.image_type === 'AERIAL');
 
             setNdviImages(ndvi);
             setAerialImages(aerial);
@@ -1113,7 +1132,9 @@ export const Dashboard = ({ selectedFarmId }) => {
                                     ndviImages.map((image) => (
                                         <div key={image.id} className="col-md-4 mb-3">
                                             <div className="card">
-                                                <img src={image.image_url} alt="NDVI" className="card-img-top" style={{ height: "200px", objectFit: "cover" }} />
+                                                <a href={image.image_url} target="_blank" rel="noreferrer">
+                                                    <img src={image.thumb_url || image.image_url} alt="NDVI" loading="lazy" onError={(event) => { if (event.currentTarget.src !== image.image_url) event.currentTarget.src = image.image_url; }} className="card-img-top" style={{ height: "200px", objectFit: "cover" }} />
+                                                </a>
                                                 <div className="card-body">
                                                     <p className="card-text">
                                                         <small className="text-muted">
@@ -1135,7 +1156,9 @@ export const Dashboard = ({ selectedFarmId }) => {
                                     aerialImages.map((image) => (
                                         <div key={image.id} className="col-md-4 mb-3">
                                             <div className="card">
-                                                <img src={image.image_url} alt="Aérea" className="card-img-top" style={{ height: "200px", objectFit: "cover" }} />
+                                                <a href={image.image_url} target="_blank" rel="noreferrer">
+                                                    <img src={image.thumb_url || image.image_url} alt="Aérea" loading="lazy" onError={(event) => { if (event.currentTarget.src !== image.image_url) event.currentTarget.src = image.image_url; }} className="card-img-top" style={{ height: "200px", objectFit: "cover" }} />
+                                                </a>
                                                 <div className="card-body">
                                                     <p className="card-text">
                                                         <small className="text-muted">
@@ -0,0 +1,71 @@
+"""
+Fixtures de los tests: la app de src/app.py sobre SQLite en memoria.
+
+La configuración se lee de variables de entorno al importar src/app.py, así que se definen
+antes de importarla: subidas, correos y hash de contraseñas corren en el mismo request
+(modo inline) y los archivos van a carpetas temporales.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+_tmp = tempfile.mkdtemp(prefix="agrivision-tests-")
+os.environ.update({
+    "DATABASE_URL": "sqlite://",
+    "JWT_SECRET_KEY": "test-secret-key-with-at-least-32-bytes",
+    "STORAGE_BACKEND": "local",
+    "UPLOAD_JOBS_MODE": "inline",
+    "UPLOAD_SPOOL_FOLDER": os.path.join(_tmp, "spool"),
+    "DERIVATIVES_FOLDER": os.path.join(_tmp, "derivatives"),
+    "DERIVATIVES_ON_UPLOAD": "0",
+    "MAIL_QUEUE_MODE": "inline",
+    "PASSWORD_HASH_POOL": "inline",
+    "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",
+    "COMPRESSION_ENABLED": "0",
+})
+
+from app import app as flask_app              # noqa: E402
+from api.auth import create_user_token        # noqa: E402
+from api.identity import user_roles, farm_owners  # noqa: E402
+from api.models import db, User               # noqa: E402
+from api.storage import LocalStorage          # noqa: E402
+
+
+@pytest.fixture
+def app():
+    flask_app.config["TESTING"] = True
+    # los ids se repiten entre tests: la caché de identidad del proceso arranca vacía
+    user_roles.clear()
+    farm_owners.clear()
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_headers(app):
+    admin = User(full_name="Admin", email="admin@agrivision.test", password="x", salt="x", is_admin="admin")
+    db.session.add(admin)
+    db.session.commit()
+    return {"Authorization": f"Bearer {create_user_token(admin)}"}
+
+
+@pytest.fixture
+def storage(app, tmp_path):
+    """LocalStorage en una carpeta temporal en lugar del backend configurado"""
+    previous = app.extensions["storage"]
+    app.extensions["storage"] = LocalStorage(str(tmp_path / "uploads"))
+    yield app.extensions["storage"]
+    app.extensions["storage"] = previous
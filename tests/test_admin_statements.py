@@ -0,0 +1,77 @@
+"""
+Los listados del admin tienen que resolverse con una cantidad fija de consultas,
+sin importar cuántos usuarios, campos, imágenes o reportes haya (sin N+1).
+"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from api.models import db
+from api.seed import seed_bench
+
+
+@contextmanager
+def count_statements():
+    """Lista con el SQL de cada consulta ejecutada dentro del bloque"""
+    statements = []
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def statements_for(client, headers, url):
+    # el primer request llena la caché de identidad (rol del admin); se mide el segundo
+    client.get(url, headers=headers)
+    with count_statements() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return len(statements)
+
+
+@pytest.mark.parametrize("url", [
+    "/api/admin/all-users",
+    "/api/admin/all-farms",
+    "/api/admin/reports-overview",
+])
+def test_admin_listings_use_constant_statements(client, admin_headers, url):
+    seed_bench(users=3, farms_per_user=2, images_per_farm=2, reports_per_farm=2, echo=lambda message: None)
+    small = statements_for(client, admin_headers, url)
+
+    seed_bench(users=30, farms_per_user=3, images_per_farm=4, reports_per_farm=4, seed=7, echo=lambda message: None)
+    large = statements_for(client, admin_headers, url)
+
+    assert large == small
+    assert large <= 6
+
+
+def test_farm_details_use_constant_statements(client, admin_headers):
+    seed_bench(users=1, farms_per_user=1, images_per_farm=2, reports_per_farm=2, echo=lambda message: None)
+    small = statements_for(client, admin_headers, "/api/admin/farm-details/1")
+
+    seed_bench(users=1, farms_per_user=1, images_per_farm=40, reports_per_farm=40, echo=lambda message: None)
+    db.session.execute(db.text("UPDATE farm_images SET farm_id = 1"))
+    db.session.execute(db.text("UPDATE diagnostic_reports SET farm_id = 1"))
+    db.session.commit()
+    large = statements_for(client, admin_headers, "/api/admin/farm-details/1")
+
+    assert large == small
+
+
+def test_farm_diagnostics_total_covers_every_page(client, admin_headers):
+    seed_bench(users=1, farms_per_user=1, images_per_farm=0, reports_per_farm=12, echo=lambda message: None)
+    db.session.execute(db.text("UPDATE diagnostic_reports SET is_diagnostic = 1"))
+    db.session.commit()
+
+    response = client.get("/api/admin/diagnostics/1?limit=5", headers=admin_headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    body = response.get_json()
+    assert len(body["diagnostics"]) == 5
+    assert body["total_diagnostics"] == 12
+    assert body["next_cursor"]
@@ -0,0 +1,29 @@
+"""
+Límites de tamaño del body: MAX_CONTENT_LENGTH global chico, los avatares hasta MAX_AVATAR_MB.
+"""
+import io
+
+MB = 1024 * 1024
+
+
+def put_avatar(client, headers, size):
+    return client.put("/api/update-avatar", headers=headers, content_type="multipart/form-data",
+                      data={"avatar": (io.BytesIO(b"\0" * size), "avatar.png")})
+
+
+def test_avatar_above_global_limit_is_accepted(app, client, admin_headers, storage):
+    assert app.config["MAX_CONTENT_LENGTH"] < 10 * MB <= app.config["MAX_AVATAR_CONTENT_LENGTH"]
+
+    response = put_avatar(client, admin_headers, 10 * MB)
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+
+def test_avatar_above_avatar_limit_is_rejected(app, client, admin_headers, storage):
+    response = put_avatar(client, admin_headers, app.config["MAX_AVATAR_CONTENT_LENGTH"] + MB)
+    assert response.status_code == 413
+
+
+def test_json_routes_keep_global_limit(app, client):
+    response = client.post("/api/login", data=b"{" + b" " * app.config["MAX_CONTENT_LENGTH"] + b"}",
+                           content_type="application/json")
+    assert response.status_code == 413
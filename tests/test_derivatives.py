@@ -0,0 +1,59 @@
+"""
+Derivados: toda decodificación pasa por el único thread de derivados, aunque varias subidas
+terminen al mismo tiempo en los workers de subida.
+"""
+import io
+import threading
+import time
+from types import SimpleNamespace
+
+from PIL import Image
+
+from api import derivatives
+
+
+def stored_image(storage, image_id, color):
+    content = io.BytesIO()
+    Image.new("RGB", (300, 200), color).save(content, "PNG")
+    content.seek(0)
+    stored = storage.put(content, file_name="campo.png")
+    return SimpleNamespace(id=image_id, image_url=stored["url"], content_hash=stored["sha256"])
+
+
+def test_uploads_decode_one_image_at_a_time(app, storage, monkeypatch):
+    monkeypatch.setitem(app.config, "DERIVATIVES_ON_UPLOAD", True)
+    images = [stored_image(storage, image_id, (image_id * 40, 120, 60)) for image_id in range(1, 5)]
+
+    running = []
+    peak = []
+    open_image = derivatives._open_image
+
+    def tracked_open_image(source):
+        running.append(1)
+        peak.append(len(running))
+        time.sleep(0.05)
+        try:
+            return open_image(source)
+        finally:
+            running.pop()
+
+    monkeypatch.setattr(derivatives, "_open_image", tracked_open_image)
+
+    # como process_upload_job en los UPLOAD_WORKERS: varias subidas terminan juntas
+    def finish_upload(image):
+        with app.app_context():
+            derivatives.generate_after_upload(image)
+
+    workers = [threading.Thread(target=finish_upload, args=(image,)) for image in images]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    # un solo thread en orden: cuando corre esta tarea ya terminaron las anteriores
+    derivatives._get_executor().submit(lambda: None).result()
+
+    assert len(peak) == len(images)
+    assert max(peak) == 1
+    for image in images:
+        folder, meta = derivatives.cached_derivatives(image)
+        assert meta is not None and meta["width"] == 300
@@ -0,0 +1,130 @@
+"""
+Subidas directas con LocalStorage como almacenamiento: presign -> PUT /api/direct-uploads/<token>
+-> confirm, y los casos que el confirm tiene que rechazar.
+"""
+import time
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from api import direct_uploads
+from api.auth import create_user_token
+from api.models import db, User, Farm, Farm_images
+
+
+def user_headers(email):
+    user = User(full_name=email.split("@")[0], email=email, password="x", salt="x", is_admin="user")
+    db.session.add(user)
+    db.session.commit()
+    return user, {"Authorization": f"Bearer {create_user_token(user)}"}
+
+
+def create_farm(owner):
+    farm = Farm(user_id=owner.id, farm_location="Talca", farm_name=f"Campo de {owner.full_name}")
+    db.session.add(farm)
+    db.session.commit()
+    return farm
+
+
+def presign(client, headers, farm):
+    return client.post("/api/upload-image/presign", headers=headers,
+                       json={"farm_id": farm.id, "image_type": "NDVI", "file_name": "vuelo.tif"})
+
+
+def put_file(client, upload, content=b"ortofoto NDVI"):
+    assert upload["method"] == "PUT"
+    return client.put(urlsplit(upload["url"]).path, data=content, headers=upload["headers"])
+
+
+def confirm(client, headers, ticket, result):
+    return client.post("/api/upload-image/confirm", headers=headers, json={"ticket": ticket, "result": result})
+
+
+def uploaded(client, headers, farm):
+    """presign + PUT: devuelve (ticket, respuesta firmada del almacenamiento)"""
+    response = presign(client, headers, farm)
+    assert response.status_code == 201, response.get_data(as_text=True)
+    body = response.get_json()
+    stored = put_file(client, body["upload"])
+    assert stored.status_code == 201, stored.get_data(as_text=True)
+    return body["ticket"], stored.get_json()
+
+
+def test_presign_put_confirm(client, storage):
+    owner, headers = user_headers("owner@agrivision.test")
+    farm = create_farm(owner)
+
+    ticket, result = uploaded(client, headers, farm)
+    response = confirm(client, headers, ticket, result)
+
+    assert response.status_code == 201, response.get_data(as_text=True)
+    image = response.get_json()["data"]
+    assert image["farm_id"] == farm.id and image["image_type"] == "NDVI"
+    assert b"".join(storage.stream_url(image["image_url"])) == b"ortofoto NDVI"
+
+
+def test_repeated_confirm_returns_same_image(client, storage):
+    owner, headers = user_headers("owner@agrivision.test")
+    farm = create_farm(owner)
+    ticket, result = uploaded(client, headers, farm)
+
+    first = confirm(client, headers, ticket, result)
+    second = confirm(client, headers, ticket, result)
+
+    assert (first.status_code, second.status_code) == (201, 200)
+    assert first.get_json()["data"]["id"] == second.get_json()["data"]["id"]
+    assert Farm_images.query.filter_by(image_url=first.get_json()["data"]["image_url"]).count() == 1
+
+
+def test_tampered_result_is_rejected(client, storage):
+    owner, headers = user_headers("owner@agrivision.test")
+    farm = create_farm(owner)
+    ticket, result = uploaded(client, headers, farm)
+
+    forged_signature = {**result, "signature": "0" * len(result["signature"])}
+    other_file = {**result, "key": "aa/bb/" + "a" * 64 + ".tif"}
+
+    for tampered in (forged_signature, other_file):
+        response = confirm(client, headers, ticket, tampered)
+        assert response.status_code == 400
+    assert Farm_images.query.count() == 0
+
+
+def test_expired_ticket_is_rejected(client, storage, monkeypatch):
+    owner, headers = user_headers("owner@agrivision.test")
+    farm = create_farm(owner)
+    ticket, result = uploaded(client, headers, farm)
+
+    later = time.time() + client.application.config["DIRECT_UPLOAD_TTL"] + 1
+    monkeypatch.setattr(direct_uploads, "time", SimpleNamespace(time=lambda: later))
+    response = confirm(client, headers, ticket, result)
+
+    assert response.status_code == 410
+    assert Farm_images.query.count() == 0
+
+
+def test_expired_upload_url_is_rejected(app, client, storage, monkeypatch):
+    owner, headers = user_headers("owner@agrivision.test")
+    farm = create_farm(owner)
+    monkeypatch.setitem(app.config, "DIRECT_UPLOAD_TTL", -1)
+
+    upload = presign(client, headers, farm).get_json()["upload"]
+
+    assert put_file(client, upload).status_code == 403
+
+
+def test_farm_of_another_user(client, storage):
+    owner, owner_headers = user_headers("owner@agrivision.test")
+    other, other_headers = user_headers("other@agrivision.test")
+    farm = create_farm(owner)
+
+    assert presign(client, other_headers, farm).status_code == 403
+
+    # ticket del dueño usado por otro usuario
+    ticket, result = uploaded(client, owner_headers, farm)
+    assert confirm(client, other_headers, ticket, result).status_code == 403
+
+    # el campo cambió de dueño entre el presign y el confirm
+    farm.user_id = other.id
+    db.session.commit()
+    assert confirm(client, owner_headers, ticket, result).status_code == 403
+    assert Farm_images.query.count() == 0
@@ -0,0 +1,67 @@
+"""
+La cola de correos contra un servidor SMTP local (aiosmtpd): /reset-password encola el
+correo y responde enseguida; el worker lo entrega por SMTP.
+"""
+import socket
+import time
+from email import message_from_bytes
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from api.mailer import mail_stats
+from api.models import db, User
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    monkeypatch.setenv("SMTP_ADDRESS", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(port))
+    monkeypatch.setenv("SMTP_SECURITY", "none")
+    monkeypatch.setenv("EMAIL_ADDRESS", "no-reply@agrivision.test")
+    yield handler
+    controller.stop()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_password_reset_mail_is_queued_and_delivered(app, client, smtp_server, monkeypatch):
+    monkeypatch.setitem(app.config, "MAIL_QUEUE_MODE", "thread")
+    db.session.add(User(full_name="Ana", email="ana@agrivision.test", password="x", salt="x"))
+    db.session.commit()
+    sent_before = mail_stats()["sent"]
+
+    response = client.post("/api/reset-password", json="ana@agrivision.test")
+
+    assert response.status_code == 200
+    assert wait_for(lambda: smtp_server.messages), "el worker no entregó el correo"
+
+    envelope = smtp_server.messages[0]
+    message = message_from_bytes(envelope.content)
+    assert envelope.rcpt_tos == ["ana@agrivision.test"]
+    assert message["To"] == "ana@agrivision.test"
+    assert message["Subject"] == "Password recovery"
+    assert wait_for(lambda: mail_stats()["sent"] == sent_before + 1)
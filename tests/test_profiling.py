@@ -0,0 +1,34 @@
+"""capture_statements / assert_max_statements solo cuentan las consultas del contexto actual."""
+from threading import Thread
+
+import pytest
+from sqlalchemy import text
+
+from api.models import db
+from api.profiling import assert_max_statements, capture_statements
+
+
+def run_query_in_thread(app):
+    def work():
+        with app.app_context():
+            db.session.execute(text("SELECT 1"))
+            db.session.remove()
+
+    thread = Thread(target=work)
+    thread.start()
+    thread.join()
+
+
+def test_capture_ignores_other_threads(app):
+    with capture_statements() as captured:
+        run_query_in_thread(app)
+        db.session.execute(text("SELECT 2"))
+
+    assert [statement for statement, _ in captured] == ["SELECT 2"]
+
+
+def test_assert_max_statements_reports_repeated_queries(app):
+    with pytest.raises(AssertionError, match="3 consultas, el presupuesto es 2"):
+        with assert_max_statements(2):
+            for number in range(3):
+                db.session.execute(text(f"SELECT {number}"))
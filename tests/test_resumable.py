@@ -0,0 +1,36 @@
+"""
+Subidas reanudables: un bloque que supera el tamaño declarado responde 413 y no mueve el offset.
+"""
+from api.models import db, Farm
+
+
+def open_session(client, headers, size):
+    farm = Farm(user_id=1, farm_location="Talca", farm_name="Campo reanudable")
+    db.session.add(farm)
+    db.session.commit()
+    response = client.post("/api/uploads/resumable", headers=headers, json={
+        "kind": "report", "farm_id": farm.id, "file_name": "informe.txt", "size": size
+    })
+    assert response.status_code == 201
+    return response.get_json()["upload_url"]
+
+
+def patch(client, headers, url, offset, body):
+    return client.patch(url, headers={**headers, "Upload-Offset": str(offset)}, data=body)
+
+
+def test_oversized_chunk_keeps_offset(client, admin_headers):
+    url = open_session(client, admin_headers, 10)
+
+    response = patch(client, admin_headers, url, 0, b"12345")
+    assert response.status_code == 200
+    assert response.headers["Upload-Offset"] == "5"
+
+    response = patch(client, admin_headers, url, 5, b"6789012345")
+    assert response.status_code == 413
+    assert response.get_json()["offset"] == 5
+    assert client.get(url, headers=admin_headers).headers["Upload-Offset"] == "5"
+
+    response = patch(client, admin_headers, url, 5, b"67890")
+    assert response.status_code == 200
+    assert response.headers["Upload-Offset"] == "10"
@@ -0,0 +1,52 @@
+"""
+global_stats: la fila se crea junto con la tabla y el overview nunca la recalcula en un GET.
+Los INSERT masivos de imágenes suman sus contadores con un UPDATE por tabla.
+"""
+from sqlalchemy import event
+
+from api.models import db, Farm, FarmStats, GlobalStats
+from api.stats import GLOBAL_STATS_ID, count_new_images
+
+
+def test_counters_follow_inserts(client, admin_headers):
+    db.session.add(Farm(user_id=1, farm_location="Talca", farm_name="Campo uno"))
+    db.session.commit()
+
+    response = client.get("/api/admin/reports-overview", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.get_json()["overview"]["total_farms"] == 1
+
+
+def test_missing_row_answers_zeros(client, admin_headers):
+    db.session.delete(db.session.get(GlobalStats, GLOBAL_STATS_ID))
+    db.session.commit()
+
+    response = client.get("/api/admin/reports-overview", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.get_json()["overview"]["total_farms"] == 0
+    assert db.session.get(GlobalStats, GLOBAL_STATS_ID) is None
+
+
+def test_batch_counts_use_one_update_per_table(app):
+    farm = Farm(user_id=1, farm_location="Talca", farm_name="Campo dron")
+    db.session.add(farm)
+    db.session.commit()
+
+    statements = []
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        count_new_images(farm.id, ["NDVI"] * 300 + ["AERIAL"] * 150 + ["RGB"] * 50)
+        db.session.commit()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    updates = [statement for statement in statements if statement.lstrip().upper().startswith("UPDATE")]
+    assert len(updates) == 2
+
+    farm_stats = db.session.get(FarmStats, farm.id)
+    assert (farm_stats.total_images, farm_stats.ndvi_images, farm_stats.aerial_images) == (500, 300, 150)
+    assert db.session.get(GlobalStats, GLOBAL_STATS_ID).total_images == 500
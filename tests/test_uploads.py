@@ -0,0 +1,72 @@
+"""
+Upload jobs en modo inline contra LocalStorage: enqueue_upload -> process_upload_job termina en
+"done" o "failed" y siempre borra el archivo de spool. Los jobs huérfanos se vuelven a encolar.
+"""
+import io
+import os
+from datetime import datetime, timedelta, timezone
+
+from werkzeug.datastructures import FileStorage
+
+from api.models import db, Farm, Farm_images, UploadJob
+from api.uploads import build_upload_job, enqueue_upload, process_upload_job, recover_stale_jobs
+
+
+def create_farm():
+    farm = Farm(user_id=1, farm_location="Talca", farm_name="Campo subidas")
+    db.session.add(farm)
+    db.session.commit()
+    return farm
+
+
+def upload(farm, content=b"imagen NDVI"):
+    file_storage = FileStorage(io.BytesIO(content), filename="vuelo.png")
+    return enqueue_upload("image", 1, file_storage, "vuelo.png", farm.id, image_type="NDVI")
+
+
+def test_upload_job_done(admin_headers, storage):
+    farm = create_farm()
+
+    job = upload(farm)
+
+    assert job.status == "done"
+    assert not os.path.exists(job.spool_path)
+    image = db.session.get(Farm_images, job.result_id)
+    assert image.farm_id == farm.id and image.image_url == job.result_url
+    assert b"".join(storage.stream_url(job.result_url)) == b"imagen NDVI"
+
+
+def test_upload_job_failed(admin_headers, storage, monkeypatch):
+    farm = create_farm()
+
+    def broken_put(*args, **kwargs):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(storage, "put", broken_put)
+    job = upload(farm)
+
+    assert job.status == "failed"
+    assert "disco lleno" in job.error
+    assert not os.path.exists(job.spool_path)
+    assert Farm_images.query.count() == 0
+
+
+def test_stale_jobs_are_recovered(app, admin_headers, storage, tmp_path):
+    farm = create_farm()
+    stale = datetime.now(timezone.utc) - timedelta(minutes=app.config["UPLOAD_JOB_STALE_MINUTES"] + 1)
+
+    spool_path = tmp_path / "huerfano"
+    spool_path.write_bytes(b"imagen AERIAL")
+    orphan = build_upload_job("image", 1, str(spool_path), "aerea.png", farm.id, image_type="AERIAL")
+    orphan.status, orphan.updated_at = "processing", stale
+    lost = build_upload_job("image", 1, str(tmp_path / "no-existe"), "perdida.png", farm.id, image_type="AERIAL")
+    lost.updated_at = stale
+    recent = build_upload_job("image", 1, str(spool_path), "en-curso.png", farm.id, image_type="AERIAL")
+    recent.status = "processing"
+    db.session.commit()
+
+    assert recover_stale_jobs() == [orphan.id]
+    assert db.session.get(UploadJob, lost.id).status == "failed"
+    assert db.session.get(UploadJob, recent.id).status == "processing"
+
+    assert process_upload_job(orphan.id).status == "done"